@@ -1,7 +1,7 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, Response, g
 import subprocess
 import os
 import re
@@ -9,17 +9,133 @@ import json
 import time
 import datetime
 import logging
-import subprocess
+import threading
+import functools
+import socket
+import struct
+import shlex
+import shutil
+import tempfile
+import atexit
+import stat
+import ctypes
+import fcntl
+import errno
+import mmap
+import contextlib
+import sys
+import bisect
+import math
+import collections
+import hashlib
+import itertools
+import random
+import multiprocessing
+import csv
+import io
+import ipaddress
+import uuid
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from array import array
 from jinja2.utils import F
 from werkzeug.utils import secure_filename
+from werkzeug.datastructures import MultiDict
+from scan_worker import chunk_is_zero, scan_chunk_batch
 import urllib.parse
 
 MAX_TARGET_ID = 65535  # tgt最大支持65535个target
 MAX_LUN_ID = 255      # 每个target最大支持255个LUN
+TOPOLOGY_CACHE_TTL = float(os.environ.get('TOPOLOGY_CACHE_TTL', '3'))  # Target拓扑快照的缓存有效期（秒）
+CONFIG_SAVE_DELAY = float(os.environ.get('CONFIG_SAVE_DELAY', '2'))     # 配置变更后等待多久无新变更再写入（秒）
+CONFIG_SAVE_RETRY_INTERVAL = float(os.environ.get('CONFIG_SAVE_RETRY_INTERVAL', '30'))  # 配置写入失败后多久重试（秒）
+
+# tgt配置目录及其持久化目录
+TGT_CONFIG_DIR = '/etc/tgt'
+TGT_LIB_DIR = '/var/lib/tgt'
+PERSIST_TGT_DIR = '/app/config/tgt'
+PERSIST_TGT_LIB_DIR = '/app/config/tgt_lib'
+
+# 磁盘文件目录与磁盘索引刷新参数
+BASE_DISK_DIR = '/app/iscsi'
+DISK_METHODS_FILE = '/app/config/disk_methods.json'
+# 磁盘文件分配方式：sparse只设置文件大小，fallocate一次性预留全部空间，zero用O_DIRECT写零填满
+DISK_ALLOCATION_MODES = {'sparse': '稀疏方式', 'fallocate': '预分配方式', 'zero': '填零方式'}
+DISK_ALLOCATION_ALIASES = {'qemu': 'sparse', 'dd': 'zero'}  # 兼容旧的create_method取值
+DISK_CLONE_METHODS = {'reflink': '克隆方式(reflink)', 'copy': '克隆方式(复制)'}
+
+# LUN后端引擎：bstype为tgtd的后端类型，bsoflags为打开后备文件的标志（多个用冒号分隔），bsopts为后端参数
+LUN_BACKENDS_FILE = '/app/config/lun_backends.json'
+LUN_BSTYPES = ('rdwr', 'aio', 'sg')
+LUN_BSOFLAGS = ('direct', 'sync')
+ACL_APPLY_WORKERS = int(os.environ.get('ACL_APPLY_WORKERS', '8'))  # 批量设置ACL时并行处理的Target数
+INVENTORY_POLL_INTERVAL = float(os.environ.get('INVENTORY_POLL_INTERVAL', '2'))                # 无inotify时检查目录mtime的间隔（秒）
+INVENTORY_FULL_RESCAN_INTERVAL = float(os.environ.get('INVENTORY_FULL_RESCAN_INTERVAL', '300'))  # 完整重新扫描的间隔（秒）
+
+# 后台任务参数
+JOB_MAX_WORKERS = int(os.environ.get('JOB_MAX_WORKERS', '2'))              # 同时执行的后台任务数（限制并发写入）
+JOB_HISTORY_SIZE = int(os.environ.get('JOB_HISTORY_SIZE', '100'))          # 保留多少个已结束任务的记录
+JOB_PROGRESS_INTERVAL = float(os.environ.get('JOB_PROGRESS_INTERVAL', '1'))  # 推送任务进度事件的最小间隔（秒）
+DISK_WRITE_CHUNK = 8 * 1024 * 1024          # 填零写入磁盘文件的块大小（O_DIRECT对齐写入）
+DISK_FALLOCATE_CHUNK = 1024 * 1024 * 1024   # fallocate分段预分配的大小，每段之间报告进度和检查取消
+DIRECT_IO_ALIGNMENT = 4096                  # O_DIRECT写入的长度对齐
+DISK_COPY_CHUNK = 64 * 1024 * 1024          # 克隆回退复制时每次copy_file_range的长度
+
+# 备份参数
+BACKUP_DIR = os.environ.get('BACKUP_DIR', '/app/backup')                                # 备份目录：chunks/为按内容寻址的块存储，manifests/为每个镜像的清单
+BACKUP_CHUNK_SIZE = int(os.environ.get('BACKUP_CHUNK_SIZE_MB', '4')) * 1024 * 1024   # 备份分块大小
+BACKUP_HASH_WORKERS = int(os.environ.get('BACKUP_HASH_WORKERS', '4'))                # 并行读取和计算哈希的线程数
+
+# 空间扫描参数
+SCAN_CHUNK_SIZE = int(os.environ.get('SCAN_CHUNK_SIZE_KB', '1024')) * 1024  # 扫描全零和重复块的分块大小（需为mmap分配粒度和文件系统块大小的整数倍）
+SCAN_WORKERS = int(os.environ.get('SCAN_WORKERS', str(os.cpu_count() or 2)))  # 扫描进程数
+SCAN_BATCH_CHUNKS = 256                                                   # 每个扫描任务处理的块数
+SCAN_REPORTS_FILE = '/app/config/scan_reports.json'
+
+# 存储基准测试参数
+BENCHMARK_RESULTS_FILE = '/app/config/benchmark_results.json'
+BENCHMARK_HISTORY_SIZE = int(os.environ.get('BENCHMARK_HISTORY_SIZE', '50'))  # 保留最近多少次测试结果
+BENCHMARK_MAX_RUNTIME = 300      # 单次测试最长运行时间（秒）
+BENCHMARK_MAX_WORKERS = 256      # 线程数×队列深度的上限
+BENCHMARK_LATENCY_BUCKETS = 32   # 延迟直方图按2的幂分桶（微秒），最后一桶约35分钟
+
+# LUN调优参数
+TUNING_FILE = '/app/config/optimize/tuning.json'
+TUNING_SCRATCH_MB = int(os.environ.get('TUNING_SCRATCH_MB', '256'))   # 测试候选设置使用的临时镜像大小
+TUNING_RUNTIME = float(os.environ.get('TUNING_RUNTIME', '3'))          # 每个候选设置的测试时间（秒）
+TUNING_TOLERANCE = 0.05                        # 与最佳结果相差不超过5%时选择更小的候选值
+TUNING_BLOCK_SIZES = (8192, 65536, 262144, 1048576)  # 候选的最佳传输长度，未调优时以最小值为基准
+TUNING_SCRATCH_IQN = 'iqn.2025-05.com.cherry:tuning-scratch'
+# 需要探测的参数及探测时设置的值（只设置在临时Target和LUN上），tgtd不支持的参数会返回错误
+TUNING_LUN_PARAMS = {'optimal_xfer_len': 0, 'optimal_xfer_gran': 0, 'lbppbe': 0}
+
+# 页缓存策略参数
+CACHE_POLICIES_FILE = '/app/config/cache_policies.json'
+CACHE_POLICY_INTERVAL = float(os.environ.get('CACHE_POLICY_INTERVAL', '300'))  # 补齐常驻镜像、丢弃不缓存镜像和记录热点区段的间隔（秒）
+CACHE_WARM_RATE_MB = float(os.environ.get('CACHE_WARM_RATE_MB', '200'))         # 默认预热限速（MB/s）
+CACHE_WARM_CHUNK = 8 * 1024 * 1024          # 每次WILLNEED提交的长度
+CACHE_HOT_GRANULARITY = 1024 * 1024         # 记录热点区段的粒度
+CACHE_MINCORE_WINDOW = 1024 * 1024 * 1024   # 每次mmap+mincore统计的长度，限制地址空间和结果数组的大小
+
+# 请求耗时追踪参数
+SLOW_REQUEST_THRESHOLD = float(os.environ.get('SLOW_REQUEST_THRESHOLD_MS', '500')) / 1000  # 超过此耗时的请求记录完整的耗时分解
+SLOW_REQUEST_RING_SIZE = int(os.environ.get('SLOW_REQUEST_RING_SIZE', '50'))               # 保留最近多少个慢请求
+PROFILE_SAMPLE_INTERVAL = float(os.environ.get('PROFILE_SAMPLE_INTERVAL_MS', '5')) / 1000  # 采样分析器的采样间隔
+
+# 性能采集参数
+DISKSTATS_FILE = '/proc/diskstats'
+PERF_SAMPLE_INTERVAL = float(os.environ.get('PERF_SAMPLE_INTERVAL', '5'))  # 性能采集间隔（秒）
+PERF_LATENCY_WINDOW = int(os.environ.get('PERF_LATENCY_WINDOW', '60'))        # 计算延迟百分位使用的最近采样数（默认5秒×60=5分钟）
+PERF_HISTORY_RAW_POINTS = int(os.environ.get('PERF_HISTORY_RAW_POINTS', '720'))  # 原始采样保留点数（默认5秒×720=1小时）
+PERF_HISTORY_MAX_SERIES = int(os.environ.get('PERF_HISTORY_MAX_SERIES', '256'))  # 最多保留多少个LUN的历史，超出时淘汰最久未更新的
+
+# 事件流参数
+STREAM_BUFFER_SIZE = int(os.environ.get('STREAM_BUFFER_SIZE', '256'))                     # 事件流保留的最近事件数，用于Last-Event-ID续传
+STREAM_HEARTBEAT_INTERVAL = float(os.environ.get('STREAM_HEARTBEAT_INTERVAL', '15'))       # 事件流心跳间隔（秒）
+STREAM_TOPOLOGY_POLL_INTERVAL = float(os.environ.get('STREAM_TOPOLOGY_POLL_INTERVAL', '30'))  # 有订阅者时检查外部拓扑变化的间隔（秒）
 
 # 配置日志
 log_handler_stdout = logging.StreamHandler()
-log_handler_file = logging.FileHandler('/app/config/app.log')
+log_handler_file = logging.FileHandler(os.environ.get('APP_LOG_FILE', '/app/config/app.log'))
 
 # 配置日志
 logging.basicConfig(
@@ -35,11 +151,184 @@ app = Flask(__name__,
     template_folder='/app/templates')
 app.secret_key = os.urandom(24)
 
-# 工具函数：执行shell命令并返回结果
+# Prometheus直方图：固定分桶，按标签组合累计，供/metrics输出
+class Histogram:
+    DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+    def __init__(self, name, help_text, label_names, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._series = {}  # 标签值元组 -> [各分桶计数, 总和, 总数]
+
+    def observe(self, labels, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * len(self.buckets), 0.0, 0]
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = [(labels, list(counts), total, count) for labels, (counts, total, count) in self._series.items()]
+        for labels, counts, total, count in sorted(series):
+            label_text = ','.join(f'{name}="{prometheus_escape(value)}"' for name, value in zip(self.label_names, labels))
+            separator = ',' if label_text else ''
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{label_text}{separator}le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{label_text}{separator}le="+Inf"}} {count}')
+            lines.append(f'{self.name}_sum{{{label_text}}} {total}')
+            lines.append(f'{self.name}_count{{{label_text}}} {count}')
+        return lines
+
+# Prometheus标签值转义
+def prometheus_escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+command_duration = Histogram('iscsi_command_duration_seconds', '外部命令和tgtd管理请求的耗时',
+                             ('command', 'transport'))
+http_request_duration = Histogram('iscsi_http_request_duration_seconds', 'HTTP请求处理耗时（流式响应只计到响应开始）',
+                                  ('route', 'method'))
+
+# 请求耗时追踪：每个请求在线程局部变量中记录各阶段（span）的耗时，没有进行中的请求时span()不做任何记录
+_trace_local = threading.local()
+slow_requests = collections.deque(maxlen=SLOW_REQUEST_RING_SIZE)
+
+class RequestTrace:
+    __slots__ = ('started', 'spans', 'depth', 'profiler')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans = []  # [(名称, 相对请求开始的时间, 耗时, 嵌套层级（从0开始）)]
+        self.depth = 0
+        self.profiler = None
+
+@contextlib.contextmanager
+def span(name):
+    trace = getattr(_trace_local, 'trace', None)
+    if trace is None:
+        yield
+        return
+    started = time.perf_counter()
+    trace.depth += 1
+    try:
+        yield
+    finally:
+        trace.depth -= 1
+        trace.spans.append((name, started - trace.started, time.perf_counter() - started, trace.depth))
+
+# 采样分析器：后台线程按固定间隔采集目标线程的调用栈，统计各调用栈出现的次数
+class SamplingProfiler:
+    MAX_DEPTH = 30
+
+    def __init__(self, thread_id, interval=PROFILE_SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = 0
+        self._stacks = collections.Counter()
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None and len(stack) < self.MAX_DEPTH:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+                frame = frame.f_back
+            if stack:
+                self._stacks[';'.join(reversed(stack))] += 1
+                self.samples += 1
+
+    # 停止采样，返回出现次数最多的调用栈
+    def stop(self, top=30):
+        self._stop_event.set()
+        self._thread.join()
+        return [{'stack': stack, 'samples': count} for stack, count in self._stacks.most_common(top)]
+
+# 请求开始时建立耗时追踪；带_profile=1参数或X-Debug-Profile头的请求同时启用采样分析器
+@app.before_request
+def start_request_timer():
+    trace = _trace_local.trace = RequestTrace()
+    if request.args.get('_profile') == '1' or request.headers.get('X-Debug-Profile') == '1':
+        trace.profiler = SamplingProfiler(threading.get_ident()).start()
+
+@app.teardown_request
+def observe_request_duration(exc):
+    trace = getattr(_trace_local, 'trace', None)
+    if trace is None:
+        return
+    _trace_local.trace = None
+    duration = time.perf_counter() - trace.started
+    route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    http_request_duration.observe((route, request.method), duration)
+
+    profile = trace.profiler.stop() if trace.profiler is not None else None
+    if duration < SLOW_REQUEST_THRESHOLD and profile is None:
+        return
+    spans = sorted(trace.spans, key=lambda item: item[1])
+    record = {
+        'time': datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'method': request.method,
+        'path': request.full_path.rstrip('?'),
+        'route': route,
+        'duration_ms': round(duration * 1000, 2),
+        'error': str(exc) if exc is not None else None,
+        'spans': [
+            {'name': name, 'start_ms': round(start * 1000, 2), 'duration_ms': round(elapsed * 1000, 2), 'depth': depth}
+            for name, start, elapsed, depth in spans
+        ]
+    }
+    if profile is not None:
+        record['profile'] = {'interval_ms': PROFILE_SAMPLE_INTERVAL * 1000, 'samples': trace.profiler.samples, 'stacks': profile}
+    slow_requests.append(record)
+    if duration >= SLOW_REQUEST_THRESHOLD:
+        breakdown = '\n'.join(f"  {'  ' * depth}{name}: {elapsed * 1000:.1f}ms (+{start * 1000:.1f}ms)"
+                              for name, start, elapsed, depth in spans)
+        logger.warning(f"慢请求 {request.method} {request.path} 耗时{duration * 1000:.1f}ms\n{breakdown}")
+
+# 命令的统计标签：tgtadm按"tgtadm 模式 操作"区分，其他命令只取程序名
+def command_label(cmd):
+    argv = shlex.split(cmd) if isinstance(cmd, str) else list(cmd)
+    if not argv:
+        return ''
+    program = os.path.basename(argv[0])
+    if program == 'tgtadm':
+        options = dict(zip(argv[1:], argv[2:]))
+        return f"tgtadm {options.get('--mode', options.get('-m', ''))} {options.get('--op', options.get('-o', ''))}"
+    return program
+
+# 工具函数：执行命令并返回结果，cmd为字符串时经由shell执行，为列表时直接执行
 def run_command(cmd):
+    try:
+        label = command_label(cmd)
+    except ValueError:
+        label = 'shell'
+    started = time.perf_counter()
+    try:
+        with span(f'exec {label}'):
+            return _run_command(cmd)
+    finally:
+        command_duration.observe((label, 'exec'), time.perf_counter() - started)
+
+def _run_command(cmd):
     logger.info(f"执行命令: {cmd}")
     try:
-        result = subprocess.run(cmd, shell=True, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, encoding='utf-8')
+        result = subprocess.run(cmd, shell=isinstance(cmd, str), check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, encoding='utf-8')
         output = result.stdout
         logger.info(f"执行命令成功,output: {cmd}")
         return {
@@ -83,13 +372,529 @@ def run_command(cmd):
             }
         }
 
+# tgtd管理socket路径，与tgtadm一致（可通过TGT_IPC_SOCKET环境变量覆盖）
+TGTD_IPC_SOCKET = os.environ.get('TGT_IPC_SOCKET', '/var/run/tgtd/socket.0')
+
+# tgtd管理协议的模式、操作码和错误码，对应tgt源码中的usr/tgtadm.h和usr/tgtadm_error.h
+TGTADM_MODES = {
+    'system': 0, 'target': 1, 'logicalunit': 2, 'portal': 3,
+    'lld': 4, 'session': 5, 'conn': 6, 'account': 7
+}
+TGTADM_OPS = {
+    'new': 0, 'delete': 1, 'show': 2, 'bind': 3, 'unbind': 4,
+    'update': 5, 'stats': 6, 'start': 7, 'stop': 8
+}
+TGTADM_ERRORS = [
+    'success', 'unknown error', 'out of memory', "can't find the driver",
+    "can't find the target", "can't find the logical unit", "can't find the session",
+    "can't find the connection", "can't find the binding", 'this target already exists',
+    'this binding already exists', 'this logical unit number already exists',
+    'this access control rule already exists', 'this access control rule does not exist',
+    'this account already exists', "can't find the account", 'too many accounts',
+    'invalid request', 'this target already has an outgoing account',
+    'this target is still active', 'this logical unit is still active',
+    'this driver is busy', "this operation isn't supported", 'unknown parameter',
+    'this device has Prevent Removal set'
+]
+TGTADM_GLOBAL_TID = -1
+TGTADM_ERR_ACL_NOEXIST = TGTADM_ERRORS.index('this access control rule does not exist')
+TGTADM_NO_LUN = 0xFFFFFFFFFFFFFFFF
+
+# struct tgtadm_req / struct tgtadm_rsp
+TGTADM_REQ_STRUCT = struct.Struct('@ii64sIiQQIIIIII')
+TGTADM_RSP_STRUCT = struct.Struct('@II')
+
+# tgtd管理接口客户端：直接通过Unix socket与tgtd通信，不再经由shell和tgtadm进程
+# socket不可用时（例如tgtd版本不兼容）回退为不经过shell直接执行tgtadm
+class TgtdClient:
+    def __init__(self, socket_path=TGTD_IPC_SOCKET, lld='iscsi', timeout=30):
+        self.socket_path = socket_path
+        self.lld = lld
+        self.timeout = timeout
+
+    def system_show(self):
+        return self.request('system', 'show')
+
+    def target_new(self, tid, name):
+        return self.request('target', 'new', tid=tid, params={'targetname': name})
+
+    def target_delete(self, tid, force=False):
+        return self.request('target', 'delete', tid=tid, force=force)
+
+    def target_show(self, tid=None):
+        return self.request('target', 'show', tid=tid)
+
+    def target_bind(self, tid, initiator_address=None, initiator_name=None):
+        return self.request('target', 'bind', tid=tid, params={
+            'initiator-address': initiator_address,
+            'initiator-name': initiator_name
+        })
+
+    def target_unbind(self, tid, initiator_address=None, initiator_name=None):
+        return self.request('target', 'unbind', tid=tid, params={
+            'initiator-address': initiator_address,
+            'initiator-name': initiator_name
+        })
+
+    def lun_new(self, tid, lun, path, bstype=None, bsoflags=None, bsopts=None):
+        return self.request('logicalunit', 'new', tid=tid, lun=lun, params={
+            'path': path,
+            'bstype': bstype,
+            'bsopts': bsopts,
+            'bsoflags': bsoflags
+        })
+
+    def lun_delete(self, tid, lun):
+        return self.request('logicalunit', 'delete', tid=tid, lun=lun)
+
+    def lun_update(self, tid, lun, params):
+        return self.request('logicalunit', 'update', tid=tid, lun=lun, params=params)
+
+    def conn_show(self, tid):
+        return self.request('conn', 'show', tid=tid)
+
+    def system_stats(self):
+        return self.request('system', 'stats')
+
+    def target_stats(self, tid):
+        return self.request('target', 'stats', tid=tid)
+
+    def session_show(self, tid):
+        return self.request('session', 'show', tid=tid)
+
+    # 发送一个管理请求，返回值与run_command()的格式一致
+    def request(self, mode, op, tid=None, lun=None, force=False, params=None):
+        params = self._params(params)
+        try:
+            tid = TGTADM_GLOBAL_TID if tid is None else int(tid)
+            lun = None if lun is None else int(lun)
+        except (TypeError, ValueError):
+            return self._result(False, '', f'无效的Target ID或LUN ID: {tid}/{lun}', self._argv(mode, op, tid, lun, force, params))
+
+        argv = self._argv(mode, op, tid, lun, force, params)
+        logger.info(f"tgtd请求: {shlex.join(argv)}")
+        started = time.perf_counter()
+        try:
+            with span(f'ipc tgtadm {mode} {op}'):
+                err, output = self._send(mode, op, tid, lun, force, params)
+            command_duration.observe((f'tgtadm {mode} {op}', 'ipc'), time.perf_counter() - started)
+        except (FileNotFoundError, ConnectionRefusedError, PermissionError) as e:
+            logger.warning(f"无法连接tgtd管理socket({e})，回退为执行tgtadm")
+            return run_command(argv)
+        except (OSError, ValueError) as e:
+            logger.error(f"tgtd请求失败: {e}")
+            return self._result(False, '', str(e), argv, exit_code=-1)
+
+        if err:
+            message = TGTADM_ERRORS[err] if err < len(TGTADM_ERRORS) else f'error {err}'
+            logger.error(f"tgtd请求失败: {message}")
+            return self._result(False, output, f'tgtadm: {message}\n', argv, exit_code=err)
+        return self._result(True, output, None, argv)
+
+    def _params(self, params):
+        if isinstance(params, dict):
+            return ','.join(f'{key}={value}' for key, value in params.items() if value is not None)
+        return params or ''
+
+    def _send(self, mode, op, tid, lun, force, params):
+        body = params.encode('utf-8') + b'\0' if params else b''
+        req = TGTADM_REQ_STRUCT.pack(
+            TGTADM_MODES[mode], TGTADM_OPS[op], self.lld.encode('ascii'),
+            TGTADM_REQ_STRUCT.size + len(body), tid, 0,
+            TGTADM_NO_LUN if lun is None else lun,
+            0, 0, 0, 0, 0, 1 if force else 0
+        )
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+            sock.sendall(req + body)
+            err, length = TGTADM_RSP_STRUCT.unpack(self._recv_exact(sock, TGTADM_RSP_STRUCT.size))
+            output = self._recv_exact(sock, max(length - TGTADM_RSP_STRUCT.size, 0))
+        return err, output.rstrip(b'\0').decode('utf-8', errors='replace')
+
+    def _recv_exact(self, sock, size):
+        chunks = []
+        while size > 0:
+            chunk = sock.recv(min(size, 65536))
+            if not chunk:
+                raise ValueError('tgtd在响应完成前关闭了连接')
+            chunks.append(chunk)
+            size -= len(chunk)
+        return b''.join(chunks)
+
+    # 与请求等价的tgtadm命令行，用于日志、错误详情和回退执行
+    def _argv(self, mode, op, tid, lun, force, params):
+        argv = ['tgtadm', '--lld', self.lld, '--mode', mode, '--op', op]
+        if tid is not None and tid != TGTADM_GLOBAL_TID:
+            argv += ['--tid', str(tid)]
+        if lun is not None:
+            argv += ['--lun', str(lun)]
+        if force:
+            argv.append('--force')
+        if op == 'update' and mode in ('target', 'system') and params:
+            name, _, value = params.partition('=')
+            return argv + ['--name', name, '--value', value]
+        if op == 'update':
+            return argv + ['--params', params] if params else argv
+        for item in filter(None, (params or '').split(',')):
+            key, _, value = item.partition('=')
+            if key == 'path':
+                argv += ['--backing-store', value]
+            elif key in ('targetname', 'initiator-address', 'initiator-name', 'bstype', 'bsopts', 'bsoflags'):
+                argv += [f'--{key}', value]
+        return argv
+
+    def _result(self, success, output, error, argv, exit_code=0):
+        return {
+            'success': success,
+            'output': output,
+            'error': error,
+            'details': {
+                'command': shlex.join(argv),
+                'exit_code': exit_code,
+                'stdout': output,
+                'stderr': error or ''
+            }
+        }
+
+# 每个工作线程持有自己的客户端实例
+_tgtd_local = threading.local()
+
+def get_tgtd_client():
+    client = getattr(_tgtd_local, 'client', None)
+    if client is None:
+        client = _tgtd_local.client = TgtdClient()
+    return client
+
+# 事件中心：单一生产者发布事件，所有SSE订阅者共享同一份已序列化的消息
+# 最近的事件保存在固定长度的队列中，客户端断线重连时按Last-Event-ID补发
+class EventHub:
+    def __init__(self, size):
+        self._cond = threading.Condition()
+        self._events = collections.deque(maxlen=size)  # [(事件ID, 事件类型, SSE消息)]
+        self._latest = {}                              # 事件类型 -> 最近一条(事件ID, 事件类型, SSE消息)
+        self._next_id = 1
+        self.subscribers = 0
+
+    def publish(self, event, data):
+        payload = json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+        with self._cond:
+            event_id = self._next_id
+            self._next_id += 1
+            message = f"id: {event_id}\nevent: {event}\ndata: {payload}\n\n"
+            self._events.append((event_id, event, message))
+            self._latest[event] = (event_id, event, message)
+            self._cond.notify_all()
+        return event_id
+
+    # 补发给订阅者的消息；无法从缓冲区续传时发送resync事件和每种事件的最新状态
+    def _backlog(self, last_event_id, events):
+        last_id = self._next_id - 1
+        if last_event_id is not None and last_event_id <= last_id:
+            oldest = self._events[0][0] if self._events else self._next_id
+            if last_event_id >= oldest - 1:
+                return [message for event_id, event, message in self._events
+                        if event_id > last_event_id and (events is None or event in events)]
+        messages = [message for _, event, message in sorted(self._latest.values())
+                    if events is None or event in events]
+        if last_event_id is not None:
+            messages.insert(0, f"id: {last_id}\nevent: resync\ndata: {{}}\n\n")
+        return messages
+
+    # 订阅事件流，返回SSE消息生成器；events为需要的事件类型集合（None表示全部）
+    # 无新事件时按心跳间隔发送注释行保持连接
+    def subscribe(self, last_event_id=None, events=None, heartbeat=STREAM_HEARTBEAT_INTERVAL):
+        with self._cond:
+            self.subscribers += 1
+            backlog = self._backlog(last_event_id, events)
+            cursor = self._next_id - 1
+        try:
+            yield "retry: 3000\n\n"
+            if backlog:
+                yield ''.join(backlog)
+            last_sent = time.monotonic()
+            while True:
+                with self._cond:
+                    if self._next_id - 1 == cursor:
+                        self._cond.wait(max(last_sent + heartbeat - time.monotonic(), 0))
+                    messages = None
+                    if self._next_id - 1 != cursor:
+                        # 缓冲区中的事件已被覆盖时（客户端太慢）_backlog会改为发送resync
+                        messages = ''.join(self._backlog(cursor, events))
+                        cursor = self._next_id - 1
+                if messages:
+                    yield messages
+                elif time.monotonic() - last_sent >= heartbeat:
+                    yield ': heartbeat\n\n'
+                else:
+                    continue
+                last_sent = time.monotonic()
+        finally:
+            with self._cond:
+                self.subscribers -= 1
+
+event_hub = EventHub(STREAM_BUFFER_SIZE)
+
+# Target拓扑快照：tgtadm原始输出与解析结果一起缓存，并发请求共享同一次tgtadm调用
+_topology_cond = threading.Condition()
+_topology_snapshot = None
+_topology_generation = 0
+_topology_refreshing = False
+
+# 使拓扑快照失效，所有修改Target/LUN/ACL的操作之后都需要调用
+def invalidate_topology():
+    global _topology_generation
+    with _topology_cond:
+        _topology_generation += 1
+        _topology_cond.notify_all()
+
+# 装饰器：路由执行结束后（无论成功与否）使拓扑快照失效
+def invalidates_topology(func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        finally:
+            invalidate_topology()
+    return wrapper
+
+# 获取拓扑快照，过期或失效时刷新；已有刷新在进行时等待其结果而不是重复调用tgtadm
+def get_topology_snapshot(force=False):
+    global _topology_snapshot, _topology_generation, _topology_refreshing
+    with _topology_cond:
+        if force:
+            _topology_generation += 1
+        while True:
+            snapshot = _topology_snapshot
+            if (snapshot is not None
+                    and snapshot['generation'] == _topology_generation
+                    and time.monotonic() - snapshot['fetched_at'] < TOPOLOGY_CACHE_TTL):
+                return snapshot
+            if not _topology_refreshing:
+                _topology_refreshing = True
+                generation = _topology_generation
+                break
+            with span('topology.wait'):
+                _topology_cond.wait()
+
+    snapshot = None
+    previous = _topology_snapshot
+    try:
+        snapshot = fetch_topology(generation)
+    finally:
+        with _topology_cond:
+            _topology_refreshing = False
+            if snapshot is not None:
+                _topology_snapshot = snapshot
+            _topology_cond.notify_all()
+    if event_hub.subscribers and (previous is None or previous['output'] != snapshot['output']
+                                  or previous['success'] != snapshot['success']):
+        publish_topology(snapshot)
+    return snapshot
+
 # 获取TGT信息
-def get_targets(max_retries=3, retry_delay=1):
+def get_targets():
+    return get_topology_snapshot()['targets']
+
+# tgtadm show输出解析后的记录：使用__slots__减少内存占用，to_dict()只在API边界生成
+class Nexus:
+    __slots__ = ('nexus_id', 'initiator', 'ip_address', 'connections')
+
+    def __init__(self, nexus_id):
+        self.nexus_id = nexus_id
+        self.initiator = None
+        self.ip_address = None
+        self.connections = 0
+
+    def to_dict(self):
+        return {
+            'nexus_id': self.nexus_id,
+            'initiator': self.initiator,
+            'ip_address': self.ip_address,
+            'connections': self.connections
+        }
+
+class Lun:
+    __slots__ = ('lun_id', 'type', 'size_bytes', 'block_size', 'backing_store', 'online', 'bstype', 'bsoflags')
+
+    def __init__(self, lun_id):
+        self.lun_id = lun_id
+        self.type = None
+        self.size_bytes = None
+        self.block_size = None
+        self.backing_store = None
+        self.online = None
+        self.bstype = None
+        self.bsoflags = None
+
+    @property
+    def size(self):
+        if self.size_bytes is None:
+            return None
+        return f"{self.size_bytes / (1024 * 1024 * 1024):.2f} GB"
+
+    @property
+    def status(self):
+        if self.online is None:
+            return None
+        return 'online' if self.online else 'offline'
+
+    def to_dict(self):
+        return {
+            'lun_id': self.lun_id,
+            'type': self.type,
+            'size': self.size,
+            'size_bytes': self.size_bytes,
+            'block_size': self.block_size,
+            'backing_store': self.backing_store,
+            'status': self.status,
+            'bstype': self.bstype,
+            'bsoflags': self.bsoflags
+        }
+
+class Target:
+    __slots__ = ('tid', 'name', 'luns', 'acl_list', 'nexus_information', 'system_information')
+
+    def __init__(self, tid, name):
+        self.tid = tid
+        self.name = name
+        self.luns = []
+        self.acl_list = []
+        self.nexus_information = []
+        self.system_information = {}
+
+    @property
+    def acl_mode(self):
+        return 'all' if 'ALL' in self.acl_list else 'whitelist'
+
+    def to_dict(self):
+        return {
+            'tid': self.tid,
+            'name': self.name,
+            'luns': [lun.to_dict() for lun in self.luns],
+            'initiators': [],
+            'acl_list': list(self.acl_list),
+            'acl_mode': self.acl_mode,
+            'nexus_information': [nexus.to_dict() for nexus in self.nexus_information]
+        }
+
+_TARGET_LINE = re.compile(r'Target (\d+): (.+)')
+_SIZE_UNITS = {'B': 1, 'KB': 1000, 'MB': 1000 ** 2, 'GB': 1000 ** 3, 'TB': 1000 ** 4}
+
+# tgtadm show输出中4空格缩进的段落
+_SECTION_SYSTEM = 1
+_SECTION_LUN = 2
+_SECTION_ACL = 3
+_SECTION_NEXUS = 4
+_SECTIONS = {
+    'System information:': _SECTION_SYSTEM,
+    'LUN information:': _SECTION_LUN,
+    'ACL information:': _SECTION_ACL,
+    'I_T nexus information:': _SECTION_NEXUS
+}
+
+# 解析LUN的Size行，例如"10737 MB, Block size: 512"（tgtd按1000进制输出MB）
+def parse_lun_size(value):
+    size_part, _, block_part = value.partition(',')
+    number, _, unit = size_part.strip().partition(' ')
+    try:
+        size_bytes = int(float(number) * _SIZE_UNITS.get(unit.strip().upper() or 'B', 1))
+    except ValueError:
+        size_bytes = None
+    _, _, block_size = block_part.partition(':')
+    try:
+        block_size = int(block_size)
+    except ValueError:
+        block_size = None
+    return size_bytes, block_size
+
+# 解析LUN的Backing store flags行，例如"O_DIRECT O_SYNC"，返回"direct:sync"格式，没有标志时返回None
+def parse_bsoflags(value):
+    flags = []
+    for token in value.replace('|', ' ').replace(':', ' ').split():
+        token = token.lower()
+        flags.append(token[2:] if token.startswith('o_') else token)
+    return ':'.join(flags) or None
+
+# 单次遍历解析tgtadm --mode target --op show的输出，返回Target记录列表
+def parse_tgtadm_show(output):
+    targets = []
+    target = lun = nexus = None
+    section = None
+
+    for line in output.splitlines():
+        content = line.lstrip(' ')
+        if not content:
+            continue
+        indent = len(line) - len(content)
+
+        # Target行
+        if indent == 0:
+            match = _TARGET_LINE.match(content)
+            target = Target(match.group(1), match.group(2).rstrip()) if match else None
+            if target is not None:
+                targets.append(target)
+            section = lun = nexus = None
+            continue
+        if target is None:
+            continue
+
+        # 4空格缩进的段落标题
+        if indent == 4:
+            section = _SECTIONS.get(content.rstrip())
+            lun = nexus = None
+            continue
+
+        key, sep, value = content.partition(':')
+        if section == _SECTION_LUN:
+            if indent == 8 and key == 'LUN':
+                lun = Lun(value.strip())
+                target.luns.append(lun)
+            elif indent == 12 and lun is not None:
+                if key == 'Type':
+                    lun.type = value.strip()
+                elif key == 'Size':
+                    lun.size_bytes, lun.block_size = parse_lun_size(value)
+                elif key == 'Backing store path':
+                    value = value.strip()
+                    if value.lower() != 'none':
+                        lun.backing_store = value
+                elif key == 'Online':
+                    lun.online = value.strip() == 'Yes'
+                elif key == 'Backing store type':
+                    lun.bstype = value.strip() or None
+                elif key == 'Backing store flags':
+                    lun.bsoflags = parse_bsoflags(value)
+        elif section == _SECTION_NEXUS:
+            if indent == 8 and key == 'I_T nexus':
+                nexus = Nexus(value.strip())
+                target.nexus_information.append(nexus)
+            elif nexus is not None:
+                if indent == 12 and key == 'Initiator':
+                    nexus.initiator = value.strip()
+                elif indent == 12 and key == 'Connection':
+                    nexus.connections += 1
+                elif indent == 16 and key == 'IP Address':
+                    nexus.ip_address = value.strip()
+        elif section == _SECTION_ACL:
+            if indent == 8:
+                target.acl_list.append(content.rstrip())
+        elif section == _SECTION_SYSTEM:
+            if indent == 8 and sep:
+                target.system_information[key.strip()] = value.strip()
+
+    # 控制器LUN（LUN 0）不对外展示
+    for target in targets:
+        target.luns = [lun for lun in target.luns if lun.type != 'controller']
+    return targets
+
+# 调用tgtadm获取Target信息并解析，生成新的拓扑快照
+def fetch_topology(generation, max_retries=3, retry_delay=1):
     logger.info("获取Target信息...")
     
     for attempt in range(max_retries):
         try:
-            result = run_command('tgtadm --lld iscsi --mode target --op show')
+            result = get_tgtd_client().target_show()
             if result['success']:
                 break
             logger.warning(f"尝试 {attempt + 1}/{max_retries} 失败: {result['error']}")
@@ -102,188 +907,27 @@ def get_targets(max_retries=3, retry_delay=1):
     
     if not result['success']:
         logger.error("获取Target信息失败，已达到最大重试次数")
-        return []
-    
-    logger.info("解析Target信息...")
-    targets = []
-    current_data = {}
-    current_section = None
-    current_lun = None
-    current_nexus = None
-    current_connection = False
-    
-    for line in result['output'].split('\n'):
-        line_content = line.rstrip()
-        if not line_content:
-            continue
-            
-        # 计算缩进级别
-        indent = len(line_content) - len(line_content.lstrip())
-        content = line_content.lstrip()
-        
-        # Target行处理
-        if content.startswith('Target '):
-            if current_data:
-                targets.append(process_target_data(current_data))
-            match = re.search(r'Target (\d+): (.+)', content)
-            if match:
-                tid, name = match.groups()
-                current_data = {
-                    'target': {
-                        'tid': tid,
-                        'name': name
-                    },
-                    'system_information': {},
-                    'lun_information': {},
-                    'acl_information': [],
-                    'nexus_information': []
-                }
-            current_section = None
-            current_lun = None
-            current_nexus = None
-            current_connection = False
-            continue
-        
-        # 处理4空格缩进的主要部分（一级数组）
-        if indent == 4:
-            if content.endswith(':'):
-                current_section = content[:-1]
-                if current_section == 'LUN information':
-                    current_data['lun_information'] = {}
-                elif current_section == 'System information':
-                    current_data['system_information'] = {}
-                elif current_section == 'ACL information':
-                    current_data['acl_information'] = []
-                elif current_section == 'I_T nexus information':
-                    current_data['nexus_information'] = []
-            continue
-        
-        # 处理8空格缩进的子部分（二级数组）
-        if indent == 8 and current_section:
-            if current_section == 'LUN information':
-                if content.startswith('LUN:'):
-                    lun_id = content.split(':')[1].strip()
-                    current_lun = lun_id
-                    current_data['lun_information'][lun_id] = {
-                        'lun_id': lun_id,
-                        'type': None,
-                        'size': None,
-                        'backing_store': None,
-                        'status': None
-                    }
-            elif current_section == 'System information':
-                if ':' in content:
-                    key, value = content.split(':', 1)
-                    current_data['system_information'][key.strip()] = value.strip()
-            elif current_section == 'ACL information':
-                current_data['acl_information'].append(content.strip())
-            elif current_section == 'I_T nexus information':
-                if content.startswith('I_T nexus:'):
-                    nexus_id = content.split(':')[1].strip()
-                    current_nexus = {
-                        'nexus_id': nexus_id,
-                        'initiator': None,
-                        'ip_address': None
-                    }
-                    current_data['nexus_information'].append(current_nexus)
-                    current_connection = False
-                elif content.startswith('Connection:'):
-                    current_connection = True
-            continue
-
-        # 处理12空格缩进的部分（LUN详细信息和I_T nexus详细信息）
-        if indent == 12:
-            if current_section == 'LUN information' and current_lun:
-                if ':' in content:
-                    key, value = [x.strip() for x in content.split(':', 1)]
-                    if key == 'Type':
-                        current_data['lun_information'][current_lun]['type'] = value
-                    elif key == 'Size':
-                        # 将MB转换为GB
-                        size_str = value.split(',')[0].strip()
-                        try:
-                            size_mb = float(size_str.split()[0])
-                            size_gb = size_mb / 1024
-                            current_data['lun_information'][current_lun]['size'] = f"{size_gb:.2f} GB"
-                        except (ValueError, IndexError):
-                            current_data['lun_information'][current_lun]['size'] = size_str
-                    elif key == 'Backing store path':
-                        if value.lower() != 'none':
-                            current_data['lun_information'][current_lun]['backing_store'] = value
-                    elif key == 'Online':
-                        current_data['lun_information'][current_lun]['status'] = 'online' if value == 'Yes' else 'offline'
-            elif current_section == 'I_T nexus information' and current_nexus:
-                if content.startswith('Initiator:'):
-                    current_nexus['initiator'] = content.split(':', 1)[1].strip()
-
-        if indent == 16:
-            if current_section == 'I_T nexus information'  and current_nexus:
-                if content.startswith('IP Address:'):
-                    current_nexus['ip_address'] = content.split(':', 1)[1].strip()
-
-        # if indent == 16:
-
-    # 处理最后一个Target的数据
-    if current_data:
-        targets.append(process_target_data(current_data))
-    
-    logger.info(f"Target信息解析完成，{targets}")
-    return targets
-
-# 更新LUN信息
-def update_lun_info(lun, content):
-    type_match = re.search(r'Type:\s+([\w-]+)', content)
-    if type_match:
-        lun['type'] = type_match.group(1)
-        return
-    
-    size_match = re.search(r'Size:\s+([\d\.]+\s*[KMGTP]?B)', content)
-    if size_match:
-        lun['size'] = size_match.group(1)
-        return
-    
-    bs_match = re.search(r'Backing store path:\s+([^\s]+)', content)
-    if bs_match:
-        backing_store = bs_match.group(1).strip('" ')
-        if backing_store.lower() != 'none':
-            lun['backing_store'] = backing_store
-        return
+        return {
+            'output': result['output'],
+            'targets': [],
+            'success': False,
+            'error': result['error'],
+            'fetched_at': time.monotonic(),
+            'generation': generation
+        }
     
-    status_match = re.search(r'Online:\s+(Yes|No)', content)
-    if status_match:
-        lun['status'] = 'online' if status_match.group(1) == 'Yes' else 'offline'
-
-# 处理Target数据并返回标准格式
-def process_target_data(data):
-    target_info = {
-        'tid': data['target']['tid'],
-        'name': data['target']['name'],
-        'luns': [],
-        'initiators': [],
-        'acl_list': [],
-        'acl_mode': 'whitelist',
-        'nexus_information': data.get('nexus_information', [])
+    with span('parse_tgtadm_show'):
+        targets = parse_tgtadm_show(result['output'])
+    logger.info(f"Target信息解析完成，共{len(targets)}个Target")
+    return {
+        'output': result['output'],
+        'targets': targets,
+        'success': True,
+        'error': None,
+        'fetched_at': time.monotonic(),
+        'generation': generation
     }
 
-    # 处理LUN信息
-    if 'lun_information' in data:
-        for lun_id, lun_data in data['lun_information'].items():
-            if isinstance(lun_data, dict) and lun_data.get('type') != 'controller':
-                target_info['luns'].append(lun_data)
-    
-    # 处理ACL信息
-    if 'acl_information' in data:
-        # 确保acl_list始终是一个有效的列表
-        acl_info = data['acl_information']
-        if isinstance(acl_info, list):
-            target_info['acl_list'] = acl_info
-        else:
-            target_info['acl_list'] = []
-            
-        target_info['acl_mode'] = 'all' if 'ALL' in data.get('acl_information', []) else 'whitelist'
-    
-    return target_info
-
 # 获取默认IQN值
 def get_default_iqns():
     # 使用统一的IQN值，与iscsi_server.sh保持一致
@@ -300,94 +944,415 @@ def get_default_iqns():
     
     return default_iqns
 
+# 根据文件名判断磁盘类型
+def get_disk_type(name):
+    name = name.lower()
+    if name.startswith('lvm-'):
+        return 'lvm'
+    if name.endswith(('.vhd', '.vhdx')):
+        return 'vhd'
+    if name.endswith('.vmdk'):
+        return 'vmdk'
+    if name.endswith('.qcow2'):
+        return 'qcow2'
+    if name.endswith('.img'):
+        return 'img'
+    if name.endswith('.iso'):
+        return 'iso'
+    return 'raw'
+
+# inotify监听：通过ctypes调用libc，不可用时DiskInventory退回按目录mtime检查
+class InotifyWatcher:
+    IN_ATTRIB = 0x00000004
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_MOVE_SELF = 0x00000800
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    WATCH_MASK = (IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO |
+                  IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF)
+    EVENT_STRUCT = struct.Struct('iIII')
+
+    def __init__(self, callback):
+        self._libc = ctypes.CDLL(None, use_errno=True)
+        self._fd = self._libc.inotify_init1(os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1失败')
+        self._callback = callback
+        self._watches = {}
+        self._thread = threading.Thread(target=self._run, name='disk-inotify', daemon=True)
+        self._thread.start()
+
+    def add_watch(self, path):
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), self.WATCH_MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f'inotify_add_watch失败: {path}')
+        self._watches[wd] = path
+
+    def _run(self):
+        while True:
+            try:
+                data = os.read(self._fd, 65536)
+            except OSError as e:
+                logger.error(f"读取inotify事件失败: {e}")
+                self._callback(None, None, self.IN_Q_OVERFLOW)
+                return
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = self.EVENT_STRUCT.unpack_from(data, offset)
+                offset += self.EVENT_STRUCT.size
+                name = os.fsdecode(data[offset:offset + length].rstrip(b'\0')) or None
+                offset += length
+                if mask & self.IN_IGNORED:
+                    self._watches.pop(wd, None)
+                    continue
+                self._callback(self._watches.get(wd), name, mask)
+
+# 磁盘文件索引：以路径为键缓存(inode, mtime, size)，用os.scandir构建，
+# 之后通过inotify或目录mtime增量刷新，请求直接读取内存中的结果
+class DiskInventory:
+    def __init__(self, root, poll_interval=INVENTORY_POLL_INTERVAL, full_rescan_interval=INVENTORY_FULL_RESCAN_INTERVAL):
+        self.root = root
+        self.poll_interval = poll_interval
+        self.full_rescan_interval = full_rescan_interval
+        self._lock = threading.Lock()
+        self._files = {}
+        self._dirs = {}
+        self._dirty_dirs = set()
+        self._dirty_files = set()
+        self._needs_full_scan = True
+        self._watcher = None
+        self._watcher_failed = False
+        self._last_poll = 0.0
+        self._last_full_scan = 0.0
+        self._entries = None
+
+    # 返回按文件名排序的磁盘文件列表，每项为{'path','name','inode','mtime','size','allocated','type'}
+    # refresh=False时直接返回上次扫描的结果，不访问文件系统
+    def entries(self, refresh=True):
+        with self._lock:
+            if refresh:
+                with span('disk_inventory.refresh'):
+                    self._refresh()
+            if self._entries is None:
+                self._entries = sorted(self._files.values(), key=lambda x: x['name'].lower())
+            return self._entries
+
+    # 标记路径已变化（本进程创建或删除磁盘文件后调用）
+    def invalidate(self, path):
+        with self._lock:
+            self._dirty_dirs.add(os.path.dirname(path))
+            self._dirty_files.add(path)
+
+    def _on_event(self, directory, name, mask):
+        with self._lock:
+            if directory is None or mask & InotifyWatcher.IN_Q_OVERFLOW:
+                self._needs_full_scan = True
+            elif mask & (InotifyWatcher.IN_ATTRIB | InotifyWatcher.IN_CLOSE_WRITE) and name:
+                self._dirty_files.add(os.path.join(directory, name))
+            else:
+                self._dirty_dirs.add(directory)
+
+    def _refresh(self):
+        now = time.monotonic()
+        if self._needs_full_scan or now - self._last_full_scan >= self.full_rescan_interval:
+            self._full_scan()
+            return
+        if self._watcher is None and now - self._last_poll >= self.poll_interval:
+            # 没有inotify时检查每个目录的mtime，只重新扫描发生变化的目录
+            self._last_poll = now
+            for directory, mtime in list(self._dirs.items()):
+                try:
+                    if os.stat(directory).st_mtime_ns != mtime:
+                        self._dirty_dirs.add(directory)
+                except FileNotFoundError:
+                    self._dirty_dirs.add(directory)
+        while self._dirty_dirs:
+            self._scan_dir(self._dirty_dirs.pop(), recursive=False)
+        while self._dirty_files:
+            self._stat_file(self._dirty_files.pop())
+
+    def _full_scan(self):
+        self._needs_full_scan = False
+        self._last_full_scan = self._last_poll = time.monotonic()
+        self._dirty_dirs.clear()
+        self._dirty_files.clear()
+        self._files = {}
+        self._dirs = {}
+        self._entries = None
+        if not os.path.exists(self.root):
+            os.makedirs(self.root)
+            logger.info(f"创建磁盘目录: {self.root}")
+        if self._watcher is None and not self._watcher_failed:
+            try:
+                self._watcher = InotifyWatcher(self._on_event)
+            except (OSError, AttributeError) as e:
+                self._watcher_failed = True
+                logger.warning(f"inotify不可用，磁盘索引改为按目录mtime刷新: {e}")
+        self._scan_dir(self.root, recursive=True)
+        logger.info(f"磁盘索引已重建: {len(self._files)}个文件")
+
+    # 扫描一个目录：新增的子目录递归扫描，已删除的文件和子目录从索引中移除
+    def _scan_dir(self, directory, recursive):
+        self._entries = None
+        try:
+            mtime = os.stat(directory).st_mtime_ns
+            entries = list(os.scandir(directory))
+        except (FileNotFoundError, NotADirectoryError):
+            self._forget_dir(directory)
+            return
+        known_dir = directory in self._dirs
+        self._dirs[directory] = mtime
+        if self._watcher is not None and not known_dir:
+            try:
+                self._watcher.add_watch(directory)
+            except OSError as e:
+                logger.warning(f"inotify监听目录失败，改为按目录mtime刷新: {e}")
+                self._watcher = None
+                self._watcher_failed = True
+
+        seen_files = set()
+        seen_dirs = set()
+        for entry in entries:
+            try:
+                if entry.is_dir():
+                    seen_dirs.add(entry.path)
+                    if recursive or entry.path not in self._dirs:
+                        self._scan_dir(entry.path, recursive=True)
+                elif entry.is_file() and not entry.name.startswith('.'):
+                    seen_files.add(entry.path)
+                    self._add_file(entry.path, entry.name, entry.stat())
+            except OSError:
+                continue
+
+        for path in [p for p in self._files if os.path.dirname(p) == directory and p not in seen_files]:
+            del self._files[path]
+        for path in [d for d in self._dirs if os.path.dirname(d) == directory and d not in seen_dirs]:
+            self._forget_dir(path)
+
+    def _forget_dir(self, directory):
+        prefix = directory + os.sep
+        self._dirs = {d: m for d, m in self._dirs.items() if d != directory and not d.startswith(prefix)}
+        self._files = {p: e for p, e in self._files.items() if not p.startswith(prefix)}
+        self._entries = None
+
+    def _stat_file(self, path):
+        self._entries = None
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            self._files.pop(path, None)
+            return
+        if stat.S_ISREG(st.st_mode) and not os.path.basename(path).startswith('.'):
+            self._add_file(path, os.path.basename(path), st)
+
+    def _add_file(self, path, name, st):
+        entry = self._files.get(path)
+        if entry and (entry['inode'], entry['mtime'], entry['size']) == (st.st_ino, st.st_mtime_ns, st.st_size):
+            return
+        if not os.access(path, os.R_OK):
+            self._files.pop(path, None)
+            return
+        self._files[path] = {
+            'path': path,
+            'name': name,
+            'inode': st.st_ino,
+            'mtime': st.st_mtime_ns,
+            'size': st.st_size,
+            'allocated': st.st_blocks * 512,
+            'type': get_disk_type(name)
+        }
+        self._entries = None
+
+# JSON元数据文件缓存：文件mtime未变化时直接返回内存中的内容
+class JsonFileCache:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._data = {}
+
+    def get(self):
+        with self._lock:
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+            except FileNotFoundError:
+                self._mtime, self._data = None, {}
+                return self._data
+            if mtime != self._mtime:
+                try:
+                    with open(self.path, 'r') as f:
+                        self._data = json.load(f)
+                    self._mtime = mtime
+                    logger.info(f"已加载{os.path.basename(self.path)}: {len(self._data)}个记录")
+                except (OSError, ValueError) as e:
+                    logger.error(f"读取{self.path}失败: {str(e)}")
+            return self._data
+
+    def update(self, key, value):
+        self.update_many({key: value})
+
+    # 一次写入多个键，只写一次文件
+    def update_many(self, values):
+        data = dict(self.get())
+        data.update(values)
+        self.replace(data)
+
+    # 用新的内容替换整个文件
+    def replace(self, data):
+        with self._lock:
+            atomic_write(self.path, json.dumps(data, ensure_ascii=False).encode('utf-8'))
+            self._data = data
+            self._mtime = os.stat(self.path).st_mtime_ns
+
+disk_inventory = DiskInventory(BASE_DISK_DIR)
+disk_methods_cache = JsonFileCache(DISK_METHODS_FILE)
+lun_backends_cache = JsonFileCache(LUN_BACKENDS_FILE)  # 后备存储路径 -> {'bstype','bsoflags','bsopts'}
+tuning_cache = JsonFileCache(TUNING_FILE)              # {'probe', 'profiles': {后备存储路径: 调优结果}, 'tuned_at'}
+
 # 获取系统中的磁盘文件
 def get_disk_files():
-    disk_files = []
-    base_disk_dir = '/app/iscsi'
-    
-    # 确保目录存在
-    if not os.path.exists(base_disk_dir):
-        os.makedirs(base_disk_dir)
-        logger.info(f"创建磁盘目录: {base_disk_dir}")
+    with span('get_disk_files'):
+        return _get_disk_files()
 
+def _get_disk_files():
     # 获取当前所有Target的LUN信息
     targets = get_targets()
     lun_mappings = {}
     for target in targets:
-        for lun in target.get('luns', []):
-            if lun.get('backing_store') and lun.get('type') != 'controller':
-                lun_mappings[lun['backing_store']] = {
-                    'target_id': target['tid'],
-                    'lun_id': lun['lun_id'],
-                    'target_name': target['name'],
-                    'lun_size': lun['size']
+        for lun in target.luns:
+            if lun.backing_store:
+                lun_mappings[lun.backing_store] = {
+                    'target_id': target.tid,
+                    'lun_id': lun.lun_id,
+                    'target_name': target.name,
+                    'lun_size': lun.size
                 }
-    
-    # 按文件名排序
-    disk_files = sorted(disk_files, key=lambda x: x['name'].lower())
 
-    # 尝试读取磁盘创建方法信息
-    disk_methods = {}
-    disk_methods_file = '/app/config/disk_methods.json'
-    if os.path.exists(disk_methods_file):
-        try:
-            with open(disk_methods_file, 'r') as f:
-                disk_methods = json.load(f)
-            logger.info(f"已加载磁盘创建方法信息: {len(disk_methods)}个记录")
-        except Exception as e:
-            logger.error(f"读取磁盘创建方法信息失败: {str(e)}")
-
-    # 递归扫描目录及其子目录
-    for root, dirs, files in os.walk(base_disk_dir):
-        for file in files:
-            path = os.path.join(root, file)
-            if os.path.isfile(path) and os.access(path, os.R_OK):
-                size = os.path.getsize(path) / (1024 * 1024 * 1024)  # 转换为GB
-                
-                # 根据文件扩展名判断磁盘类型
-                disk_type = 'raw'  # 默认为raw类型
-                file_lower = file.lower()
-                if file_lower.startswith('lvm-'):
-                    disk_type = 'lvm'
-                elif file_lower.endswith(('.vhd', '.vhdx')):
-                    disk_type = 'vhd'
-                elif file_lower.endswith('.vmdk'):
-                    disk_type = 'vmdk'
-                elif file_lower.endswith('.qcow2'):
-                    disk_type = 'qcow2'
-                elif file_lower.endswith('.img'):
-                    disk_type = 'img'
-                elif file_lower.endswith('.iso'):
-                    disk_type = 'iso'
-                elif file_lower.endswith('.raw'):
-                    disk_type = 'raw'
-
-                disk_info = {
-                    'path': path,
-                    'name': file,
-                    'size': f"{size:.2f} GB",
-                    'type': disk_type,
-                    'create_method': disk_methods.get(file, '未知') 
-                }
-                
-                # 添加LUN映射信息
-                if path in lun_mappings:
-                    disk_info['used_by'] = lun_mappings[path]
-                else:
-                    disk_info['used_by'] = ''
-                
-                disk_files.append(disk_info)
-    
+    # 磁盘创建方法信息（旧版本记录的是方法名称字符串，新版本记录包含分配方式和创建速度的字典）
+    disk_methods = disk_methods_cache.get()
+    scan_reports = scan_reports_cache.get()
+    cache_policies = cache_policies_cache.get()
+    cache_status = cache_manager.status()
+
+    disk_files = []
+    for entry in disk_inventory.entries():
+        path = entry['path']
+        method = disk_methods.get(entry['name'], '未知')
+        # 扫描之后文件有变化时报告已过期，不再显示
+        report = scan_reports.get(path)
+        if report and (report['mtime_ns'], report['size_bytes']) != (entry['mtime'], entry['size']):
+            report = None
+        resident = cache_manager.residency(path)[0]
+        cache_policy = (cache_policies.get(path) or {}).get('policy', 'none')
+        disk_files.append({
+            'path': path,
+            'name': entry['name'],
+            'size': f"{entry['size'] / (1024 * 1024 * 1024):.2f} GB",
+            'allocated': f"{entry['allocated'] / (1024 * 1024 * 1024):.2f} GB",
+            'apparent_bytes': entry['size'],
+            'allocated_bytes': entry['allocated'],
+            'type': entry['type'],
+            'create_method': method['method'] if isinstance(method, dict) else method,
+            'allocation': method.get('allocation') if isinstance(method, dict) else None,
+            'used_by': lun_mappings.get(path, ''),
+            'reclaimable': f"{report['reclaimable_bytes'] / (1024 * 1024 * 1024):.2f} GB" if report else None,
+            'scan': report,
+            'cache_resident': f"{resident / (1024 * 1024 * 1024):.2f} GB" if resident is not None else None,
+            'cache_resident_bytes': resident,
+            'cache_policy': cache_policy,
+            'cache_policy_name': CACHE_POLICIES[cache_policy],
+            'cache_status': cache_status.get(path)
+        })
     return disk_files
 
+# 汇总磁盘空间：按目录、文件系统和Target统计表观大小与实际分配，全部基于磁盘索引的缓存数据
+# 文件系统的超配比例为其中镜像表观大小之和除以文件系统容量，shortfall为稀疏镜像全部写满时还缺少的空间
+def get_capacity_summary(targets):
+    entries = disk_inventory.entries()
+    by_path = {entry['path']: entry for entry in entries}
+
+    directories = {}
+    for entry in entries:
+        totals = directories.setdefault(os.path.dirname(entry['path']), [0, 0, 0])
+        totals[0] += 1
+        totals[1] += entry['size']
+        totals[2] += entry['allocated']
+
+    # 目录按st_dev归到所在的文件系统，每个文件系统只调用一次statvfs
+    filesystems = {}
+    for directory, (files, apparent, allocated) in directories.items():
+        try:
+            dev = os.stat(directory).st_dev
+        except OSError:
+            continue
+        fs = filesystems.get(dev)
+        if fs is None:
+            try:
+                st = os.statvfs(directory)
+            except OSError:
+                continue
+            fs = filesystems[dev] = {
+                'path': directory,
+                'total_bytes': st.f_blocks * st.f_frsize,
+                'free_bytes': st.f_bavail * st.f_frsize,
+                'files': 0,
+                'apparent_bytes': 0,
+                'allocated_bytes': 0
+            }
+        fs['files'] += files
+        fs['apparent_bytes'] += apparent
+        fs['allocated_bytes'] += allocated
+    for fs in filesystems.values():
+        unallocated = max(0, fs['apparent_bytes'] - fs['allocated_bytes'])
+        fs['overcommit_ratio'] = round(fs['apparent_bytes'] / fs['total_bytes'], 3) if fs['total_bytes'] else None
+        fs['shortfall_bytes'] = max(0, unallocated - fs['free_bytes'])
+
+    target_totals = []
+    for target in targets:
+        provisioned = allocated = 0
+        for lun in target.luns:
+            entry = by_path.get(lun.backing_store)
+            if entry is None:
+                continue
+            provisioned += lun.size_bytes if lun.size_bytes is not None else entry['size']
+            allocated += entry['allocated']
+        target_totals.append({
+            'tid': target.tid,
+            'name': target.name,
+            'provisioned_bytes': provisioned,
+            'allocated_bytes': allocated
+        })
+
+    filesystem_list = list(filesystems.values())
+    total_bytes = sum(fs['total_bytes'] for fs in filesystem_list)
+    apparent_bytes = sum(fs['apparent_bytes'] for fs in filesystem_list)
+    return {
+        'apparent_bytes': apparent_bytes,
+        'allocated_bytes': sum(fs['allocated_bytes'] for fs in filesystem_list),
+        'total_bytes': total_bytes,
+        'free_bytes': sum(fs['free_bytes'] for fs in filesystem_list),
+        'overcommit_ratio': round(apparent_bytes / total_bytes, 3) if total_bytes else None,
+        'shortfall_bytes': sum(fs['shortfall_bytes'] for fs in filesystem_list),
+        'filesystems': filesystem_list,
+        'directories': [
+            {'path': path, 'files': files, 'apparent_bytes': apparent, 'allocated_bytes': allocated}
+            for path, (files, apparent, allocated) in sorted(directories.items())
+        ],
+        'targets': target_totals
+    }
+
 # 获取tgtadm命令的原始输出
 def get_tgtadm_output():
-    logger.info("获取tgtadm命令原始输出...")
-    result = run_command('tgtadm --lld iscsi --mode target --op show')
-    if result['success']:
-        return result['output']
+    snapshot = get_topology_snapshot()
+    if snapshot['success']:
+        return snapshot['output']
     else:
-        logger.error(f"获取tgtadm命令输出失败: {result['error']}")
+        logger.error(f"获取tgtadm命令输出失败: {snapshot['error']}")
         return "获取tgtadm命令输出失败，请检查iSCSI服务是否正常运行。"
 
 # 路由：主页
@@ -397,69 +1362,492 @@ def index():
     disk_files = get_disk_files()
     default_iqns = get_default_iqns()
     tgtadm_output = get_tgtadm_output()
-    return render_template('index.html', targets=targets, disk_files=disk_files, default_iqns=default_iqns, tgtadm_output=tgtadm_output)
+    with span('render index.html'):
+        return render_template('index.html', targets=targets, disk_files=disk_files, default_iqns=default_iqns,
+                               tgtadm_output=tgtadm_output, tuning=tuning_cache.get())
 
 # 路由：刷新Target列表
 @app.route('/refresh_targets', methods=['POST'])
 def refresh_targets():
-    targets = get_targets()
+    targets = get_topology_snapshot(force=True)['targets']
     return jsonify({
         'success': True,
-        'targets': targets
+        'targets': [target.to_dict() for target in targets]
     })
 
-# 添加save_config函数
-def save_config():
-    logger.info("保存tgt配置到持久化目录...")
+# 原子写文件：写入同目录临时文件、fsync后rename，再fsync所在目录
+def atomic_write(path, data):
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=f'.{os.path.basename(path)}.', dir=directory)
     try:
-         # 设置正确的locale环境变量
-        env = os.environ.copy()
-        env['LC_ALL'] = 'C.UTF-8'
-        env['LANG'] = 'C.UTF-8'
-        
-        subprocess.run(
-            f'tgt-admin --dump | grep -v "^>" | grep -v "^default-driver" > /etc/tgt/conf.d/docker.conf',
-            shell=True, check=True, env=env
-        )
-        subprocess.run(
-            f'cp -rf /etc/tgt/* /app/config/tgt/',
-            shell=True, check=True, env=env
-        )
-        subprocess.run(
-            'if [ -d "/var/lib/tgt" ] && [ "$(ls -A /var/lib/tgt)" ]; then '
-            'cp -rf /var/lib/tgt/* /app/config/tgt_lib/; '
-            'fi',
-            shell=True, check=True, env=env
-        )
-        logger.info("配置保存成功")
-        return True
-    except subprocess.CalledProcessError as e:
-        logger.error(f"配置保存失败: {e.stderr.decode() if e.stderr else str(e)}")
-        return False
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    dir_fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
 
-# 路由：增加Target
-@app.route('/target/create', methods=['POST'])
-def create_target():
-    target_name = request.form.get('target_name')
-    tid = request.form.get('tid')
-    acl_mode = request.form.get('acl_mode')
-    initiator_address = request.form.get('initiator_address')
-    
-    # 增加ID范围验证
+# 内容发生变化时才写入，返回是否写入
+def write_if_changed(path, data):
     try:
-        tid_num = int(tid)
-        if tid_num < 1 or tid_num > MAX_TARGET_ID:
-            return jsonify({
-                'success': False,
-                'message': f'Target ID必须在1到{MAX_TARGET_ID}之间'
-            })
-    except ValueError:
-        return jsonify({
-            'success': False,
-            'message': 'Target ID必须是有效的数字'
-        })
-    
-    if not target_name or not tid:
+        with open(path, 'rb') as f:
+            if f.read() == data:
+                return False
+    except FileNotFoundError:
+        pass
+    atomic_write(path, data)
+    return True
+
+# 增量同步目录：只复制内容有变化的文件，返回写入的文件数
+def sync_tree(src_dir, dst_dir):
+    changed = 0
+    if not os.path.isdir(src_dir):
+        return changed
+    for entry in os.scandir(src_dir):
+        dst_path = os.path.join(dst_dir, entry.name)
+        if entry.is_dir(follow_symlinks=False):
+            changed += sync_tree(entry.path, dst_path)
+        elif entry.is_file():
+            with open(entry.path, 'rb') as f:
+                data = f.read()
+            if write_if_changed(dst_path, data):
+                shutil.copymode(entry.path, dst_path)
+                changed += 1
+    return changed
+
+# 导出当前tgt配置并增量复制到持久化目录，返回写入的文件数
+def flush_config():
+    logger.info("保存tgt配置到持久化目录...")
+    # 设置正确的locale环境变量
+    env = os.environ.copy()
+    env['LC_ALL'] = 'C.UTF-8'
+    env['LANG'] = 'C.UTF-8'
+
+    started = time.perf_counter()
+    try:
+        with span('exec tgt-admin'):
+            result = subprocess.run(['tgt-admin', '--dump'], check=True, env=env,
+                                    stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    finally:
+        command_duration.observe(('tgt-admin', 'exec'), time.perf_counter() - started)
+    lines = [line for line in result.stdout.splitlines(keepends=True)
+             if not line.startswith(b'>') and not line.startswith(b'default-driver')]
+    targets = get_targets()
+    lun_params = get_tuned_params(targets, tuning_cache.get().get('profiles') or {})
+    lines = apply_lun_backends(lines, targets, lun_backends_cache.get(), lun_params)
+    changed = int(write_if_changed(os.path.join(TGT_CONFIG_DIR, 'conf.d', 'docker.conf'), b''.join(lines)))
+    with span('sync_tree'):
+        changed += sync_tree(TGT_CONFIG_DIR, PERSIST_TGT_DIR)
+        changed += sync_tree(TGT_LIB_DIR, PERSIST_TGT_LIB_DIR)
+    logger.info(f"配置保存成功，写入{changed}个文件")
+    return changed
+
+_DUMP_TARGET_LINE = re.compile(rb'^\s*<target\s+(\S+)\s*>\s*$')
+_DUMP_BACKING_STORE_LINE = re.compile(rb'^(\s*)backing-store\s+(\S+)\s*$')
+
+# tgt-admin --dump不会输出LUN的后端类型、打开标志、后端参数和调优参数，把使用了非默认后端或有调优参数的
+# Target中的backing-store行改写为<backing-store>块，同时写明LUN号，重启后tgt-admin -e按原样恢复
+def apply_lun_backends(lines, targets, stored, lun_params=None):
+    lun_params = lun_params or {}
+    luns = {}  # (Target名称, 后备存储路径) -> (LUN号, bstype, bsoflags, bsopts, 调优参数)
+    custom_targets = set()
+    for target in targets:
+        for lun in target.luns:
+            if not lun.backing_store:
+                continue
+            bsopts = (stored.get(lun.backing_store) or {}).get('bsopts')
+            params = lun_params.get(lun.backing_store) or {}
+            luns[(target.name, lun.backing_store)] = (lun.lun_id, lun.bstype, lun.bsoflags, bsopts, params)
+            if (lun.bstype or 'rdwr') != 'rdwr' or lun.bsoflags or bsopts or params:
+                custom_targets.add(target.name)
+    if not custom_targets:
+        return lines
+
+    result = []
+    target_name = None
+    for line in lines:
+        match = _DUMP_TARGET_LINE.match(line)
+        if match:
+            target_name = match.group(1).decode('utf-8', errors='replace')
+        match = _DUMP_BACKING_STORE_LINE.match(line)
+        lun = luns.get((target_name, match.group(2).decode('utf-8', errors='replace'))) if match else None
+        if lun is None or target_name not in custom_targets:
+            result.append(line)
+            continue
+        indent = match.group(1).decode()
+        lun_id, bstype, bsoflags, bsopts, params = lun
+        block = [f'{indent}<backing-store {match.group(2).decode()}>', f'{indent}\tlun {lun_id}']
+        if bstype:
+            block.append(f'{indent}\tbs-type {bstype}')
+        if bsoflags:
+            block.append(f'{indent}\tbsoflags {bsoflags}')
+        if bsopts:
+            block.append(f'{indent}\tbsopts "{bsopts}"')
+        block.extend(f'{indent}\t{key} {value}' for key, value in params.items())
+        block.append(f'{indent}</backing-store>')
+        result.append(('\n'.join(block) + '\n').encode('utf-8'))
+    return result
+
+# 后台持久化线程：合并一段时间内的多次配置变更，静默期结束后统一写入一次
+class ConfigPersister:
+    def __init__(self, delay, retry_interval):
+        self.delay = delay
+        self.retry_interval = retry_interval
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._pending = False
+        self._last_change = 0.0
+        self._retry_at = 0.0  # 写入失败后，下一次重试的最早时间
+        self._thread = None
+
+    def mark_dirty(self):
+        with self._cond:
+            self._pending = True
+            self._last_change = time.monotonic()
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='config-persister', daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+
+    # 暂停写入（例如临时Target存在期间），期间的变更在退出后由后台线程写入
+    @contextlib.contextmanager
+    def paused(self):
+        with self._flush_lock:
+            yield
+
+    # 立即写入，返回写入的文件数；写入失败时保留未保存状态，由后台线程在静默期后重试
+    def flush(self):
+        with self._cond:
+            self._pending = False
+        try:
+            with self._flush_lock:
+                return flush_config()
+        except Exception:
+            self.mark_dirty()
+            raise
+
+    # 进程退出时写入尚未保存的变更
+    def shutdown(self):
+        with self._cond:
+            pending = self._pending
+        if pending:
+            try:
+                with self._flush_lock:
+                    flush_config()
+            except Exception as e:
+                logger.error(f"退出时保存配置失败: {e}")
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                while True:
+                    remaining = max(self._last_change + self.delay, self._retry_at) - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                self._pending = False
+            try:
+                with self._flush_lock:
+                    flush_config()
+                self._retry_at = 0.0
+            except Exception as e:
+                stderr = getattr(e, 'stderr', None)
+                logger.error(f"配置保存失败，{self.retry_interval:g}秒后重试: "
+                             f"{stderr.decode(errors='replace') if stderr else str(e)}")
+                # 恢复未保存状态，稍后重试；退出时也仍会写入
+                with self._cond:
+                    self._pending = True
+                    self._retry_at = time.monotonic() + self.retry_interval
+
+config_persister = ConfigPersister(CONFIG_SAVE_DELAY, CONFIG_SAVE_RETRY_INTERVAL)
+atexit.register(config_persister.shutdown)
+
+# 标记配置已变更，由后台线程在静默期后合并写入持久化目录
+def save_config():
+    config_persister.mark_dirty()
+
+# 路由：立即将tgt配置写入持久化目录
+@app.route('/api/config/flush', methods=['POST'])
+def flush_config_route():
+    try:
+        changed = config_persister.flush()
+    except (OSError, subprocess.CalledProcessError) as e:
+        stderr = getattr(e, 'stderr', None)
+        error = stderr.decode(errors='replace') if stderr else str(e)
+        logger.error(f"配置保存失败: {error}")
+        return jsonify({
+            'success': False,
+            'message': f'配置保存失败: {error}',
+            'error': error
+        })
+    return jsonify({
+        'success': True,
+        'message': f'配置已保存，写入{changed}个文件',
+        'data': {
+            'changed_files': changed
+        }
+    })
+
+# 从表单读取LUN后端设置，返回(设置, 错误信息)；bsoflags可以是多个同名字段或冒号分隔的字符串
+def parse_lun_backend(form):
+    bstype = (form.get('bstype') or '').strip() or None
+    flags = [flag for value in form.getlist('bsoflags') for flag in value.split(':') if flag.strip()]
+    bsopts = (form.get('bsopts') or '').strip() or None
+    if bstype is not None and bstype not in LUN_BSTYPES:
+        return None, f'不支持的后端类型: {bstype}，可选: {", ".join(LUN_BSTYPES)}'
+    invalid = [flag for flag in flags if flag.strip() not in LUN_BSOFLAGS]
+    if invalid:
+        return None, f'不支持的打开标志: {", ".join(invalid)}，可选: {", ".join(LUN_BSOFLAGS)}'
+    # tgtd的管理请求用逗号分隔参数，bsopts中不能出现逗号
+    if bsopts is not None and (',' in bsopts or '\n' in bsopts or '"' in bsopts):
+        return None, 'bsopts不能包含逗号、引号或换行，多个参数请用分号分隔'
+    return {
+        'bstype': bstype,
+        'bsoflags': ':'.join(dict.fromkeys(flag.strip() for flag in flags)) or None,
+        'bsopts': bsopts
+    }, None
+
+# 现有LUN的后端设置：bstype和bsoflags来自tgtd，bsopts来自创建LUN时的记录（tgtd不报告bsopts）
+def lun_backend(lun, stored=None):
+    stored = lun_backends_cache.get() if stored is None else stored
+    return {'bstype': lun.bstype, 'bsoflags': lun.bsoflags,
+            'bsopts': (stored.get(lun.backing_store) or {}).get('bsopts')}
+
+# LUN创建成功后记录后端设置，供持久化配置时使用
+def save_lun_backend(backing_store, backend):
+    try:
+        lun_backends_cache.update(backing_store, backend)
+    except Exception as e:
+        logger.error(f"保存LUN后端设置失败: {str(e)}")
+
+# ACL引擎：把Target的访问控制列表从当前状态改为期望的完整列表，只执行新增和删除的差异部分
+# IQN/EUI/NAA按initiator-name绑定，其余（IP地址、网段、ALL）按initiator-address绑定
+_ACL_NAME_PREFIXES = ('iqn.', 'eui.', 'naa.')
+
+# 规范化一条ACL规则，无效时抛出ValueError
+def normalize_acl_entry(entry):
+    entry = str(entry).strip()
+    if entry.upper() == 'ALL':
+        return 'ALL'
+    if entry.lower().startswith(_ACL_NAME_PREFIXES):
+        if len(entry) > 223 or any(c.isspace() or c == ',' for c in entry):
+            raise ValueError(f'无效的Initiator名称: {entry}')
+        return entry
+    try:
+        if '/' in entry:
+            return str(ipaddress.ip_network(entry, strict=False))
+        return str(ipaddress.ip_address(entry))
+    except ValueError:
+        raise ValueError(f'无效的Initiator地址或名称: {entry}')
+
+# 解析期望的ACL列表（列表或逗号/换行分隔的字符串），去重并保持顺序；包含ALL时只保留ALL
+def parse_acl_list(value):
+    if isinstance(value, str):
+        value = re.split(r'[,\n]', value)
+    if not isinstance(value, (list, tuple)):
+        raise ValueError('ACL列表必须是数组或逗号分隔的字符串')
+    entries = list(dict.fromkeys(normalize_acl_entry(item) for item in value if str(item).strip()))
+    return ['ALL'] if 'ALL' in entries else entries
+
+# 规范化tgtd中已有的规则，返回{规范化后的规则: 原始规则}；无法识别的规则原样保留
+def normalize_current_acl(current):
+    existing = {}
+    for entry in current:
+        try:
+            existing[normalize_acl_entry(entry)] = entry
+        except ValueError:
+            existing[entry] = entry
+    return existing
+
+# 计算差异：返回(需要新增的规则, 需要删除的tgtd原始规则)；当前规则按规范化后的形式比较
+def diff_acl(current, desired):
+    existing = normalize_current_acl(current)
+    to_add = [entry for entry in desired if entry not in existing]
+    wanted = set(desired)
+    to_remove = [raw for normalized, raw in existing.items() if normalized not in wanted]
+    return to_add, to_remove
+
+def _acl_bind(tgtd, tid, entry, bind):
+    op = tgtd.target_bind if bind else tgtd.target_unbind
+    if entry.lower().startswith(_ACL_NAME_PREFIXES):
+        result = op(tid, initiator_name=entry)
+        # 旧版本把IQN也按initiator-address绑定，tgtd的ACL列表不区分两种规则，按名称解绑不存在时再按地址解绑
+        if not bind and not result['success'] and result['details']['exit_code'] == TGTADM_ERR_ACL_NOEXIST:
+            return op(tid, initiator_address=entry)
+        return result
+    return op(tid, initiator_address=entry)
+
+# 把一个Target的ACL改为desired：先新增后删除（ALL和白名单互相切换时不会出现所有Initiator都被拒绝的间隙）
+# 任一操作失败时按逆序回滚已执行的操作，返回{'tid','added','removed','error'}
+def apply_target_acl(tid, current, desired):
+    tgtd = get_tgtd_client()
+    to_add, to_remove = diff_acl(current, desired)
+    done = []
+    error = None
+    for entry, bind in itertools.chain(((entry, True) for entry in to_add), ((entry, False) for entry in to_remove)):
+        result = _acl_bind(tgtd, tid, entry, bind)
+        if not result['success']:
+            error = {'initiator': entry, 'action': 'bind' if bind else 'unbind', 'error': (result['error'] or '').strip()}
+            break
+        done.append((entry, bind))
+    if error:
+        for entry, bind in reversed(done):
+            result = _acl_bind(tgtd, tid, entry, not bind)
+            if not result['success']:
+                logger.error(f"回滚Target {tid}的ACL规则{entry}失败: {result['error']}")
+        return {'tid': str(tid), 'added': [], 'removed': [], 'error': error}
+    return {'tid': str(tid), 'added': to_add, 'removed': to_remove, 'error': None}
+
+# 并行修改多个Target的ACL（changes为[(tid, 当前列表, 期望列表)]），有变化时只持久化一次
+def apply_acl_changes(changes):
+    if len(changes) == 1:
+        results = [apply_target_acl(*changes[0])]
+    else:
+        with ThreadPoolExecutor(max_workers=min(ACL_APPLY_WORKERS, len(changes)), thread_name_prefix='acl') as pool:
+            results = list(pool.map(lambda change: apply_target_acl(*change), changes))
+    if any(result['added'] or result['removed'] for result in results):
+        save_config()
+    return results
+
+# 解析ACL导入内容，返回{Target ID或名称: [规则]}；CSV每行为"Target ID或名称,规则"，可带表头，#开头的行为注释
+def parse_acl_import(text):
+    desired = {}
+    for row in csv.reader(io.StringIO(text)):
+        cells = [cell.strip() for cell in row]
+        if not cells or not cells[0] or cells[0].startswith('#'):
+            continue
+        if len(cells) < 2:
+            raise ValueError(f'CSV行缺少规则: {",".join(cells)}')
+        if cells[0].lower() in ('tid', 'target') and not desired:
+            continue
+        desired.setdefault(cells[0], []).extend(cell for cell in cells[1:] if cell)
+    return desired
+
+# 路由：导出所有Target的ACL（format=csv时导出为可重新导入的CSV）
+@app.route('/api/acl')
+def export_acl():
+    targets = get_targets()
+    if request.args.get('format') == 'csv':
+        output = io.StringIO()
+        writer = csv.writer(output, lineterminator='\n')
+        writer.writerow(['tid', 'initiator'])
+        for target in targets:
+            for entry in target.acl_list:
+                writer.writerow([target.tid, entry])
+        return Response(output.getvalue(), mimetype='text/csv',
+                        headers={'Content-Disposition': 'attachment; filename=acl.csv'})
+    return jsonify({
+        'success': True,
+        'data': {
+            'targets': {target.tid: {'name': target.name, 'acl_mode': target.acl_mode, 'acl': list(target.acl_list)}
+                        for target in targets}
+        }
+    })
+
+# 路由：按期望的完整列表批量设置ACL，只执行差异部分；不同Target并行执行，最后只持久化一次
+# JSON: {"targets": {"Target ID或名称": ["iqn...", "192.168.1.0/24"]}, "dry_run": false}
+# CSV: 请求体为text/csv或上传文件字段file，每行"Target ID或名称,规则"；未出现的Target保持不变
+@app.route('/api/acl', methods=['POST'])
+@invalidates_topology
+def bulk_set_acl():
+    dry_run = request.args.get('dry_run') in ('1', 'true')
+    try:
+        upload = request.files.get('file')
+        if upload is not None or request.mimetype == 'text/csv':
+            text = upload.read().decode('utf-8-sig') if upload is not None else request.get_data(as_text=True)
+            if (upload is not None and upload.filename.lower().endswith('.json')) or text.lstrip().startswith('{'):
+                payload = json.loads(text)
+                desired = payload.get('targets') if isinstance(payload, dict) else None
+            else:
+                desired = parse_acl_import(text)
+        else:
+            payload = request.get_json(silent=True) or {}
+            desired = payload.get('targets')
+            dry_run = dry_run or bool(payload.get('dry_run'))
+        if not isinstance(desired, dict) or not desired:
+            raise ValueError('targets必须是非空的{Target ID或名称: 规则列表}对象')
+        desired = {str(key): parse_acl_list(value) for key, value in desired.items()}
+    except ValueError as e:  # json.JSONDecodeError也是ValueError
+        return jsonify({
+            'success': False,
+            'message': str(e),
+            'error_code': 'INVALID_PARAMS'
+        })
+
+    targets = get_topology_snapshot(force=True)['targets']
+    by_key = {target.tid: target for target in targets}
+    by_key.update({target.name: target for target in targets})
+    missing = [key for key in desired if key not in by_key]
+    if missing:
+        return jsonify({
+            'success': False,
+            'message': f'未找到Target: {", ".join(missing)}',
+            'error_code': 'TARGET_NOT_FOUND'
+        })
+
+    # 同一Target分别以ID和名称出现时合并规则
+    changes = {}
+    for key, acl in desired.items():
+        target = by_key[key]
+        if target.tid in changes:
+            acl = parse_acl_list(changes[target.tid][2] + acl)
+        changes[target.tid] = (target.tid, list(target.acl_list), acl)
+
+    if dry_run:
+        results = []
+        for tid, current, acl in changes.values():
+            to_add, to_remove = diff_acl(current, acl)
+            results.append({'tid': tid, 'added': to_add, 'removed': to_remove, 'error': None})
+    else:
+        results = apply_acl_changes([change for change in changes.values() if diff_acl(change[1], change[2]) != ([], [])])
+        unchanged = set(changes) - {result['tid'] for result in results}
+        results += [{'tid': tid, 'added': [], 'removed': [], 'error': None} for tid in sorted(unchanged, key=int)]
+
+    failed = [result for result in results if result['error']]
+    added = sum(len(result['added']) for result in results)
+    removed = sum(len(result['removed']) for result in results)
+    return jsonify({
+        'success': not failed,
+        'message': (f'{"预计" if dry_run else "已"}新增{added}条、删除{removed}条访问控制规则，涉及{len(results)}个Target'
+                    + (f'；{len(failed)}个Target设置失败，已回滚' if failed else '')),
+        'data': {'results': results, 'dry_run': dry_run}
+    })
+
+# 路由：增加Target
+@app.route('/target/create', methods=['POST'])
+@invalidates_topology
+def create_target():
+    target_name = request.form.get('target_name')
+    tid = request.form.get('tid')
+    acl_mode = request.form.get('acl_mode')
+    initiator_address = request.form.get('initiator_address')
+    
+    # 增加ID范围验证
+    try:
+        tid_num = int(tid)
+        if tid_num < 1 or tid_num > MAX_TARGET_ID:
+            return jsonify({
+                'success': False,
+                'message': f'Target ID必须在1到{MAX_TARGET_ID}之间'
+            })
+    except ValueError:
+        return jsonify({
+            'success': False,
+            'message': 'Target ID必须是有效的数字'
+        })
+    
+    if not target_name or not tid:
         return jsonify({
             'success': False,
             'message': 'Target名称和ID不能为空'
@@ -472,38 +1860,34 @@ def create_target():
             'message': '白名单模式下必须提供至少一个Initiator或IP地址'
         })
     
+    # 创建前先解析访问控制列表，避免Target已创建而白名单无效
+    if acl_mode == 'all':
+        desired_acl = ['ALL']
+        acl_message = '已设置为允许所有initiator访问'
+    else:
+        try:
+            desired_acl = [entry for entry in parse_acl_list(initiator_address) if entry != 'ALL']
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'message': str(e)
+            })
+        if not desired_acl:
+            return jsonify({
+                'success': False,
+                'message': '白名单模式下必须提供有效的Initiator或IP地址'
+            })
+        acl_message = '已配置指定的initiator白名单'
+    
     # 创建Target
-    cmd = f"tgtadm --lld iscsi --mode target --op new --tid {tid} --targetname {target_name}"
-    result = run_command(cmd)
+    result = get_tgtd_client().target_new(tid, target_name)
     
     if result['success']:
         # 根据ACL模式设置访问控制
-        if acl_mode == 'all':
-            # 允许所有访问
-            cmd_acl = f"tgtadm --lld iscsi --mode target --op bind --tid {tid} -I ALL"
-            acl_result = run_command(cmd_acl)
-            acl_message = '已设置为允许所有initiator访问'
-        else:
-            # 配置白名单
-            acl_result = {'success': True}
-            # 解析并添加每个initiator地址
-            initiators = [addr.strip() for addr in initiator_address.split(',') if addr.strip()]
-            if not initiators:
-                return jsonify({
-                    'success': False,
-                    'message': '白名单模式下必须提供有效的Initiator或IP地址'
-                })
-            
-            for initiator in initiators:
-                cmd_acl = f"tgtadm --lld iscsi --mode target --op bind --tid {tid} -I {initiator}"
-                acl_result = run_command(cmd_acl)
-                if not acl_result['success']:
-                    break
-            acl_message = '已配置指定的initiator白名单'
-        
-        if acl_result['success']:
-            # 保存配置
-            save_config()
+        acl_result = apply_target_acl(tid, [], desired_acl)
+        # 保存配置（访问控制设置失败时Target本身也已创建）
+        save_config()
+        if not acl_result['error']:
             return jsonify({
                 'success': True,
                 'message': f'Target {target_name} 创建成功，{acl_message}'
@@ -511,7 +1895,7 @@ def create_target():
         else:
             return jsonify({
                 'success': False,
-                'message': f'Target创建成功但设置访问控制失败: {acl_result["error"]}'
+                'message': f'Target创建成功但设置访问控制失败: {acl_result["error"]["error"]}'
             })
     else:
         return jsonify({
@@ -521,10 +1905,10 @@ def create_target():
 
 # 路由：删除Target
 @app.route('/target/delete/<tid>', methods=['POST'])
+@invalidates_topology
 def delete_target(tid):
     # 删除Target
-    cmd = f"tgtadm --lld iscsi --mode target --op delete --tid {tid}"
-    result = run_command(cmd)
+    result = get_tgtd_client().target_delete(tid)
     
     if result['success']:
         # 保存配置
@@ -546,6 +1930,7 @@ def delete_target(tid):
 
 # 路由：修改Target ID
 @app.route('/target/update_id', methods=['POST'])
+@invalidates_topology
 def update_target_id():
     old_tid = request.form.get('old_tid')
     new_tid = request.form.get('new_tid')
@@ -565,7 +1950,7 @@ def update_target_id():
     
     # 获取旧target的信息
     targets = get_targets()
-    old_target = next((t for t in targets if t['tid'] == old_tid), None)
+    old_target = next((t for t in targets if t.tid == old_tid), None)
     
     if not old_target:
         return jsonify({
@@ -574,8 +1959,8 @@ def update_target_id():
         })
     
     # 创建新target
-    cmd = f"tgtadm --lld iscsi --mode target --op new --tid {new_tid} --targetname {old_target['name']}"
-    result = run_command(cmd)
+    tgtd = get_tgtd_client()
+    result = tgtd.target_new(new_tid, old_target.name)
     
     if not result['success']:
         return jsonify({
@@ -583,43 +1968,49 @@ def update_target_id():
             'message': f'创建新Target失败: {result["error"]}'
         })
     
-    # 复制所有LUN到新target
-    success = True
-    for lun in old_target['luns']:
-        cmd = f"tgtadm --lld iscsi --mode logicalunit --op new --tid {new_tid} --lun {lun['lun_id']} -b {lun['backing_store']}"
-        result = run_command(cmd)
+    # 复制所有LUN（包括后端设置）到新target，LUN 0（控制器）由tgtd自动创建
+    error = None
+    stored = lun_backends_cache.get()
+    for lun in old_target.luns:
+        if not lun.backing_store:
+            continue
+        result = tgtd.lun_new(new_tid, lun.lun_id, lun.backing_store, **lun_backend(lun, stored))
         if not result['success']:
-            success = False
+            error = f'复制LUN {lun.lun_id}失败: {result["error"]}'
             break
     
-    if success:
-        # 复制ACL设置
-        if old_target['acl_mode'] == 'all':
-            cmd = f"tgtadm --lld iscsi --mode target --op bind --tid {new_tid} -I ALL"
-            run_command(cmd)
-        else:
-            for initiator in old_target['acl_list']:
-                cmd = f"tgtadm --lld iscsi --mode target --op bind --tid {new_tid} -I {initiator}"
-                run_command(cmd)
-        
-        # 删除旧target
-        cmd = f"tgtadm --lld iscsi --mode target --op delete --tid {old_tid}"
-        result = run_command(cmd)
-        
-        if result['success']:
-            save_config()
-            return jsonify({
-                'success': True,
-                'message': f'Target ID已更新为 {new_tid}'
-            })
+    # 复制ACL设置
+    if error is None:
+        acl_result = apply_target_acl(new_tid, [], list(old_target.acl_list))
+        if acl_result['error']:
+            error = f'复制访问控制规则失败（initiator {acl_result["error"]["initiator"]}）: {acl_result["error"]["error"]}'
+    
+    # 删除旧target
+    if error is None:
+        result = tgtd.target_delete(old_tid)
+        if not result['success']:
+            error = f'删除原Target失败: {result["error"]}'
+    
+    if error is None:
+        save_config()
+        return jsonify({
+            'success': True,
+            'message': f'Target ID已更新为 {new_tid}'
+        })
     
+    # 任一步骤失败时删除新target，保留原target不变
+    result = tgtd.target_delete(new_tid, force=True)
+    if not result['success']:
+        logger.error(f"回滚新Target {new_tid}失败: {result['error']}")
+        save_config()
     return jsonify({
         'success': False,
-        'message': '更新Target ID失败'
+        'message': f'更新Target ID失败，{error}'
     })
 
 # 路由：修改LUN ID
 @app.route('/lun/update_id', methods=['POST'])
+@invalidates_topology
 def update_lun_id():
     tid = request.form.get('tid')
     old_lun_id = request.form.get('old_lun_id')
@@ -640,43 +2031,50 @@ def update_lun_id():
     
     # 获取旧LUN的信息
     targets = get_targets()
-    target = next((t for t in targets if t['tid'] == tid), None)
+    target = next((t for t in targets if t.tid == tid), None)
     if not target:
         return jsonify({
             'success': False,
             'message': '未找到Target'
         })
     
-    old_lun = next((l for l in target['luns'] if l['lun_id'] == old_lun_id), None)
+    old_lun = next((l for l in target.luns if l.lun_id == old_lun_id), None)
     if not old_lun:
         return jsonify({
             'success': False,
             'message': '未找到原LUN'
         })
     
-    # 创建新LUN
-    cmd = f"tgtadm --lld iscsi --mode logicalunit --op new --tid {tid} --lun {new_lun_id} -b {old_lun['backing_store']}"
-    result = run_command(cmd)
+    # 创建新LUN，沿用原LUN的后端设置
+    tgtd = get_tgtd_client()
+    result = tgtd.lun_new(tid, new_lun_id, old_lun.backing_store, **lun_backend(old_lun))
+    if not result['success']:
+        return jsonify({
+            'success': False,
+            'message': f'更新LUN ID失败，创建新LUN失败: {result["error"]}'
+        })
     
-    if result['success']:
-        # 删除旧LUN
-        cmd = f"tgtadm --lld iscsi --mode logicalunit --op delete --tid {tid} --lun {old_lun_id}"
-        result = run_command(cmd)
-        
-        if result['success']:
+    # 删除旧LUN，失败时删除新LUN，保留原LUN不变
+    result = tgtd.lun_delete(tid, old_lun_id)
+    if not result['success']:
+        rollback = tgtd.lun_delete(tid, new_lun_id)
+        if not rollback['success']:
+            logger.error(f"回滚新LUN {new_lun_id}失败: {rollback['error']}")
             save_config()
-            return jsonify({
-                'success': True,
-                'message': f'LUN ID已更新为 {new_lun_id}'
-            })
+        return jsonify({
+            'success': False,
+            'message': f'更新LUN ID失败，删除原LUN失败: {result["error"]}'
+        })
     
+    save_config()
     return jsonify({
-        'success': False,
-        'message': '更新LUN ID失败'
+        'success': True,
+        'message': f'LUN ID已更新为 {new_lun_id}'
     })
 
 # 路由：创建LUN
 @app.route('/lun/create', methods=['POST'])
+@invalidates_topology
 def create_lun():
     tid = request.form.get('tid')
     lun_id = request.form.get('lun_id')
@@ -701,17 +2099,26 @@ def create_lun():
             'success': False,
             'message': 'Target ID、LUN ID和后备存储不能为空'
         })
+
+    backend, error = parse_lun_backend(request.form)
+    if error:
+        return jsonify({
+            'success': False,
+            'message': error,
+            'error_code': 'INVALID_PARAMS'
+        })
     
     # 创建LUN
-    cmd = f"tgtadm --lld iscsi --mode logicalunit --op new --tid {tid} --lun {lun_id} -b {backing_store}"
-    result = run_command(cmd)
+    result = get_tgtd_client().lun_new(tid, lun_id, backing_store, **backend)
     
     if result['success']:
+        save_lun_backend(backing_store, backend)
         # 保存配置
         save_config()
         return jsonify({
             'success': True,
-            'message': f'LUN (ID: {lun_id}) 创建成功'
+            'message': f'LUN (ID: {lun_id}) 创建成功',
+            'data': dict(backend, backing_store=backing_store)
         })
     else:
         return jsonify({
@@ -721,6 +2128,7 @@ def create_lun():
 
 # 路由：删除LUN
 @app.route('/lun/delete', methods=['POST'])
+@invalidates_topology
 def delete_lun():
     tid = request.form.get('tid')
     lun_id = request.form.get('lun_id')
@@ -734,8 +2142,7 @@ def delete_lun():
         })
     
     # 删除LUN
-    cmd = f"tgtadm --lld iscsi --mode logicalunit --op delete --tid {tid} --lun {lun_id}"
-    result = run_command(cmd)
+    result = get_tgtd_client().lun_delete(tid, lun_id)
     
     if result['success']:
         # 保存配置
@@ -759,6 +2166,7 @@ def delete_lun():
 
 # 路由：重新绑定LUN到指定Target
 @app.route('/lun/rebind', methods=['POST'])
+@invalidates_topology
 def rebind_lun():
     new_tid = request.form.get('new_tid')
     lun_id = request.form.get('lun_id')
@@ -771,18 +2179,32 @@ def rebind_lun():
             'error_code': 'MISSING_PARAMS'
         })
     
+    # 未指定后端设置时沿用该后备存储上次使用的设置
+    backend, error = parse_lun_backend(request.form)
+    if error:
+        return jsonify({
+            'success': False,
+            'message': error,
+            'error_code': 'INVALID_PARAMS'
+        })
+    if not any(backend.values()):
+        backend = dict(backend, **(lun_backends_cache.get().get(backing_store) or {}))
+
     # 创建LUN到新的Target
-    cmd = f"tgtadm --lld iscsi --mode logicalunit --op new --tid {new_tid} --lun {lun_id} -b {backing_store}"
-    result = run_command(cmd)
+    result = get_tgtd_client().lun_new(new_tid, lun_id, backing_store, **backend)
     
     if result['success']:
+        save_lun_backend(backing_store, backend)
         return jsonify({
             'success': True,
             'message': f'LUN (ID: {lun_id}) 已重新绑定到Target (ID: {new_tid})',
             'data': {
                 'new_tid': new_tid,
                 'lun_id': lun_id,
-                'backing_store': backing_store
+                'backing_store': backing_store,
+                'bstype': backend['bstype'],
+                'bsoflags': backend['bsoflags'],
+                'bsopts': backend['bsopts']
             }
         })
     else:
@@ -802,7 +2224,7 @@ def get_target_acl(tid):
     targets = get_targets()
     
     # 查找指定的target
-    target = next((t for t in targets if t['tid'] == tid), None)
+    target = next((t for t in targets if t.tid == tid), None)
     logger.info(f"获取Target ACL信息: {tid}, 找到: {bool(target)}")
 
     if not target:
@@ -818,9 +2240,9 @@ def get_target_acl(tid):
         'success': True,
         'data': {
             'tid': tid,
-            'name': target['name'],
-            'acl_mode': target['acl_mode'],
-            'acl_list': target['acl_list']
+            'name': target.name,
+            'acl_mode': target.acl_mode,
+            'acl_list': target.acl_list
         }
     }
     logger.info(f"返回Target ACL信息: {response_data}")
@@ -828,6 +2250,7 @@ def get_target_acl(tid):
 
 # 路由：清空Target的所有ACL规则
 @app.route('/target/clear_acl', methods=['POST'])
+@invalidates_topology
 def clear_acl():
     tid = request.form.get('tid')
     
@@ -840,7 +2263,7 @@ def clear_acl():
     
     # 获取当前target的信息
     targets = get_targets()
-    current_target = next((t for t in targets if t['tid'] == tid), None)
+    current_target = next((t for t in targets if t.tid == tid), None)
     
     if not current_target:
         return jsonify({
@@ -850,21 +2273,12 @@ def clear_acl():
         })
     
     # 解绑当前target的所有ACL规则
-    success = True
-    error_message = ''
-    
-    if current_target.get('acl_list'):
-        for initiator in current_target['acl_list']:
-            unbind_cmd = f"tgtadm --lld iscsi --mode target --op unbind --tid {tid} -I {initiator}"
-            unbind_result = run_command(unbind_cmd)
-            if not unbind_result['success']:
-                success = False
-                error_message = unbind_result['error']
-                break
+    result = apply_target_acl(tid, current_target.acl_list, [])
     
-    if success:
+    if not result['error']:
         # 保存配置
-        save_config()
+        if result['removed']:
+            save_config()
         return jsonify({
             'success': True,
             'message': f'Target (ID: {tid}) 的所有访问控制规则已清空',
@@ -873,6 +2287,7 @@ def clear_acl():
             }
         })
     else:
+        error_message = result['error']['error']
         return jsonify({
             'success': False,
             'message': f'清空访问控制规则失败: {error_message}',
@@ -881,6 +2296,7 @@ def clear_acl():
 
 # 路由：设置访问控制
 @app.route('/target/acl', methods=['POST'])
+@invalidates_topology
 def set_acl():
     tid = request.form.get('tid')
     initiator_address = request.form.get('initiator_address')
@@ -904,7 +2320,7 @@ def set_acl():
     
     # 获取当前target的信息
     targets = get_targets()
-    current_target = next((t for t in targets if t['tid'] == tid), None)
+    current_target = next((t for t in targets if t.tid == tid), None)
     
     if not current_target:
         return jsonify({
@@ -913,44 +2329,8 @@ def set_acl():
             'error_code': 'TARGET_NOT_FOUND'
         })
     
-    # 如果是all模式，先解绑当前target的所有initiator，然后设置ALL访问
     if action == 'all':
-        # 只解绑当前target的ACL列表中的initiator
-        if current_target.get('acl_list'):
-            for initiator in current_target['acl_list']:
-                if initiator != 'ALL':  # 避免重复解绑ALL
-                    unbind_cmd = f"tgtadm --lld iscsi --mode target --op unbind --tid {tid} -I {initiator}"
-                    unbind_result = run_command(unbind_cmd)
-                    if not unbind_result['success']:
-                        return jsonify({
-                            'success': False,
-                            'message': f'解绑initiator {initiator}失败',
-                            'error': unbind_result['error']
-                        })
-        
-        # 设置ALL访问
-        cmd = f"tgtadm --lld iscsi --mode target --op bind --tid {tid} -I ALL"
-        result = run_command(cmd)
-        
-        if result['success']:
-            # 保存配置
-            save_config()
-            return jsonify({
-                'success': True,
-                'message': '访问控制设置成功',
-                'data': {
-                    'tid': tid,
-                    'initiator_address': 'ALL',
-                    'action': action
-                }
-            })
-        else:
-            return jsonify({
-                'success': False,
-                'message': '访问控制设置失败',
-                'error': result['error'],
-                'details': result.get('details', {})
-            })
+        requested = ['ALL']
     else:
         if not initiator_address:
             return jsonify({
@@ -960,310 +2340,2719 @@ def set_acl():
                 'required_params': ['initiator_address']
             })
         
-        # 如果是bind操作，检查并解绑当前target的ALL访问规则
-        if action == 'bind' and 'ALL' in current_target.get('acl_list', []):
-            all_unbind_cmd = f"tgtadm --lld iscsi --mode target --op unbind --tid {tid} -I ALL"
-            unbind_result = run_command(all_unbind_cmd)
-            if not unbind_result['success']:
-                return jsonify({
-                    'success': False,
-                    'message': '解除ALL访问失败',
-                    'error': unbind_result['error']
-                })
-        
         # 处理多个initiator地址，将逗号分隔的地址拆分为单独的地址
-        initiator_list = [addr.strip() for addr in initiator_address.split(',') if addr.strip()]
-        if not initiator_list:
+        try:
+            requested = parse_acl_list(initiator_address)
+        except ValueError as e:
             return jsonify({
                 'success': False,
-                'message': 'Initiator地址格式无效',
+                'message': str(e),
                 'error_code': 'INVALID_INITIATOR_FORMAT'
             })
-        
-        # 对每个initiator地址执行操作
-        success_count = 0
-        failed_initiators = []
-        
-        for initiator in initiator_list:
-            cmd = f"tgtadm --lld iscsi --mode target --op {action} --tid {tid} -I {initiator}"
-            result = run_command(cmd)
-            
-            if result['success']:
-                success_count += 1
-            else:
-                failed_initiators.append({
-                    'initiator': initiator,
-                    'error': result['error']
-                })
-        
-        # 保存配置
-        save_config()
-        
-        # 返回结果
-        if success_count == len(initiator_list):
-            return jsonify({
-                'success': True,
-                'message': f'所有 {len(initiator_list)} 个initiator地址的访问控制设置成功',
-                'data': {
-                    'tid': tid,
-                    'initiator_address': initiator_list,
-                    'action': action
-                }
-            })
-        elif success_count > 0:
-            return jsonify({
-                'success': True,
-                'message': f'部分initiator地址的访问控制设置成功 ({success_count}/{len(initiator_list)})',
-                'data': {
-                    'tid': tid,
-                    'initiator_address': initiator_list,
-                    'action': action,
-                    'failed_initiators': failed_initiators
-                }
-            })
-        else:
+        if not requested:
             return jsonify({
                 'success': False,
-                'message': '所有initiator地址的访问控制设置失败',
-                'error': failed_initiators[0]['error'] if failed_initiators else '未知错误',
-                'details': {
-                    'failed_initiators': failed_initiators
-                }
+                'message': 'Initiator地址格式无效',
+                'error_code': 'INVALID_INITIATOR_FORMAT'
             })
     
-    if result['success']:
+    # 计算期望的完整列表，只执行与当前列表的差异：
+    # all替换为ALL；bind在现有白名单上追加（并解除ALL访问）；unbind从现有列表中移除
+    current = list(normalize_current_acl(current_target.acl_list))
+    if action == 'all' or requested == ['ALL']:
+        desired = ['ALL'] if action != 'unbind' else [entry for entry in current if entry != 'ALL']
+    elif action == 'bind':
+        desired = list(dict.fromkeys([entry for entry in current if entry != 'ALL'] + requested))
+    else:
+        desired = [entry for entry in current if entry not in requested]
+    
+    result = apply_target_acl(tid, current_target.acl_list, desired)
+    
+    if not result['error']:
         # 保存配置
-        save_config()
+        if result['added'] or result['removed']:
+            save_config()
         return jsonify({
             'success': True,
-            'message': '访问控制设置成功',
+            'message': '访问控制设置成功' if action == 'all' else f'所有 {len(requested)} 个initiator地址的访问控制设置成功',
             'data': {
                 'tid': tid,
-                'initiator_address': initiator_address if action != 'all' else 'ALL',
-                'action': action
+                'initiator_address': 'ALL' if action == 'all' else requested,
+                'action': action,
+                'added': result['added'],
+                'removed': result['removed']
             }
         })
     else:
         return jsonify({
             'success': False,
-            'message': '访问控制设置失败',
-            'error': result['error'],
-            'details': result.get('details', {})
+            'message': f'访问控制设置失败（initiator {result["error"]["initiator"]}），已恢复原有规则',
+            'error': result['error']['error'],
+            'details': result['error']
         })
 
-# 路由：创建虚拟磁盘
-@app.route('/disk/create', methods=['POST'])
-def create_disk():
-    disk_name = request.form.get('disk_name')
-    disk_size = request.form.get('disk_size')
-    disk_unit = request.form.get('disk_unit', 'G')  # 默认单位为GB
-    create_method = request.form.get('create_method', 'qemu')  # 默认使用qemu方式
+BATCH_OPERATIONS = ('create_target', 'delete_target', 'create_lun', 'delete_lun', 'bind', 'unbind')
 
-    if not disk_name or not disk_size:
+# 解析批量操作中的整数ID，超出范围时抛出ValueError
+def _batch_int(operation, key, low, high):
+    try:
+        value = int(operation.get(key))
+    except (TypeError, ValueError):
+        raise ValueError(f'{key}必须是有效的数字')
+    if value < low or value > high:
+        raise ValueError(f'{key}必须在{low}到{high}之间')
+    return value
+
+# 按拓扑快照构建批量操作的模拟状态：
+# {tid: {'name', 'luns': {lun_id: {'backing_store', 'backend'}}, 'acl': [...], 'sessions': 已连接的I_T nexus数}}
+def _batch_state(targets):
+    stored = lun_backends_cache.get()
+    state = {}
+    for target in targets:
+        state[int(target.tid)] = {
+            'name': target.name,
+            'luns': {int(lun.lun_id): {'backing_store': lun.backing_store, 'backend': lun_backend(lun, stored)}
+                     for lun in target.luns},
+            'acl': normalize_current_acl(target.acl_list),  # 规范化后的规则 -> tgtd中的原始规则
+            'sessions': len(target.nexus_information)
+        }
+    return state
+
+# 重新创建LUN的回滚操作，LUN 0（控制器）由tgtd自动创建
+def _batch_lun_undo(tid, luns):
+    return [{'op': 'create_lun', 'tid': tid, 'lun_id': lun_id, 'backing_store': lun['backing_store'], 'backend': lun['backend']}
+            for lun_id, lun in luns.items() if lun_id and lun['backing_store']]
+
+# 在模拟状态上校验一个操作并更新状态，返回(规范化后的操作, 回滚操作列表)
+def _batch_validate(operation, state):
+    op = operation.get('op')
+    if op not in BATCH_OPERATIONS:
+        raise ValueError(f'未知的操作类型: {op}')
+    tid = _batch_int(operation, 'tid', 1, MAX_TARGET_ID)
+    target = state.get(tid)
+
+    if op == 'create_target':
+        name = (operation.get('name') or '').strip()
+        if not name:
+            raise ValueError('Target名称不能为空')
+        if target:
+            raise ValueError(f'Target {tid} 已存在')
+        state[tid] = {'name': name, 'luns': {}, 'acl': {}, 'sessions': 0}
+        return {'op': op, 'tid': tid, 'name': name}, [{'op': 'delete_target', 'tid': tid}]
+
+    if not target:
+        raise ValueError(f'Target {tid} 不存在')
+
+    if op == 'delete_target':
+        # 与/target/delete一致，不删除有已连接Initiator的Target（回滚无法恢复被断开的会话）
+        if target['sessions']:
+            raise ValueError(f'Target {tid} 有{target["sessions"]}个已连接的会话，请先断开连接')
+        del state[tid]
+        undo = [{'op': 'create_target', 'tid': tid, 'name': target['name']}]
+        undo += _batch_lun_undo(tid, target['luns'])
+        undo += [{'op': 'bind', 'tid': tid, 'initiator': initiator} for initiator in target['acl']]
+        return {'op': op, 'tid': tid}, undo
+
+    if op in ('create_lun', 'delete_lun'):
+        lun_id = _batch_int(operation, 'lun_id', 1, MAX_LUN_ID)
+        if op == 'create_lun':
+            backing_store = operation.get('backing_store')
+            if not backing_store or not os.path.isfile(backing_store):
+                raise ValueError(f'后备存储不存在: {backing_store}')
+            if lun_id in target['luns']:
+                raise ValueError(f'Target {tid} 的LUN {lun_id} 已存在')
+            # 与/lun/rebind一致：未指定后端设置时沿用该后备存储上次使用的设置
+            backend, error = parse_lun_backend(MultiDict(
+                {key: operation[key] for key in ('bstype', 'bsoflags', 'bsopts') if operation.get(key)}))
+            if error:
+                raise ValueError(error)
+            if not any(backend.values()):
+                backend = dict(backend, **(lun_backends_cache.get().get(backing_store) or {}))
+            target['luns'][lun_id] = {'backing_store': backing_store, 'backend': backend}
+            return ({'op': op, 'tid': tid, 'lun_id': lun_id, 'backing_store': backing_store, 'backend': backend},
+                    [{'op': 'delete_lun', 'tid': tid, 'lun_id': lun_id}])
+        if lun_id not in target['luns']:
+            raise ValueError(f'Target {tid} 的LUN {lun_id} 不存在')
+        return {'op': op, 'tid': tid, 'lun_id': lun_id}, _batch_lun_undo(tid, {lun_id: target['luns'].pop(lun_id)})
+
+    initiator = (operation.get('initiator') or '').strip()
+    if not initiator:
+        raise ValueError('Initiator地址不能为空')
+    # 与/api/acl一致，按规范化后的形式比较，解绑时使用tgtd中的原始规则
+    initiator = normalize_acl_entry(initiator)
+    if op == 'bind':
+        if initiator in target['acl']:
+            raise ValueError(f'Target {tid} 已存在访问规则 {initiator}')
+        target['acl'][initiator] = initiator
+        return {'op': op, 'tid': tid, 'initiator': initiator}, [{'op': 'unbind', 'tid': tid, 'initiator': initiator}]
+    if initiator not in target['acl']:
+        raise ValueError(f'Target {tid} 不存在访问规则 {initiator}')
+    raw = target['acl'].pop(initiator)
+    return {'op': op, 'tid': tid, 'initiator': raw}, [{'op': 'bind', 'tid': tid, 'initiator': initiator}]
+
+# 执行一个已校验的批量操作
+def _batch_apply(tgtd, operation):
+    op = operation['op']
+    tid = operation['tid']
+    if op == 'create_target':
+        return tgtd.target_new(tid, operation['name'])
+    if op == 'delete_target':
+        return tgtd.target_delete(tid)
+    if op == 'create_lun':
+        return tgtd.lun_new(tid, operation['lun_id'], operation['backing_store'], **operation['backend'])
+    if op == 'delete_lun':
+        return tgtd.lun_delete(tid, operation['lun_id'])
+    return _acl_bind(tgtd, tid, operation['initiator'], op == 'bind')
+
+# 路由：批量创建/删除Target、LUN和ACL，全部成功或全部回滚，最后只持久化一次
+@app.route('/api/batch', methods=['POST'])
+@invalidates_topology
+def batch_operations():
+    payload = request.get_json(silent=True) or {}
+    operations = payload.get('operations')
+    dry_run = bool(payload.get('dry_run'))
+
+    if not isinstance(operations, list) or not operations:
         return jsonify({
             'success': False,
-            'message': '磁盘名称和大小不能为空'
+            'message': 'operations必须是非空的操作列表',
+            'error_code': 'MISSING_PARAMS',
+            'allowed_operations': list(BATCH_OPERATIONS)
         })
-    
-    # 确保磁盘名称不包含路径分隔符和特殊字符
-    disk_name = secure_filename(disk_name)
-    
-    # 如果用户没有添加.img后缀，自动添加
-    if not disk_name.lower().endswith('.img'):
-        disk_name = f"{disk_name}.img"
 
-    # 构建完整的磁盘路径
-    base_disk_dir = '/app/iscsi'
-    disk_path = os.path.join(base_disk_dir, disk_name)
-    
-    # 检查目录是否存在，不存在则创建
-    if not os.path.exists(base_disk_dir):
-        os.makedirs(base_disk_dir)
-        logger.info(f"创建磁盘目录: {base_disk_dir}")
-    
-    # 检查文件是否已存在
-    if os.path.exists(disk_path):
+    # 基于同一个拓扑快照校验全部操作
+    snapshot = get_topology_snapshot(force=True)
+    if not snapshot['success']:
         return jsonify({
             'success': False,
-            'message': f'磁盘文件 {disk_name} 已存在'
+            'message': f'获取Target信息失败: {snapshot["error"]}'
         })
+    state = _batch_state(snapshot['targets'])
+    plan = []
+    results = []
+    for index, operation in enumerate(operations):
+        try:
+            if not isinstance(operation, dict):
+                raise ValueError('操作必须是JSON对象')
+            plan.append(_batch_validate(operation, state))
+            results.append({'index': index, 'op': operation.get('op'), 'status': 'validated'})
+        except ValueError as e:
+            results.append({'index': index, 'op': operation.get('op') if isinstance(operation, dict) else None,
+                            'status': 'invalid', 'error': str(e)})
 
-    # 根据选择的方法创建虚拟磁盘
-    if create_method == 'qemu':
-        # 使用qemu-img创建虚拟磁盘
-        cmd = f"qemu-img create -f raw {disk_path} {disk_size}{disk_unit}"
-        method_description = "QEMU方式"
-    else:
-        # 使用dd命令创建虚拟磁盘
-        count_value = int(disk_size)
-        bs_value = f"1{disk_unit}"
-        cmd = f"dd if=/dev/zero of={disk_path} bs={bs_value} count={count_value}"
-        method_description = "DD方式"
-    
-    result = run_command(cmd)
-
-    if result['success']:
-        logger.info(f"成功创建虚拟磁盘({method_description}): {disk_path}, 大小: {disk_size}{disk_unit}")
+    invalid = [r for r in results if r['status'] == 'invalid']
+    if invalid:
+        return jsonify({
+            'success': False,
+            'message': f'{len(invalid)}个操作校验失败，未执行任何操作',
+            'error_code': 'VALIDATION_FAILED',
+            'data': {'results': results}
+        })
+    if dry_run:
+        return jsonify({
+            'success': True,
+            'message': f'{len(plan)}个操作校验通过',
+            'data': {'results': results, 'dry_run': True}
+        })
 
-        # 保存磁盘创建方法信息
-        disk_methods_file = '/app/config/disk_methods.json'
-        disk_methods = {}
-        
-        # 确保配置目录存在
-        os.makedirs(os.path.dirname(disk_methods_file), exist_ok=True)
-        
-        # 读取现有的磁盘创建方法信息
-        if os.path.exists(disk_methods_file):
+    # 依次执行，失败时按逆序回滚已执行的操作（单个操作的回滚步骤按顺序执行）
+    tgtd = get_tgtd_client()
+    undo_log = []
+    failed_index = None
+    for index, (operation, undo) in enumerate(plan):
+        result = _batch_apply(tgtd, operation)
+        if not result['success']:
+            failed_index = index
+            results[index].update(status='failed', error=result['error'])
+            break
+        results[index]['status'] = 'applied'
+        undo_log.append((index, undo))
+
+    if failed_index is None:
+        for operation, undo in plan:
+            if operation['op'] == 'create_lun':
+                save_lun_backend(operation['backing_store'], operation['backend'])
+        save_config()
+        logger.info(f"批量操作完成: {len(plan)}个操作")
+        return jsonify({
+            'success': True,
+            'message': f'{len(plan)}个操作全部执行成功',
+            'data': {'results': results}
+        })
+
+    for index, undo in reversed(undo_log):
+        errors = [r['error'] for r in (_batch_apply(tgtd, u) for u in undo) if not r['success']]
+        if errors:
+            results[index].update(status='rollback_failed', error='; '.join(errors))
+        else:
+            results[index]['status'] = 'rolled_back'
+    for result in results[failed_index + 1:]:
+        result['status'] = 'skipped'
+
+    rollback_failed = any(r['status'] == 'rollback_failed' for r in results)
+    if rollback_failed:
+        # 回滚不完整时tgtd状态已经改变，仍需要持久化
+        save_config()
+    logger.error(f"批量操作在第{failed_index + 1}个操作失败，已回滚")
+    return jsonify({
+        'success': False,
+        'message': f'第{failed_index + 1}个操作执行失败，' + ('部分操作回滚失败' if rollback_failed else '已回滚全部已执行的操作'),
+        'error': results[failed_index]['error'],
+        'data': {'results': results}
+    })
+
+# 后台任务：耗时操作（如填零创建磁盘）在有界线程池中执行，请求立即返回任务ID，通过/api/jobs/<id>查询进度
+class JobCancelled(Exception):
+    pass
+
+class Job:
+    def __init__(self, kind, description, total_bytes=0):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.description = description
+        self.status = 'queued'  # queued, running, succeeded, failed, cancelled
+        self.total_bytes = total_bytes
+        self.done_bytes = 0
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.error = None
+        self.result = None
+        self._cancel = threading.Event()
+        self._last_publish = 0.0
+
+    @property
+    def finished(self):
+        return self.status in ('succeeded', 'failed', 'cancelled')
+
+    # 任务函数在每个写入块之后调用，检查取消请求并推送节流后的进度事件
+    def progress(self, done_bytes):
+        self.done_bytes = done_bytes
+        if self._cancel.is_set():
+            raise JobCancelled()
+        now = time.monotonic()
+        if now - self._last_publish >= JOB_PROGRESS_INTERVAL:
+            self._last_publish = now
+            event_hub.publish('job', self.to_dict())
+
+    def to_dict(self):
+        end = self.finished_at or time.time()
+        elapsed = end - self.started_at if self.started_at else 0.0
+        rate = self.done_bytes / elapsed if elapsed > 0 else 0.0
+        eta = None
+        if self.status == 'running' and rate > 0 and self.total_bytes:
+            eta = round((self.total_bytes - self.done_bytes) / rate, 1)
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'description': self.description,
+            'status': self.status,
+            'total_bytes': self.total_bytes,
+            'done_bytes': self.done_bytes,
+            'percent': round(self.done_bytes * 100 / self.total_bytes, 1) if self.total_bytes else None,
+            'rate_bytes': round(rate),
+            'eta_seconds': eta,
+            'elapsed_seconds': round(elapsed, 1),
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'error': self.error,
+            'result': self.result
+        }
+
+class JobManager:
+    def __init__(self, max_workers, history_size):
+        self.history_size = history_size
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self._lock = threading.Lock()
+        self._jobs = collections.OrderedDict()
+
+    # 提交任务：func(job)返回结果字典，抛出JobCancelled表示已取消，其他异常表示失败
+    def submit(self, kind, description, func, total_bytes=0):
+        job = Job(kind, description, total_bytes)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+        self._executor.submit(self._run, job, func)
+        event_hub.publish('job', job.to_dict())
+        logger.info(f"已提交任务 {job.id}: {description}")
+        return job
+
+    def _run(self, job, func):
+        if job._cancel.is_set():
+            self._finish(job, 'cancelled')
+            return
+        job.status = 'running'
+        job.started_at = time.time()
+        event_hub.publish('job', job.to_dict())
+        try:
+            job.result = func(job)
+            self._finish(job, 'succeeded')
+        except JobCancelled:
+            self._finish(job, 'cancelled')
+        except Exception as e:
+            job.error = str(e)
+            logger.error(f"任务 {job.id} 失败: {str(e)}")
+            self._finish(job, 'failed')
+
+    def _finish(self, job, status):
+        job.status = status
+        job.finished_at = time.time()
+        event_hub.publish('job', job.to_dict())
+        logger.info(f"任务 {job.id} 结束: {status}")
+
+    # 只保留最近的已结束任务，未结束的任务始终保留
+    def _prune(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(finished) - self.history_size)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self):
+        with self._lock:
+            return list(self._jobs.values())
+
+    # 请求取消：排队中的任务不会再执行，运行中的任务在下一次进度回调时停止
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if job is None or job.finished:
+            return job
+        job._cancel.set()
+        return job
+
+job_manager = JobManager(JOB_MAX_WORKERS, JOB_HISTORY_SIZE)
+
+# 路由：后台任务列表
+@app.route('/api/jobs')
+def list_jobs():
+    return jsonify({
+        'success': True,
+        'data': [job.to_dict() for job in reversed(job_manager.list())]
+    })
+
+# 路由：查询后台任务进度
+@app.route('/api/jobs/<job_id>')
+def get_job(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({
+            'success': False,
+            'message': f'任务 {job_id} 不存在',
+            'error_code': 'JOB_NOT_FOUND'
+        })
+    return jsonify({'success': True, 'data': job.to_dict()})
+
+# 路由：取消后台任务
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    job = job_manager.cancel(job_id)
+    if job is None:
+        return jsonify({
+            'success': False,
+            'message': f'任务 {job_id} 不存在',
+            'error_code': 'JOB_NOT_FOUND'
+        })
+    if job.finished:
+        return jsonify({
+            'success': False,
+            'message': f'任务 {job_id} 已结束，状态: {job.status}',
+            'error_code': 'JOB_FINISHED',
+            'data': job.to_dict()
+        })
+    return jsonify({
+        'success': True,
+        'message': f'已请求取消任务 {job_id}',
+        'data': job.to_dict()
+    })
+
+_libc = ctypes.CDLL(None, use_errno=True)
+_libc.fallocate.argtypes = (ctypes.c_int, ctypes.c_int, ctypes.c_int64, ctypes.c_int64)
+
+# 调用fallocate(2)分段预留空间；与os.posix_fallocate不同，文件系统不支持时直接报错而不是由glibc逐块写入
+def fallocate_image(job, fd, size_bytes):
+    allocated = 0
+    while allocated < size_bytes:
+        length = min(DISK_FALLOCATE_CHUNK, size_bytes - allocated)
+        if _libc.fallocate(fd, 0, allocated, length) != 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        allocated += length
+        job.progress(allocated)
+
+# 写零填满文件：优先用O_DIRECT对齐写入，避免大量写入挤掉页缓存；文件系统不支持O_DIRECT时用普通写入并逐块丢弃页缓存
+def zero_fill_image(job, fd, disk_path, size_bytes):
+    try:
+        direct_fd = os.open(disk_path, os.O_WRONLY | os.O_DIRECT)
+    except OSError as e:
+        if e.errno != errno.EINVAL:
+            raise
+        direct_fd = None
+        logger.warning(f"{disk_path}所在文件系统不支持O_DIRECT，使用普通写入")
+
+    buffer = mmap.mmap(-1, DISK_WRITE_CHUNK)  # 匿名映射按页对齐且内容为零，满足O_DIRECT的缓冲区对齐要求
+    try:
+        aligned_size = size_bytes - size_bytes % DIRECT_IO_ALIGNMENT if direct_fd is not None else size_bytes
+        written = 0
+        while written < aligned_size:
+            length = min(DISK_WRITE_CHUNK, aligned_size - written)
+            if direct_fd is not None:
+                written += os.pwrite(direct_fd, memoryview(buffer)[:length], written)
+            else:
+                written += os.pwrite(fd, memoryview(buffer)[:length], written)
+                os.fdatasync(fd)
+                os.posix_fadvise(fd, written - length, length, os.POSIX_FADV_DONTNEED)
+            job.progress(written)
+        # 不足对齐长度的尾部用普通写入
+        if written < size_bytes:
+            written += os.pwrite(fd, memoryview(buffer)[:size_bytes - written], written)
+            job.progress(written)
+    finally:
+        buffer.close()
+        if direct_fd is not None:
+            os.close(direct_fd)
+    return written
+
+# 按分配方式创建磁盘文件，返回实际使用的分配方式（文件系统不支持fallocate时退回填零）；失败或取消时删除未完成的文件
+def allocate_image(job, disk_path, size_bytes, mode):
+    fd = os.open(disk_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+    try:
+        try:
+            if mode == 'fallocate':
+                try:
+                    fallocate_image(job, fd, size_bytes)
+                except OSError as e:
+                    if e.errno not in (errno.EOPNOTSUPP, errno.ENOSYS):
+                        raise
+                    logger.warning(f"{disk_path}所在文件系统不支持fallocate，改为填零方式")
+                    mode = 'zero'
+            if mode == 'zero':
+                zero_fill_image(job, fd, disk_path, size_bytes)
+            os.ftruncate(fd, size_bytes)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(disk_path)
+        raise
+    finally:
+        disk_inventory.invalidate(disk_path)
+    return mode
+
+# 创建磁盘文件并在disk_methods.json中记录分配方式和创建速度，返回记录内容
+def create_disk_image(job, disk_name, disk_path, size_bytes, mode):
+    started = time.perf_counter()
+    mode = allocate_image(job, disk_path, size_bytes, mode)
+    seconds = time.perf_counter() - started
+    record = {
+        'method': DISK_ALLOCATION_MODES[mode],
+        'allocation': mode,
+        'size_bytes': size_bytes,
+        'seconds': round(seconds, 3),
+        'throughput_bytes': round(size_bytes / seconds) if mode != 'sparse' and seconds > 0 else None,
+        'created_at': datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    }
+    logger.info(f"成功创建虚拟磁盘({record['method']}): {disk_path}, 大小: {size_bytes}字节, "
+                f"耗时{seconds:.2f}秒, 速度{size_bytes / max(seconds, 1e-9) / 1024 / 1024:.1f}MB/s")
+    try:
+        disk_methods_cache.update(disk_name, record)
+    except Exception as e:
+        logger.error(f"保存磁盘创建方法信息失败: {str(e)}")
+    return record
+
+# 同步执行时使用的任务对象，只保留进度接口
+class _InlineJob:
+    def progress(self, done_bytes):
+        pass
+
+# 路由：创建虚拟磁盘
+@app.route('/disk/create', methods=['POST'])
+def create_disk():
+    disk_name = request.form.get('disk_name')
+    disk_size = request.form.get('disk_size')
+    disk_unit = request.form.get('disk_unit', 'G')  # 默认单位为GB
+    create_method = request.form.get('create_method', 'sparse')  # 默认使用稀疏方式
+    mode = DISK_ALLOCATION_ALIASES.get(create_method, create_method)
+
+    if not disk_name or not disk_size:
+        return jsonify({
+            'success': False,
+            'message': '磁盘名称和大小不能为空'
+        })
+    if mode not in DISK_ALLOCATION_MODES:
+        return jsonify({
+            'success': False,
+            'message': f'不支持的创建方式: {create_method}，可选: {", ".join(DISK_ALLOCATION_MODES)}',
+            'error_code': 'INVALID_PARAMS'
+        })
+    try:
+        size_bytes = int(disk_size) * {'M': 1024 ** 2, 'G': 1024 ** 3}[disk_unit]
+    except (ValueError, KeyError):
+        return jsonify({
+            'success': False,
+            'message': f'无效的磁盘大小: {disk_size}{disk_unit}',
+            'error_code': 'INVALID_PARAMS'
+        })
+    if size_bytes <= 0:
+        return jsonify({
+            'success': False,
+            'message': '磁盘大小必须大于0',
+            'error_code': 'INVALID_PARAMS'
+        })
+    
+    # 确保磁盘名称不包含路径分隔符和特殊字符
+    disk_name = secure_filename(disk_name)
+    
+    # 如果用户没有添加.img后缀，自动添加
+    if not disk_name.lower().endswith('.img'):
+        disk_name = f"{disk_name}.img"
+
+    # 构建完整的磁盘路径
+    disk_path = os.path.join(BASE_DISK_DIR, disk_name)
+    
+    # 检查目录是否存在，不存在则创建
+    if not os.path.exists(BASE_DISK_DIR):
+        os.makedirs(BASE_DISK_DIR)
+        logger.info(f"创建磁盘目录: {BASE_DISK_DIR}")
+    
+    # 检查文件是否已存在
+    if os.path.exists(disk_path):
+        return jsonify({
+            'success': False,
+            'message': f'磁盘文件 {disk_name} 已存在'
+        })
+
+    method_description = DISK_ALLOCATION_MODES[mode]
+    data = {
+        'name': disk_name,
+        'path': disk_path,
+        'size': f"{disk_size}{disk_unit}",
+        'method': mode
+    }
+
+    if mode != 'sparse':
+        # 预分配和填零的耗时与磁盘大小相关，作为后台任务执行，请求立即返回任务ID
+        job = job_manager.submit('disk_create', f'创建虚拟磁盘 {disk_name} ({disk_size}{disk_unit}, {method_description})',
+                                 lambda job: dict(data, **create_disk_image(job, disk_name, disk_path, size_bytes, mode)),
+                                 total_bytes=size_bytes)
+        data['job_id'] = job.id
+        return jsonify({
+            'success': True,
+            'message': f'已开始创建虚拟磁盘 {disk_name}，大小: {disk_size}{disk_unit}，使用{method_description}',
+            'data': data
+        })
+
+    # 稀疏文件只设置文件大小，立即完成
+    try:
+        data.update(create_disk_image(_InlineJob(), disk_name, disk_path, size_bytes, mode))
+    except OSError as e:
+        logger.error(f"创建虚拟磁盘失败({method_description}): {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': f'创建虚拟磁盘失败: {str(e)}',
+            'error': str(e)
+        })
+    return jsonify({
+        'success': True,
+        'message': f'虚拟磁盘 {disk_name} 创建成功，大小: {disk_size}{disk_unit}，使用{method_description}',
+        'data': data
+    })
+
+# 把磁盘名称或路径解析为BASE_DISK_DIR下的实际文件路径，不在该目录下时返回None
+def resolve_disk_path(value):
+    path = os.path.realpath(value if os.path.isabs(value) else os.path.join(BASE_DISK_DIR, value))
+    base = os.path.realpath(BASE_DISK_DIR)
+    if os.path.commonpath([path, base]) != base or not os.path.isfile(path):
+        return None
+    return path
+
+FICLONE = 0x40049409  # _IOW(0x94, 9, int)
+
+# 克隆回退路径：按SEEK_DATA/SEEK_HOLE只复制数据区段，空洞保持稀疏；数据由内核直接复制，不经过用户态
+# bandwidth为每秒字节数，None表示不限速。返回实际复制的字节数
+def copy_data_extents(job, src_fd, dst_fd, size_bytes, bandwidth=None):
+    copied = 0
+    started = time.monotonic()
+    position = 0
+    while position < size_bytes:
+        try:
+            data_start = os.lseek(src_fd, position, os.SEEK_DATA)
+            data_end = os.lseek(src_fd, data_start, os.SEEK_HOLE)
+        except OSError as e:
+            if e.errno == errno.ENXIO:  # 之后没有数据区段
+                break
+            if e.errno != errno.EINVAL:
+                raise
+            data_start, data_end = position, size_bytes  # 文件系统不支持SEEK_DATA，整体复制
+        data_end = min(data_end, size_bytes)
+        job.progress(data_start)
+
+        position = data_start
+        while position < data_end:
+            length = min(DISK_COPY_CHUNK, data_end - position)
+            try:
+                count = os.copy_file_range(src_fd, dst_fd, length, position, position)
+            except OSError as e:
+                # 旧内核不支持跨文件系统的copy_file_range，改用sendfile（同样在内核中复制）
+                if e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EOPNOTSUPP):
+                    raise
+                os.lseek(dst_fd, position, os.SEEK_SET)
+                count = os.sendfile(dst_fd, src_fd, position, length)
+            if count == 0:  # 源文件在复制过程中被截短
+                return copied
+            position += count
+            copied += count
+            job.progress(position)
+            if bandwidth:
+                delay = copied / bandwidth - (time.monotonic() - started)
+                if delay > 0:
+                    time.sleep(delay)
+    job.progress(size_bytes)
+    return copied
+
+# 克隆磁盘文件：优先FICLONE共享数据块（btrfs/xfs瞬间完成），不支持时按数据区段复制；失败或取消时删除目标文件
+def clone_image(job, src_path, dst_path, bandwidth=None):
+    src_fd = os.open(src_path, os.O_RDONLY)
+    try:
+        size_bytes = os.fstat(src_fd).st_size
+        dst_fd = os.open(dst_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+        try:
+            try:
+                try:
+                    fcntl.ioctl(dst_fd, FICLONE, src_fd)
+                    method, copied = 'reflink', 0
+                    job.progress(size_bytes)
+                except OSError as e:
+                    if e.errno not in (errno.EOPNOTSUPP, errno.ENOTTY, errno.EXDEV, errno.EINVAL):
+                        raise
+                    os.ftruncate(dst_fd, size_bytes)
+                    method, copied = 'copy', copy_data_extents(job, src_fd, dst_fd, size_bytes, bandwidth)
+                os.fsync(dst_fd)
+            finally:
+                os.close(dst_fd)
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.unlink(dst_path)
+            raise
+        finally:
+            disk_inventory.invalidate(dst_path)
+    finally:
+        os.close(src_fd)
+    return method, size_bytes, copied
+
+# 路由：克隆虚拟磁盘，作为后台任务执行，完成后新磁盘可直接用于创建LUN
+@app.route('/disk/clone', methods=['POST'])
+def clone_disk():
+    source = request.form.get('source')
+    disk_name = request.form.get('disk_name')
+    bandwidth = request.form.get('bandwidth_mb')  # 可选的限速，MB/s
+
+    if not source or not disk_name:
+        return jsonify({
+            'success': False,
+            'message': '源磁盘和新磁盘名称不能为空',
+            'error_code': 'MISSING_PARAMS'
+        })
+    src_path = resolve_disk_path(source)
+    if src_path is None:
+        return jsonify({
+            'success': False,
+            'message': f'源磁盘 {source} 不存在或不在 {BASE_DISK_DIR} 目录下',
+            'error_code': 'INVALID_PARAMS'
+        })
+    try:
+        bandwidth = float(bandwidth) * 1024 * 1024 if bandwidth else None
+        if bandwidth is not None and bandwidth <= 0:
+            raise ValueError()
+    except ValueError:
+        return jsonify({
+            'success': False,
+            'message': '限速必须是大于0的数字（MB/s）',
+            'error_code': 'INVALID_PARAMS'
+        })
+
+    disk_name = secure_filename(disk_name)
+    if not disk_name.lower().endswith('.img'):
+        disk_name = f"{disk_name}.img"
+    disk_path = os.path.join(BASE_DISK_DIR, disk_name)
+    if os.path.exists(disk_path):
+        return jsonify({
+            'success': False,
+            'message': f'磁盘文件 {disk_name} 已存在'
+        })
+
+    source_name = os.path.relpath(src_path, BASE_DISK_DIR)
+
+    def clone_job(job):
+        started = time.perf_counter()
+        method, size_bytes, copied = clone_image(job, src_path, disk_path, bandwidth)
+        seconds = time.perf_counter() - started
+        record = {
+            'method': DISK_CLONE_METHODS[method],
+            'allocation': method,
+            'source': source_name,
+            'size_bytes': size_bytes,
+            'copied_bytes': copied,
+            'seconds': round(seconds, 3),
+            'throughput_bytes': round(copied / seconds) if copied and seconds > 0 else None,
+            'created_at': datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        }
+        logger.info(f"成功克隆虚拟磁盘({record['method']}): {src_path} -> {disk_path}, 复制{copied}字节, 耗时{seconds:.2f}秒")
+        try:
+            disk_methods_cache.update(disk_name, record)
+        except Exception as e:
+            logger.error(f"保存磁盘创建方法信息失败: {str(e)}")
+        return dict(record, name=disk_name, path=disk_path)
+
+    job = job_manager.submit('disk_clone', f'克隆虚拟磁盘 {source_name} -> {disk_name}', clone_job,
+                             total_bytes=os.path.getsize(src_path))
+    return jsonify({
+        'success': True,
+        'message': f'已开始克隆虚拟磁盘 {source_name} 到 {disk_name}',
+        'data': {
+            'name': disk_name,
+            'path': disk_path,
+            'source': src_path,
+            'job_id': job.id
+        }
+    })
+
+# 块级增量备份：镜像按固定大小分块，用blake2b计算哈希后写入按内容寻址的块存储，已存在的块不再写入
+# 每次备份为镜像生成一个清单（块哈希列表，空洞和全零块记为null），恢复时按清单重建镜像
+# 镜像的inode、mtime和大小都与上一次清单一致时直接跳过，不读取任何数据
+BACKUP_CHUNKS_DIR = os.path.join(BACKUP_DIR, 'chunks')
+BACKUP_MANIFESTS_DIR = os.path.join(BACKUP_DIR, 'manifests')
+_ZERO_CHUNK = bytes(BACKUP_CHUNK_SIZE)
+
+def backup_chunk_hash(data):
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+def backup_chunk_path(digest):
+    return os.path.join(BACKUP_CHUNKS_DIR, digest[:2], digest)
+
+# 清单目录名：镜像相对BASE_DISK_DIR的路径，子目录分隔符替换为__
+def backup_manifest_dir(image_path):
+    return os.path.join(BACKUP_MANIFESTS_DIR, os.path.relpath(image_path, BASE_DISK_DIR).replace(os.sep, '__'))
+
+# 返回镜像的清单ID列表（按时间从旧到新）
+def list_backup_manifests(image_path):
+    try:
+        return sorted(name[:-5] for name in os.listdir(backup_manifest_dir(image_path)) if name.endswith('.json'))
+    except FileNotFoundError:
+        return []
+
+def load_backup_manifest(image_path, manifest_id=None):
+    manifests = list_backup_manifests(image_path)
+    if manifest_id is None:
+        manifest_id = manifests[-1] if manifests else None
+    if manifest_id not in manifests:
+        return None
+    with open(os.path.join(backup_manifest_dir(image_path), f'{manifest_id}.json'), 'r') as f:
+        return json.load(f)
+
+# 按SEEK_DATA/SEEK_HOLE列出包含数据的块序号；文件系统不支持时视为全部块都有数据
+def data_chunk_indexes(fd, size_bytes, chunk_size):
+    indexes = []
+    position = 0
+    while position < size_bytes:
+        try:
+            data_start = os.lseek(fd, position, os.SEEK_DATA)
+            data_end = min(os.lseek(fd, data_start, os.SEEK_HOLE), size_bytes)
+        except OSError as e:
+            if e.errno == errno.ENXIO:
+                break
+            if e.errno != errno.EINVAL:
+                raise
+            return list(range((size_bytes + chunk_size - 1) // chunk_size))
+        first = data_start // chunk_size
+        if indexes and indexes[-1] >= first:
+            first = indexes[-1] + 1
+        indexes.extend(range(first, (data_end - 1) // chunk_size + 1))
+        position = data_end
+    return indexes
+
+# 计算一个块的哈希并在块存储中不存在时写入，返回(哈希, 是否新写入)；全零块返回(None, False)
+def backup_store_chunk(data):
+    if data == _ZERO_CHUNK[:len(data)]:
+        return None, False
+    digest = backup_chunk_hash(data)
+    path = backup_chunk_path(digest)
+    if os.path.exists(path):
+        return digest, False
+    atomic_write(path, data)
+    return digest, True
+
+# 备份单个镜像，返回统计信息；progress(已处理字节数)用于报告进度和检查取消
+def backup_image(image_path, progress):
+    st = os.stat(image_path)
+    previous = load_backup_manifest(image_path)
+    if previous and (previous['inode'], previous['mtime_ns'], previous['size']) == (st.st_ino, st.st_mtime_ns, st.st_size) \
+            and previous['chunk_size'] == BACKUP_CHUNK_SIZE:
+        progress(st.st_size)
+        return {'image': image_path, 'skipped': True, 'manifest': previous['id']}
+
+    chunk_size = BACKUP_CHUNK_SIZE
+    size_bytes = st.st_size
+    chunks = [None] * ((size_bytes + chunk_size - 1) // chunk_size)
+    stats = {'image': image_path, 'skipped': False, 'size_bytes': size_bytes, 'read_bytes': 0,
+             'new_chunks': 0, 'new_bytes': 0, 'reused_chunks': 0, 'zero_chunks': 0, 'hole_chunks': 0}
+    fd = os.open(image_path, os.O_RDONLY)
+    try:
+        indexes = data_chunk_indexes(fd, size_bytes, chunk_size)
+        stats['hole_chunks'] = len(chunks) - len(indexes)
+        if indexes:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+
+            # 镜像可能是在线的LUN，备份过程中可能被截断；用pread读取（mmap读到截断的部分会触发SIGBUS，
+            # 结束整个工作进程），读到的长度不足时使本次备份失败，不生成不完整的清单
+            def store_chunk(index):
+                length = min(chunk_size, size_bytes - index * chunk_size)
+                data = os.pread(fd, length, index * chunk_size)
+                if len(data) < length:
+                    raise RuntimeError(f'{image_path}在备份过程中被截断（块{index}）')
+                return backup_store_chunk(data)
+
+            with ThreadPoolExecutor(max_workers=BACKUP_HASH_WORKERS, thread_name_prefix='backup') as pool:
+                # 分批提交，限制同时在途的块数并能在批次之间响应取消
+                batch_size = BACKUP_HASH_WORKERS * 4
+                for batch_start in range(0, len(indexes), batch_size):
+                    batch = indexes[batch_start:batch_start + batch_size]
+                    for index, (digest, created) in zip(batch, pool.map(store_chunk, batch)):
+                        length = min(chunk_size, size_bytes - index * chunk_size)
+                        stats['read_bytes'] += length
+                        chunks[index] = digest
+                        if digest is None:
+                            stats['zero_chunks'] += 1
+                        elif created:
+                            stats['new_chunks'] += 1
+                            stats['new_bytes'] += length
+                        else:
+                            stats['reused_chunks'] += 1
+                    progress(min(size_bytes, (batch[-1] + 1) * chunk_size))
+    finally:
+        os.close(fd)
+
+    manifest_id = datetime.datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+    manifest = {
+        'id': manifest_id,
+        'image': image_path,
+        'size': size_bytes,
+        'inode': st.st_ino,
+        'mtime_ns': st.st_mtime_ns,
+        'chunk_size': chunk_size,
+        'created_at': datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'chunks': chunks
+    }
+    manifest_dir = backup_manifest_dir(image_path)
+    os.makedirs(manifest_dir, exist_ok=True)
+    atomic_write(os.path.join(manifest_dir, f'{manifest_id}.json'), json.dumps(manifest).encode('utf-8'))
+    stats['manifest'] = manifest_id
+    progress(size_bytes)
+    logger.info(f"备份完成 {image_path}: 读取{stats['read_bytes']}字节, 新写入{stats['new_chunks']}个块, "
+                f"复用{stats['reused_chunks']}个块, 跳过{stats['zero_chunks'] + stats['hole_chunks']}个零块/空洞")
+    return stats
+
+# 按清单把镜像恢复到一个新文件，空洞和全零块保持稀疏，每个块写入前校验哈希
+def restore_image(job, manifest, dst_path):
+    chunk_size = manifest['chunk_size']
+    fd = os.open(dst_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+    try:
+        try:
+            os.ftruncate(fd, manifest['size'])
+            for index, digest in enumerate(manifest['chunks']):
+                if digest is None:
+                    continue
+                with open(backup_chunk_path(digest), 'rb') as f:
+                    data = f.read()
+                if backup_chunk_hash(data) != digest:
+                    raise ValueError(f'块{index}校验失败: {digest}')
+                os.pwrite(fd, data, index * chunk_size)
+                job.progress(min(manifest['size'], (index + 1) * chunk_size))
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(dst_path)
+        raise
+    finally:
+        disk_inventory.invalidate(dst_path)
+
+# 路由：各镜像的备份清单
+@app.route('/api/backup')
+def list_backups():
+    images = []
+    for entry in disk_inventory.entries():
+        manifests = list_backup_manifests(entry['path'])
+        images.append({
+            'image': entry['path'],
+            'name': entry['name'],
+            'manifests': manifests,
+            'latest': manifests[-1] if manifests else None
+        })
+    return jsonify({'success': True, 'data': {'backup_dir': BACKUP_DIR, 'images': images}})
+
+# 路由：备份镜像（未指定images时备份全部镜像），作为后台任务执行
+@app.route('/api/backup', methods=['POST'])
+def start_backup():
+    payload = request.get_json(silent=True) or {}
+    names = payload.get('images')
+    if names is None:
+        paths = [entry['path'] for entry in disk_inventory.entries()]
+    elif isinstance(names, list):
+        paths = [resolve_disk_path(str(name)) for name in names]
+        invalid = [name for name, path in zip(names, paths) if path is None]
+        if invalid:
+            return jsonify({
+                'success': False,
+                'message': f'镜像不存在或不在 {BASE_DISK_DIR} 目录下: {", ".join(map(str, invalid))}',
+                'error_code': 'INVALID_PARAMS'
+            })
+    else:
+        return jsonify({
+            'success': False,
+            'message': 'images必须是镜像名称列表',
+            'error_code': 'INVALID_PARAMS'
+        })
+    if not paths:
+        return jsonify({
+            'success': False,
+            'message': '没有需要备份的镜像',
+            'error_code': 'MISSING_PARAMS'
+        })
+
+    sizes = {path: os.path.getsize(path) for path in paths}
+
+    def backup_job(job):
+        done = 0
+        results = []
+        for path in paths:
+            results.append(backup_image(path, lambda processed: job.progress(done + processed)))
+            done += sizes[path]
+        return {
+            'images': results,
+            'read_bytes': sum(r.get('read_bytes', 0) for r in results),
+            'new_bytes': sum(r.get('new_bytes', 0) for r in results)
+        }
+
+    job = job_manager.submit('backup', f'备份{len(paths)}个镜像', backup_job, total_bytes=sum(sizes.values()))
+    return jsonify({
+        'success': True,
+        'message': f'已开始备份{len(paths)}个镜像',
+        'data': {'job_id': job.id, 'images': paths}
+    })
+
+# 路由：按清单把镜像恢复为新的磁盘文件
+@app.route('/api/backup/restore', methods=['POST'])
+def restore_backup():
+    payload = request.get_json(silent=True) or {}
+    image = payload.get('image')
+    disk_name = payload.get('disk_name')
+    if not image or not disk_name:
+        return jsonify({
+            'success': False,
+            'message': 'image和disk_name不能为空',
+            'error_code': 'MISSING_PARAMS'
+        })
+
+    # 原镜像可能已被删除，按清单目录而不是现有文件查找
+    image_path = os.path.normpath(os.path.join(BASE_DISK_DIR, image))
+    manifest = None
+    if os.path.commonpath([image_path, BASE_DISK_DIR]) == BASE_DISK_DIR:
+        try:
+            manifest = load_backup_manifest(image_path, payload.get('manifest'))
+        except (OSError, ValueError) as e:
+            logger.error(f"读取备份清单失败: {str(e)}")
+    if manifest is None:
+        return jsonify({
+            'success': False,
+            'message': f'未找到 {image} 的备份清单',
+            'error_code': 'NOT_FOUND'
+        })
+
+    disk_name = secure_filename(disk_name)
+    if not disk_name.lower().endswith('.img'):
+        disk_name = f"{disk_name}.img"
+    disk_path = os.path.join(BASE_DISK_DIR, disk_name)
+    if os.path.exists(disk_path):
+        return jsonify({
+            'success': False,
+            'message': f'磁盘文件 {disk_name} 已存在'
+        })
+
+    def restore_job(job):
+        restore_image(job, manifest, disk_path)
+        logger.info(f"已从备份 {manifest['id']} 恢复 {manifest['image']} 到 {disk_path}")
+        return {'name': disk_name, 'path': disk_path, 'manifest': manifest['id'], 'source': manifest['image']}
+
+    job = job_manager.submit('restore', f'恢复 {os.path.basename(image_path)} ({manifest["id"]}) 到 {disk_name}',
+                             restore_job, total_bytes=manifest['size'])
+    return jsonify({
+        'success': True,
+        'message': f'已开始从备份 {manifest["id"]} 恢复到 {disk_name}',
+        'data': {'job_id': job.id, 'name': disk_name, 'path': disk_path, 'manifest': manifest['id']}
+    })
+
+# 全零和重复块扫描：各镜像的数据块分批交给进程池（spawn方式，避免复制Web进程的线程和锁），
+# 子进程（scan_worker模块）通过mmap读取、判断全零（有numpy时向量化比较）并计算哈希，主进程汇总各镜像内和镜像间的重复块
+# 可选对不在线的镜像用FALLOC_FL_PUNCH_HOLE把全零区域变成空洞，释放空间而不改变内容
+FALLOC_FL_KEEP_SIZE = 0x01
+FALLOC_FL_PUNCH_HOLE = 0x02
+
+scan_reports_cache = JsonFileCache(SCAN_REPORTS_FILE)
+
+# 块大小用作mmap偏移的步长，必须是mmap.ALLOCATIONGRANULARITY的整数倍，否则除第一批外的块都会因EINVAL失败
+if SCAN_CHUNK_SIZE <= 0 or SCAN_CHUNK_SIZE % mmap.ALLOCATIONGRANULARITY:
+    _aligned = max(1, -(-SCAN_CHUNK_SIZE // mmap.ALLOCATIONGRANULARITY)) * mmap.ALLOCATIONGRANULARITY
+    logger.warning(f"SCAN_CHUNK_SIZE_KB={SCAN_CHUNK_SIZE // 1024}不是{mmap.ALLOCATIONGRANULARITY // 1024}KB的整数倍，"
+                   f"改为{_aligned // 1024}KB")
+    SCAN_CHUNK_SIZE = _aligned
+
+# 把相邻的块序号合并成(起始偏移, 长度)区间
+def chunk_ranges(indexes, chunk_size, size_bytes):
+    ranges = []
+    for index in indexes:
+        start = index * chunk_size
+        end = min(size_bytes, start + chunk_size)
+        if ranges and ranges[-1][0] + ranges[-1][1] == start:
+            ranges[-1][1] = end - ranges[-1][0]
+        else:
+            ranges.append([start, end - start])
+    return ranges
+
+# 对全零区域打洞，打洞前重新确认内容仍为全零；返回释放的字节数
+def punch_zero_ranges(path, ranges):
+    punched = 0
+    fd = os.open(path, os.O_RDWR)
+    try:
+        for start, length in ranges:
+            for offset in range(start, start + length, SCAN_CHUNK_SIZE):
+                size = min(SCAN_CHUNK_SIZE, start + length - offset)
+                if not chunk_is_zero(os.pread(fd, size, offset)):
+                    continue
+                if _libc.fallocate(fd, FALLOC_FL_PUNCH_HOLE | FALLOC_FL_KEEP_SIZE, offset, size) != 0:
+                    err = ctypes.get_errno()
+                    raise OSError(err, f'{path}打洞失败: {os.strerror(err)}')
+                punched += size
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+    disk_inventory.invalidate(path)
+    return punched
+
+# 镜像是否可以安全打洞：没有LUN使用，或使用它的LUN都已离线且所在Target没有连接
+def image_offline(path, targets):
+    for target in targets:
+        for lun in target.luns:
+            if lun.backing_store == path and (lun.online is not False or target.nexus_information):
+                return False
+    return True
+
+# 扫描一组镜像，返回{镜像路径: 报告}；punch为True时对离线镜像的全零区域打洞
+def scan_images(job, paths, punch=False):
+    chunk_size = SCAN_CHUNK_SIZE
+    reports = {}
+    zero_indexes = {}
+    seen = {}  # 哈希 -> 首次出现的镜像路径
+    scanned = 0  # 已扫描完的镜像的总大小
+    context = multiprocessing.get_context('spawn')
+    pool = ProcessPoolExecutor(max_workers=SCAN_WORKERS, mp_context=context)
+    try:
+        for path in paths:
+            st = os.stat(path)
+            with open(path, 'rb') as f:
+                indexes = data_chunk_indexes(f.fileno(), st.st_size, chunk_size)
+            report = {
+                'size_bytes': st.st_size,
+                'allocated_bytes': st.st_blocks * 512,
+                'mtime_ns': st.st_mtime_ns,
+                'chunk_size': chunk_size,
+                'data_chunks': len(indexes),
+                'zero_chunks': 0,
+                'zero_bytes': 0,
+                'duplicate_chunks': 0,
+                'duplicate_bytes': 0,
+                'shared_with': []
+            }
+            zeros = zero_indexes[path] = []
+            own = set()
+            done = 0
+            futures = [pool.submit(scan_chunk_batch, path, indexes[i:i + SCAN_BATCH_CHUNKS], chunk_size)
+                       for i in range(0, len(indexes), SCAN_BATCH_CHUNKS)]
+            for future in as_completed(futures):
+                for index, digest in future.result():
+                    length = min(chunk_size, st.st_size - index * chunk_size)
+                    done += length
+                    if digest is None:
+                        zeros.append(index)
+                        report['zero_chunks'] += 1
+                        report['zero_bytes'] += length
+                        continue
+                    first = seen.setdefault(digest, path)
+                    if first != path or digest in own:
+                        report['duplicate_chunks'] += 1
+                        report['duplicate_bytes'] += length
+                        if first != path:
+                            report['shared_with'].append(first)
+                    own.add(digest)
+                job.progress(scanned + done)
+            scanned += st.st_size
+            job.progress(scanned)
+            report['shared_with'] = sorted(set(report['shared_with']))
+            report['reclaimable_bytes'] = report['zero_bytes'] + report['duplicate_bytes']
+            report['scanned_at'] = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            reports[path] = report
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+    if punch:
+        targets = get_targets()
+        for path, report in reports.items():
+            if not zero_indexes[path]:
+                continue
+            if not image_offline(path, targets):
+                report['punch_skipped'] = '镜像正被在线LUN使用'
+                continue
+            zeros = sorted(zero_indexes[path])
+            report['punched_bytes'] = punch_zero_ranges(path, chunk_ranges(zeros, chunk_size, report['size_bytes']))
+            # 打洞会更新mtime，同步到报告中使其不被视为过期
+            st = os.stat(path)
+            report['mtime_ns'] = st.st_mtime_ns
+            report['allocated_bytes'] = st.st_blocks * 512
+            report['reclaimable_bytes'] -= report['punched_bytes']
+            logger.info(f"已对 {path} 的全零区域打洞，释放{report['punched_bytes']}字节")
+    return reports
+
+# 路由：查看空间扫描报告
+@app.route('/api/scan')
+def get_scan_reports():
+    reports = scan_reports_cache.get()
+    return jsonify({
+        'success': True,
+        'data': {
+            'images': reports,
+            'reclaimable_bytes': sum(r['reclaimable_bytes'] for r in reports.values()),
+            'zero_bytes': sum(r['zero_bytes'] for r in reports.values()),
+            'duplicate_bytes': sum(r['duplicate_bytes'] for r in reports.values())
+        }
+    })
+
+# 路由：扫描镜像中的全零和重复块（未指定images时扫描全部镜像），可选对离线镜像打洞，作为后台任务执行
+@app.route('/api/scan', methods=['POST'])
+def start_scan():
+    payload = request.get_json(silent=True) or {}
+    names = payload.get('images')
+    punch = bool(payload.get('punch'))
+    if names is None:
+        paths = [entry['path'] for entry in disk_inventory.entries()]
+    elif isinstance(names, list):
+        paths = [resolve_disk_path(str(name)) for name in names]
+        invalid = [name for name, path in zip(names, paths) if path is None]
+        if invalid:
+            return jsonify({
+                'success': False,
+                'message': f'镜像不存在或不在 {BASE_DISK_DIR} 目录下: {", ".join(map(str, invalid))}',
+                'error_code': 'INVALID_PARAMS'
+            })
+    else:
+        return jsonify({
+            'success': False,
+            'message': 'images必须是镜像名称列表',
+            'error_code': 'INVALID_PARAMS'
+        })
+    if not paths:
+        return jsonify({
+            'success': False,
+            'message': '没有需要扫描的镜像',
+            'error_code': 'MISSING_PARAMS'
+        })
+
+    def scan_job(job):
+        reports = scan_images(job, paths, punch)
+        scan_reports_cache.update_many(reports)
+        return {
+            'images': len(reports),
+            'zero_bytes': sum(r['zero_bytes'] for r in reports.values()),
+            'duplicate_bytes': sum(r['duplicate_bytes'] for r in reports.values()),
+            'punched_bytes': sum(r.get('punched_bytes', 0) for r in reports.values())
+        }
+
+    job = job_manager.submit('scan', f'扫描{len(paths)}个镜像的全零和重复块' + ('并打洞' if punch else ''), scan_job,
+                             total_bytes=sum(os.path.getsize(path) for path in paths))
+    return jsonify({
+        'success': True,
+        'message': f'已开始扫描{len(paths)}个镜像',
+        'data': {'job_id': job.id, 'images': paths, 'punch': punch}
+    })
+
+# 页缓存策略：按后备存储设置预热(warm)、常驻(pin)和不缓存(nocache)
+# warm在启动后和设置策略时把镜像（或记录的热点区段）用POSIX_FADV_WILLNEED按限速读入页缓存；
+# pin在此基础上每隔CACHE_POLICY_INTERVAL补齐被挤出的部分；nocache定期用POSIX_FADV_DONTNEED丢弃缓存
+CACHE_POLICIES = {'none': '默认', 'warm': '预热', 'pin': '常驻', 'nocache': '不缓存'}
+CACHE_REGIONS = ('all', 'hot')  # 预热整个镜像的数据区段，或只预热上次记录的热点区段
+
+cache_policies_cache = JsonFileCache(CACHE_POLICIES_FILE)  # 后备存储路径 -> {'policy','rate_mb','regions','hot_ranges',...}
+
+_libc.mmap.restype = ctypes.c_void_p
+_libc.mmap.argtypes = (ctypes.c_void_p, ctypes.c_size_t, ctypes.c_int, ctypes.c_int, ctypes.c_int, ctypes.c_int64)
+_libc.munmap.argtypes = (ctypes.c_void_p, ctypes.c_size_t)
+_libc.mincore.argtypes = (ctypes.c_void_p, ctypes.c_size_t, ctypes.c_char_p)
+_MAP_FAILED = ctypes.c_void_p(-1).value
+_MINCORE_RESIDENT = bytes(value & 1 for value in range(256))  # mincore结果只有最低位有意义
+
+# 用mincore(2)统计文件的页缓存驻留情况，返回(驻留字节数, 每个区块的状态)
+# granularity不为None时，区块状态为bytearray：0表示没有页驻留，1表示部分驻留，2表示全部驻留
+def page_cache_map(path, granularity=None):
+    page = mmap.PAGESIZE
+    fd = os.open(path, os.O_RDONLY | os.O_CLOEXEC)
+    try:
+        size_bytes = os.fstat(fd).st_size
+        resident = 0
+        granules = bytearray() if granularity else None
+        step = granularity // page if granularity else 0
+        offset = 0
+        while offset < size_bytes:
+            length = min(CACHE_MINCORE_WINDOW, size_bytes - offset)
+            addr = _libc.mmap(None, length, mmap.PROT_READ, mmap.MAP_SHARED, fd, offset)
+            if addr is None or addr == _MAP_FAILED:
+                err = ctypes.get_errno()
+                raise OSError(err, os.strerror(err))
+            try:
+                vec = ctypes.create_string_buffer((length + page - 1) // page)
+                if _libc.mincore(addr, length, vec) != 0:
+                    err = ctypes.get_errno()
+                    raise OSError(err, os.strerror(err))
+            finally:
+                _libc.munmap(addr, length)
+            pages = vec.raw.translate(_MINCORE_RESIDENT)
+            resident += pages.count(1) * page
+            if granules is not None:
+                for i in range(0, len(pages), step):
+                    count = pages.count(1, i, i + step)
+                    granules.append(0 if count == 0 else 2 if count == min(step, len(pages) - i) else 1)
+            offset += length
+        return min(resident, size_bytes), granules
+    finally:
+        os.close(fd)
+
+# 把区块状态中满足条件的连续区块合并为[起始, 结束)区段
+def granule_ranges(granules, granularity, size_bytes, states):
+    ranges = []
+    for index, state in enumerate(granules):
+        if state not in states:
+            continue
+        start = index * granularity
+        end = min(start + granularity, size_bytes)
+        if ranges and ranges[-1][1] == start:
+            ranges[-1][1] = end
+        else:
+            ranges.append([start, end])
+    return ranges
+
+# 按SEEK_DATA/SEEK_HOLE列出数据区段；文件系统不支持时整个文件视为一个区段
+def data_extents(fd, size_bytes):
+    extents = []
+    position = 0
+    while position < size_bytes:
+        try:
+            data_start = os.lseek(fd, position, os.SEEK_DATA)
+            data_end = min(os.lseek(fd, data_start, os.SEEK_HOLE), size_bytes)
+        except OSError as e:
+            if e.errno == errno.ENXIO:
+                break
+            if e.errno != errno.EINVAL:
+                raise
+            return [[0, size_bytes]]
+        extents.append([data_start, data_end])
+        position = data_end
+    return extents
+
+# 两组已排序区段的交集
+def intersect_ranges(a, b):
+    result = []
+    i = j = 0
+    while i < len(a) and j < len(b):
+        start = max(a[i][0], b[j][0])
+        end = min(a[i][1], b[j][1])
+        if start < end:
+            result.append([start, end])
+        if a[i][1] < b[j][1]:
+            i += 1
+        else:
+            j += 1
+    return result
+
+# 把镜像中尚未完全驻留的数据区段（regions不为None时只取其中的热点区段）读入页缓存
+# WILLNEED只提交预读请求，按提交的字节数限速；stop()返回True时提前结束。返回(提交的字节数, 需要预热的字节数)
+def warm_image(path, regions=None, rate=None, progress=None, stop=None):
+    resident, granules = page_cache_map(path, CACHE_WARM_CHUNK)
+    fd = os.open(path, os.O_RDONLY | os.O_CLOEXEC)
+    try:
+        size_bytes = os.fstat(fd).st_size
+        ranges = intersect_ranges(data_extents(fd, size_bytes),
+                                  granule_ranges(granules, CACHE_WARM_CHUNK, size_bytes, (0, 1)))
+        if regions is not None:
+            ranges = intersect_ranges(ranges, regions)
+        total = sum(end - start for start, end in ranges)
+        warmed = 0
+        started = time.monotonic()
+        for start, end in ranges:
+            position = start
+            while position < end:
+                length = min(CACHE_WARM_CHUNK, end - position)
+                os.posix_fadvise(fd, position, length, os.POSIX_FADV_WILLNEED)
+                position += length
+                warmed += length
+                if progress:
+                    progress(warmed, total)
+                if stop and stop():
+                    return warmed, total
+                if rate:
+                    delay = warmed / rate - (time.monotonic() - started)
+                    if delay > 0:
+                        time.sleep(delay)
+        return warmed, total
+    finally:
+        os.close(fd)
+
+# 丢弃镜像的干净缓存页（脏页会先开始回写，不会丢失数据）
+def drop_image_cache(path):
+    fd = os.open(path, os.O_RDONLY | os.O_CLOEXEC)
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    finally:
+        os.close(fd)
+
+# 页缓存策略后台线程：启动时处理所有已设置的策略，之后按队列处理新设置的策略，
+# 并定期补齐pin、丢弃nocache、记录热点区段和统计每个镜像的驻留字节数（页面和/api/cache只读取统计结果）
+class PageCacheManager:
+    def __init__(self, interval):
+        self.interval = interval
+        self._cond = threading.Condition()
+        self._pending = []    # 等待处理的后备存储路径
+        self._status = {}     # 后备存储路径 -> 最近一次处理的状态
+        self._residency = {}  # 后备存储路径 -> (驻留字节数, 统计时间)
+        self._thread = None
+
+    # 启动后台线程
+    def start(self):
+        with self._cond:
+            if self._thread is None or not self._thread.is_alive():
+                self._pending = [path for path, entry in cache_policies_cache.get().items()
+                                 if entry.get('policy', 'none') != 'none']
+                self._thread = threading.Thread(target=self._run, name='page-cache', daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+
+    # 策略变化后尽快处理该镜像
+    def apply(self, path):
+        with self._cond:
+            if path not in self._pending:
+                self._pending.append(path)
+            self._cond.notify_all()
+        self.start()
+
+    def status(self):
+        with self._cond:
+            return {path: dict(status) for path, status in self._status.items()}
+
+    # 最近一次统计的驻留字节数和统计时间，尚未统计或无法统计时返回(None, None)
+    def residency(self, path):
+        with self._cond:
+            return self._residency.get(path, (None, None))
+
+    # 统计镜像的驻留字节数
+    def refresh_residency(self, paths):
+        for path in paths:
             try:
-                with open(disk_methods_file, 'r') as f:
-                    disk_methods = json.load(f)
+                with span('page_cache.mincore'):
+                    resident = page_cache_map(path)[0]
+            except Exception:
+                resident = None
+            with self._cond:
+                self._residency[path] = (resident, time.time())
+
+    # 进程退出时记录热点区段，重启后按记录预热
+    def shutdown(self):
+        try:
+            self.record_hot_ranges()
+        except Exception as e:
+            logger.error(f"记录页缓存热点区段失败: {e}")
+
+    # 记录使用warm/pin策略且regions为hot的镜像当前驻留的区段，只写一次文件
+    def record_hot_ranges(self):
+        policies = cache_policies_cache.get()
+        updates = {}
+        for path, entry in policies.items():
+            if entry['policy'] not in ('warm', 'pin') or entry.get('regions') != 'hot':
+                continue
+            try:
+                size_bytes = os.path.getsize(path)
+                resident, granules = page_cache_map(path, CACHE_HOT_GRANULARITY)
+            except OSError:
+                continue
+            if resident:
+                updates[path] = dict(entry, hot_ranges=granule_ranges(granules, CACHE_HOT_GRANULARITY, size_bytes, (1, 2)),
+                                     hot_recorded_at=datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+        if updates:
+            cache_policies_cache.update_many(updates)
+
+    def _set_status(self, path, **status):
+        with self._cond:
+            self._status[path] = dict(self._status.get(path) or {}, updated_at=time.time(), **status)
+
+    def _run(self):
+        logger.info("页缓存策略线程已启动")
+        self._refresh_all_residency()
+        next_pass = time.monotonic() + self.interval
+        while True:
+            with self._cond:
+                while not self._pending:
+                    remaining = next_pass - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                path = self._pending.pop(0) if self._pending else None
+            if path is None:
+                next_pass = time.monotonic() + self.interval
+                self._periodic()
+                continue
+            try:
+                self._process(path)
             except Exception as e:
-                logger.error(f"读取磁盘创建方法信息失败: {str(e)}")
+                logger.error(f"处理{path}的页缓存策略失败: {e}")
+                self._set_status(path, state='error', error=str(e))
+            self.refresh_residency([path])
 
-        # 添加新磁盘的创建方法
-        disk_methods[disk_name] = method_description
+    def _periodic(self):
+        try:
+            self.record_hot_ranges()
+        except Exception as e:
+            logger.error(f"记录页缓存热点区段失败: {e}")
+        try:
+            with self._cond:
+                for path, entry in cache_policies_cache.get().items():
+                    if entry.get('policy') in ('pin', 'nocache') and path not in self._pending:
+                        self._pending.append(path)
+        except Exception as e:
+            logger.error(f"读取页缓存策略失败: {e}")
+        self._refresh_all_residency()
 
-        # 保存回文件
+    # 统计所有镜像的驻留字节数，并丢弃已删除镜像的统计结果
+    def _refresh_all_residency(self):
         try:
-            with open(disk_methods_file, 'w') as f:
-                json.dump(disk_methods, f)
-            logger.info(f"已保存磁盘 {disk_name} 的创建方法: {method_description}")
+            paths = [entry['path'] for entry in disk_inventory.entries()]
+            with self._cond:
+                for path in set(self._residency) - set(paths):
+                    del self._residency[path]
+            self.refresh_residency(paths)
         except Exception as e:
-            logger.error(f"保存磁盘创建方法信息失败: {str(e)}")        
+            logger.error(f"统计页缓存驻留情况失败: {e}")
+
+    def _process(self, path):
+        entry = cache_policies_cache.get().get(path)
+        if not entry or entry['policy'] == 'none':
+            with self._cond:
+                self._status.pop(path, None)
+            return
+        policy = entry['policy']
+        if policy == 'nocache':
+            drop_image_cache(path)
+            self._set_status(path, policy=policy, state='idle', done_bytes=0, total_bytes=0, error=None)
+            return
+
+        regions = entry.get('hot_ranges') if entry.get('regions') == 'hot' else None
+        rate = entry['rate_mb'] * 1024 * 1024 if entry.get('rate_mb') else None
+        self._set_status(path, policy=policy, state='warming', done_bytes=0, total_bytes=None, error=None)
+        # 策略在预热过程中被修改时停止，由新的策略重新处理
+        stop = lambda: (cache_policies_cache.get().get(path) or {}).get('policy') != policy
+        with span('page_cache.warm'):
+            warmed, total = warm_image(path, regions, rate,
+                                       progress=lambda done, total: self._set_status(path, done_bytes=done, total_bytes=total),
+                                       stop=stop)
+        self._set_status(path, state='idle', done_bytes=warmed, total_bytes=total)
+        if warmed:
+            logger.info(f"已预热{path}: {warmed / 1024 / 1024:.0f} MB")
+
+cache_manager = PageCacheManager(CACHE_POLICY_INTERVAL)
+_cache_manager_started = False
+_cache_manager_lock = threading.Lock()
+
+# 页缓存策略线程在应用处理第一个请求时启动（每个进程一次），而不是在导入时启动，
+# 避免导入app的子进程各自预热镜像并在退出时改写cache_policies.json
+@app.before_request
+def start_cache_manager():
+    global _cache_manager_started
+    if _cache_manager_started:
+        return
+    with _cache_manager_lock:
+        if not _cache_manager_started:
+            cache_manager.start()
+            atexit.register(cache_manager.shutdown)
+            _cache_manager_started = True
+
+# 路由：页缓存策略、处理状态和每个镜像的驻留情况
+@app.route('/api/cache')
+def get_cache_policies():
+    policies = cache_policies_cache.get()
+    status = cache_manager.status()
+    images = []
+    for entry in disk_inventory.entries():
+        policy = policies.get(entry['path']) or {}
+        resident, resident_updated_at = cache_manager.residency(entry['path'])
+        images.append({
+            'path': entry['path'],
+            'name': entry['name'],
+            'size_bytes': entry['size'],
+            'allocated_bytes': entry['allocated'],
+            'resident_bytes': resident,
+            'resident_updated_at': resident_updated_at,
+            'policy': policy.get('policy', 'none'),
+            'rate_mb': policy.get('rate_mb'),
+            'regions': policy.get('regions'),
+            'hot_bytes': sum(end - start for start, end in policy.get('hot_ranges') or []),
+            'hot_recorded_at': policy.get('hot_recorded_at'),
+            'status': status.get(entry['path'])
+        })
+    return jsonify({
+        'success': True,
+        'data': {'images': images}
+    })
 
+# 路由：设置镜像的页缓存策略（policy为none时删除），立即在后台执行一次
+@app.route('/api/cache/policy', methods=['POST'])
+def set_cache_policy():
+    payload = request.get_json(silent=True) or request.form
+    path = resolve_disk_path(str(payload.get('path') or ''))
+    policy = payload.get('policy', 'none')
+    regions = payload.get('regions') or 'all'
+    if path is None:
         return jsonify({
-            'success': True,
-            'message': f'虚拟磁盘 {disk_name} 创建成功，大小: {disk_size}{disk_unit}，使用{method_description}',
-            'data': {
-                'name': disk_name,
-                'path': disk_path,
-                'size': f"{disk_size}{disk_unit}",
-                'method': create_method
-            }
+            'success': False,
+            'message': f'镜像不存在或不在 {BASE_DISK_DIR} 目录下',
+            'error_code': 'INVALID_PARAMS'
+        })
+    if policy not in CACHE_POLICIES or regions not in CACHE_REGIONS:
+        return jsonify({
+            'success': False,
+            'message': f'不支持的策略: {policy}/{regions}，可选: {", ".join(CACHE_POLICIES)}；区段可选: {", ".join(CACHE_REGIONS)}',
+            'error_code': 'INVALID_PARAMS'
+        })
+    try:
+        rate_mb = float(payload.get('rate_mb') or CACHE_WARM_RATE_MB)
+    except (TypeError, ValueError):
+        rate_mb = -1
+    if rate_mb <= 0:
+        return jsonify({
+            'success': False,
+            'message': 'rate_mb必须是正数',
+            'error_code': 'INVALID_PARAMS'
         })
+
+    policies = dict(cache_policies_cache.get())
+    previous = policies.get(path) or {}
+    if policy == 'none':
+        policies.pop(path, None)
     else:
-        logger.error(f"创建虚拟磁盘失败({method_description}): {result['error']}")
+        entry = {'policy': policy, 'rate_mb': rate_mb, 'regions': regions}
+        # 保留已记录的热点区段
+        for key in ('hot_ranges', 'hot_recorded_at'):
+            if key in previous:
+                entry[key] = previous[key]
+        policies[path] = entry
+    cache_policies_cache.replace(policies)
+    cache_manager.apply(path)
+    return jsonify({
+        'success': True,
+        'message': f'已将 {os.path.basename(path)} 的缓存策略设置为{CACHE_POLICIES[policy]}',
+        'data': policies.get(path)
+    })
+
+# 存储基准测试：用线程池中的os.preadv/os.pwrite对后备存储或临时镜像施加指定负载，记录IOPS、吞吐量和延迟直方图
+# 队列深度用线程数×队列深度个同步I/O线程模拟；每个线程使用按页对齐的mmap缓冲区，满足O_DIRECT的对齐要求
+BENCHMARK_PATTERNS = ('read', 'write', 'randread', 'randwrite')
+BENCHMARK_SCRATCH_PREFIX = '.benchmark-'  # 临时镜像以点开头，不会出现在磁盘列表中
+
+benchmark_results_cache = JsonFileCache(BENCHMARK_RESULTS_FILE)
+
+class BenchmarkWorkerStats:
+    __slots__ = ('ios', 'bytes', 'latency_sum', 'latency_min', 'latency_max', 'histogram')
+
+    def __init__(self):
+        self.ios = 0
+        self.bytes = 0
+        self.latency_sum = 0.0
+        self.latency_min = float('inf')
+        self.latency_max = 0.0
+        self.histogram = [0] * BENCHMARK_LATENCY_BUCKETS
+
+def _benchmark_worker(fd, write, sequential, block_size, blocks, counter, seed, stop, stats):
+    buffer = mmap.mmap(-1, block_size)
+    if write:
+        buffer.write(os.urandom(block_size))  # 随机内容，避免被存储层按全零或压缩优化
+    rng = random.Random(seed)
+    buffers = [buffer]
+    last_bucket = BENCHMARK_LATENCY_BUCKETS - 1
+    try:
+        while not stop.is_set():
+            offset = (next(counter) % blocks if sequential else rng.randrange(blocks)) * block_size
+            started = time.perf_counter()
+            count = os.pwrite(fd, buffer, offset) if write else os.preadv(fd, buffers, offset)
+            latency = time.perf_counter() - started
+            stats.ios += 1
+            stats.bytes += count
+            stats.latency_sum += latency
+            if latency < stats.latency_min:
+                stats.latency_min = latency
+            if latency > stats.latency_max:
+                stats.latency_max = latency
+            stats.histogram[min(int(latency * 1000000).bit_length(), last_bucket)] += 1
+    finally:
+        buffer.close()
+
+# 由直方图估算百分位延迟（取所在桶的上界，单位微秒）
+def histogram_percentile(histogram, total, percent):
+    threshold = total * percent / 100
+    running = 0
+    for bucket, count in enumerate(histogram):
+        running += count
+        if count and running >= threshold:
+            return 1 << bucket
+    return None
+
+# 执行一次基准测试，返回结果字典
+def run_benchmark(job, path, params):
+    write = params['pattern'] in ('write', 'randwrite')
+    sequential = params['pattern'] in ('read', 'write')
+    block_size = params['block_size']
+    flags = (os.O_RDWR if write else os.O_RDONLY) | (os.O_DIRECT if params['direct'] else 0)
+    fd = os.open(path, flags)
+    try:
+        blocks = min(params['region_bytes'] or os.fstat(fd).st_size, os.fstat(fd).st_size) // block_size
+        if blocks < 1:
+            raise ValueError(f'{path} 小于一个块（{block_size}字节）')
+        workers = params['threads'] * params['queue_depth']
+        stop = threading.Event()
+        counter = itertools.count()
+        stats = [BenchmarkWorkerStats() for _ in range(workers)]
+        started = time.perf_counter()
+        deadline = time.monotonic() + params['runtime']
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='benchmark') as pool:
+            futures = [pool.submit(_benchmark_worker, fd, write, sequential, block_size, blocks, counter,
+                                   index, stop, stats[index]) for index in range(workers)]
+            try:
+                while time.monotonic() < deadline and not any(f.done() for f in futures):
+                    time.sleep(min(0.5, max(0.0, deadline - time.monotonic())))
+                    job.progress(sum(stat.bytes for stat in stats))
+            finally:
+                stop.set()
+            for future in futures:
+                future.result()  # 有线程出错时抛出异常
+        elapsed = time.perf_counter() - started
+        if write:
+            os.fsync(fd)
+    finally:
+        os.close(fd)
+
+    ios = sum(stat.ios for stat in stats)
+    histogram = [sum(stat.histogram[bucket] for stat in stats) for bucket in range(BENCHMARK_LATENCY_BUCKETS)]
+    return {
+        'elapsed_seconds': round(elapsed, 3),
+        'ios': ios,
+        'bytes': sum(stat.bytes for stat in stats),
+        'iops': round(ios / elapsed, 1),
+        'throughput_bytes': round(sum(stat.bytes for stat in stats) / elapsed),
+        'latency': {
+            'mean_us': round(sum(stat.latency_sum for stat in stats) / ios * 1000000, 1) if ios else None,
+            'min_us': round(min(stat.latency_min for stat in stats) * 1000000, 1) if ios else None,
+            'max_us': round(max(stat.latency_max for stat in stats) * 1000000, 1) if ios else None,
+            'p50_us': histogram_percentile(histogram, ios, 50),
+            'p95_us': histogram_percentile(histogram, ios, 95),
+            'p99_us': histogram_percentile(histogram, ios, 99),
+            'p999_us': histogram_percentile(histogram, ios, 99.9),
+            # [桶上界(微秒), 次数]，只保留非空的桶
+            'histogram': [[1 << bucket, count] for bucket, count in enumerate(histogram) if count]
+        }
+    }
+
+# 后备存储是否正被在线且有连接的LUN使用
+def backing_store_in_use(path, targets):
+    return any(lun.backing_store == path and lun.online is not False and target.nexus_information
+               for target in targets for lun in target.luns)
+
+# 解析基准测试参数，返回(参数, 错误信息)
+def parse_benchmark_params(payload):
+    try:
+        params = {
+            'pattern': payload.get('pattern', 'randread'),
+            'block_size': int(payload.get('block_size', 4096)),
+            'queue_depth': int(payload.get('queue_depth', 1)),
+            'threads': int(payload.get('threads', 1)),
+            'direct': bool(payload.get('direct', True)),
+            'runtime': float(payload.get('runtime', 10)),
+            'region_bytes': int(payload.get('region_mb', 0)) * 1024 * 1024
+        }
+    except (TypeError, ValueError):
+        return None, 'block_size、queue_depth、threads、runtime和region_mb必须是数字'
+    if params['pattern'] not in BENCHMARK_PATTERNS:
+        return None, f'不支持的负载类型: {params["pattern"]}，可选: {", ".join(BENCHMARK_PATTERNS)}'
+    if params['block_size'] < 512 or params['block_size'] > 64 * 1024 * 1024:
+        return None, '块大小必须在512字节到64MB之间'
+    if params['direct'] and params['block_size'] % DIRECT_IO_ALIGNMENT:
+        return None, f'O_DIRECT模式下块大小必须是{DIRECT_IO_ALIGNMENT}的整数倍'
+    if params['queue_depth'] < 1 or params['threads'] < 1 or params['queue_depth'] * params['threads'] > BENCHMARK_MAX_WORKERS:
+        return None, f'线程数和队列深度必须大于0，且乘积不超过{BENCHMARK_MAX_WORKERS}'
+    if not 0 < params['runtime'] <= BENCHMARK_MAX_RUNTIME:
+        return None, f'运行时间必须在0到{BENCHMARK_MAX_RUNTIME}秒之间'
+    if params['region_bytes'] < 0:
+        return None, 'region_mb不能为负数'
+    return params, None
+
+# 路由：已保存的基准测试结果（新的在前）和可选的测试对象
+@app.route('/api/benchmark')
+def list_benchmarks():
+    targets = get_targets()
+    results = sorted(benchmark_results_cache.get().values(), key=lambda r: r['started_at'], reverse=True)
+    return jsonify({
+        'success': True,
+        'data': {
+            'results': results,
+            'targets': [{'path': entry['path'], 'name': entry['name'], 'size_bytes': entry['size'],
+                         'in_use': backing_store_in_use(entry['path'], targets)}
+                        for entry in disk_inventory.entries()]
+        }
+    })
+
+# 路由：运行基准测试（后台任务）。path为空时在BASE_DISK_DIR中创建临时镜像测试后删除
+# 写入测试会覆盖数据：拒绝写入在线且有连接的LUN，写入已有文件需要confirm_overwrite
+@app.route('/api/benchmark', methods=['POST'])
+def start_benchmark():
+    payload = request.get_json(silent=True) or {}
+    params, error = parse_benchmark_params(payload)
+    if error:
         return jsonify({
             'success': False,
-            'message': f'创建虚拟磁盘失败: {result["error"]}',
-            'error': result['error'],
-            'details': result.get('details', {})
+            'message': error,
+            'error_code': 'INVALID_PARAMS'
         })
+    write = params['pattern'] in ('write', 'randwrite')
+
+    path = payload.get('path')
+    scratch_bytes = None
+    if path:
+        path = resolve_disk_path(str(path))
+        if path is None:
+            return jsonify({
+                'success': False,
+                'message': f'测试对象不存在或不在 {BASE_DISK_DIR} 目录下',
+                'error_code': 'INVALID_PARAMS'
+            })
+        if write and backing_store_in_use(path, get_targets()):
+            return jsonify({
+                'success': False,
+                'message': f'{path} 正被在线且有连接的LUN使用，拒绝写入测试',
+                'error_code': 'LUN_IN_USE'
+            })
+        if write and not payload.get('confirm_overwrite'):
+            return jsonify({
+                'success': False,
+                'message': f'写入测试会覆盖 {path} 中的数据，请设置confirm_overwrite确认',
+                'error_code': 'CONFIRM_REQUIRED'
+            })
+    else:
+        try:
+            scratch_bytes = int(payload.get('scratch_mb', 1024)) * 1024 * 1024
+        except (TypeError, ValueError):
+            scratch_bytes = 0
+        if scratch_bytes <= 0:
+            return jsonify({
+                'success': False,
+                'message': 'scratch_mb必须是正整数',
+                'error_code': 'INVALID_PARAMS'
+            })
+
+    run_id = datetime.datetime.now().strftime('%Y%m%d-%H%M%S-') + uuid.uuid4().hex[:6]
+
+    def benchmark_job(job):
+        target = path
+        if scratch_bytes:
+            # 临时镜像先写零填满，读测试才会真正访问存储而不是读到未分配区域
+            target = os.path.join(BASE_DISK_DIR, f'{BENCHMARK_SCRATCH_PREFIX}{run_id}.img')
+            allocate_image(_InlineJob(), target, scratch_bytes, 'zero')
+        try:
+            result = run_benchmark(job, target, params)
+        finally:
+            if scratch_bytes:
+                with contextlib.suppress(OSError):
+                    os.unlink(target)
+        record = {
+            'id': run_id,
+            'started_at': datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'path': path or f'临时镜像({scratch_bytes // 1024 // 1024}MB)',
+            'label': payload.get('label') or None,
+            'engine': 'psync',
+            'params': params,
+            **result
+        }
+        results = dict(benchmark_results_cache.get())
+        results[run_id] = record
+        for old in sorted(results.values(), key=lambda r: r['started_at'])[:max(0, len(results) - BENCHMARK_HISTORY_SIZE)]:
+            del results[old['id']]
+        benchmark_results_cache.replace(results)
+        logger.info(f"基准测试 {run_id} 完成: {params['pattern']} bs={params['block_size']} "
+                    f"qd={params['threads']}x{params['queue_depth']}, {record['iops']} IOPS, "
+                    f"{record['throughput_bytes'] / 1024 / 1024:.1f} MB/s")
+        return record
+
+    job = job_manager.submit('benchmark', f'基准测试 {params["pattern"]} bs={params["block_size"]} '
+                             f'{params["threads"]}x{params["queue_depth"]} ({path or "临时镜像"})', benchmark_job)
+    return jsonify({
+        'success': True,
+        'message': f'已开始基准测试，预计运行{params["runtime"]:g}秒',
+        'data': {'job_id': job.id, 'id': run_id}
+    })
+
+# 根据拓扑快照汇总服务状态和数量
+def get_status_summary(snapshot):
+    targets = snapshot['targets']
+    return {
+        'tgt_running': snapshot['success'],
+        'target_count': len(targets),
+        'lun_count': sum(len(target.luns) for target in targets),
+        'disk_count': len(disk_inventory.entries())
+    }
 
 # 路由：获取系统状态
 @app.route('/api/status')
 def get_status():
-    # 获取tgt服务状态
-    tgt_status = run_command('tgtadm --lld iscsi --mode system --op show')
-    
-    # 获取Target数量
-    targets = get_targets()
-    target_count = len(targets)
-    
-    # 获取LUN总数
-    lun_count = sum(len(target['luns']) for target in targets)
-    
-    # 获取磁盘文件数量
-    disk_files = get_disk_files()
-    disk_count = len(disk_files)
-    
-    # 获取磁盘目录信息
-    # disk_dirs = ['/app/'] 
+    # 获取tgt服务状态（与Target信息共用同一个拓扑快照）
+    snapshot = get_topology_snapshot()
+    status = get_status_summary(snapshot)
+    status['capacity'] = get_capacity_summary(snapshot['targets'])
 
     # 获取默认IQN值
-    default_iqns = get_default_iqns()
-    
-    return jsonify({
-        'tgt_running': tgt_status['success'],
-        'target_count': target_count,
-        'lun_count': lun_count,
-        'disk_count': disk_count,
-        'default_iqns': default_iqns
+    status['default_iqns'] = get_default_iqns()
+    return jsonify(status)
+
+# 向事件流发布拓扑变化
+def publish_topology(snapshot):
+    event_hub.publish('topology', {
+        'generation': snapshot['generation'],
+        'status': get_status_summary(snapshot),
+        'targets': [target.to_dict() for target in snapshot['targets']]
     })
 
+_stream_producer_lock = threading.Lock()
+_stream_producer = None
+
+# 事件流的拓扑生产者：有订阅者时，在拓扑失效或达到检查间隔后刷新一次快照，快照内容变化时由get_topology_snapshot发布事件
+# 无论有多少订阅者，后台只有这一个线程访问tgtd
+def _run_stream_producer():
+    publish_topology(get_topology_snapshot())
+    while True:
+        with _topology_cond:
+            generation = _topology_generation
+            deadline = time.monotonic() + STREAM_TOPOLOGY_POLL_INTERVAL
+            while _topology_generation == generation:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                _topology_cond.wait(remaining)
+        if not event_hub.subscribers:
+            return
+        try:
+            get_topology_snapshot()
+        except Exception as e:
+            logger.error(f"事件流刷新拓扑失败: {e}")
+
+def ensure_stream_producer():
+    global _stream_producer
+    with _stream_producer_lock:
+        if _stream_producer is None or not _stream_producer.is_alive():
+            _stream_producer = threading.Thread(target=_run_stream_producer, name='stream-producer', daemon=True)
+            _stream_producer.start()
+
+# 路由：SSE事件流，推送performance（性能采集）、monitor（监控启停）和topology（拓扑变化）事件
+# 参数：events（逗号分隔的事件类型，省略时订阅全部）；断线重连时浏览器通过Last-Event-ID头续传
+@app.route('/api/stream')
+def event_stream():
+    try:
+        last_event_id = int(request.headers.get('Last-Event-ID') or request.args.get('last_event_id'))
+    except (TypeError, ValueError):
+        last_event_id = None
+    events = request.args.get('events')
+    events = {event.strip() for event in events.split(',')} | {'resync'} if events else None
+    ensure_stream_producer()
+    response = Response(event_hub.subscribe(last_event_id, events), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
 # 路由：性能监控页面
 @app.route('/performance')
 def performance_page():
     return render_template('performance.html')
 
-# 路由：运行LUN优化
+# 每个LUN的调优参数：返回{后备存储路径: {LUN参数}}
+def get_tuned_params(targets, profiles):
+    lun_params = {}
+    for target in targets:
+        for lun in target.luns:
+            profile = profiles.get(lun.backing_store) if lun.backing_store else None
+            if profile and profile.get('lun_params'):
+                lun_params[lun.backing_store] = profile['lun_params']
+    return lun_params
+
+# 后备存储的物理块大小：块设备读取sysfs，文件使用所在文件系统的块大小
+def get_physical_block_size(path, device):
+    st = os.stat(path)
+    if stat.S_ISBLK(st.st_mode):
+        with contextlib.suppress(OSError, ValueError):
+            with open(f'/sys/dev/block/{device[0]}:{device[1]}/queue/physical_block_size', 'r') as f:
+                return int(f.read())
+        return 512
+    return os.statvfs(os.path.dirname(path)).f_bsize
+
+# 在临时Target和LUN上逐个设置参数，返回tgtd实际接受的参数
+# 临时Target不绑定任何Initiator，存在期间暂停配置持久化，避免被写入targets.conf
+def probe_tuning_params(directory):
+    client = get_tgtd_client()
+    path = os.path.join(directory, f'{BENCHMARK_SCRATCH_PREFIX}probe-{uuid.uuid4().hex[:6]}.img')
+    accepted = {'lun_params': []}
+    rejected = {}
+    with config_persister.paused():
+        targets = get_topology_snapshot(force=True)['targets']
+        for target in targets:
+            if target.name == TUNING_SCRATCH_IQN:
+                logger.warning(f"删除上次调优遗留的临时Target {target.tid}")
+                client.target_delete(target.tid, force=True)
+        tid = max((int(target.tid) for target in targets), default=0) + 1
+        if tid > MAX_TARGET_ID:
+            raise RuntimeError('没有可用的Target ID用于创建临时Target')
+        allocate_image(_InlineJob(), path, 1024 * 1024, 'sparse')
+        try:
+            result = client.target_new(tid, TUNING_SCRATCH_IQN)
+            if not result['success']:
+                raise RuntimeError(f'创建临时Target失败: {result["error"]}')
+            try:
+                result = client.lun_new(tid, 1, path)
+                if not result['success']:
+                    raise RuntimeError(f'创建临时LUN失败: {result["error"]}')
+                for key, value in TUNING_LUN_PARAMS.items():
+                    result = client.lun_update(tid, 1, {key: value})
+                    if result['success']:
+                        accepted['lun_params'].append(key)
+                    else:
+                        rejected[key] = (result['error'] or '').strip()
+            finally:
+                client.lun_delete(tid, 1)
+                client.target_delete(tid, force=True)
+        finally:
+            with contextlib.suppress(OSError):
+                os.unlink(path)
+            invalidate_topology()
+    logger.info(f"tgtd接受的调优参数: {accepted}，不支持: {list(rejected)}")
+    return dict(accepted, rejected=rejected, probed_at=datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+
+# 在候选值中选择结果不低于最佳结果(1-TUNING_TOLERANCE)倍的最小值，减少测量噪声带来的无意义调整
+def pick_candidate(results):
+    best = max(results.values())
+    return min(candidate for candidate, value in results.items() if value >= best * (1 - TUNING_TOLERANCE))
+
+# 把多个子测试的进度累加到同一个任务上
+class _OffsetJob:
+    def __init__(self, job, offset):
+        self.job = job
+        self.offset = offset
+
+    def progress(self, done_bytes):
+        self.job.progress(self.offset + done_bytes)
+
+# 在一个存储设备上用顺序读测试候选的传输长度
+# 文件使用同一目录（同一文件系统）中的临时镜像，块设备只做读测试；都使用O_DIRECT避免测到页缓存
+def measure_tuning_candidates(job, path, block_sizes):
+    progress = _OffsetJob(job, 0)
+    scratch = None
+    if not stat.S_ISBLK(os.stat(path).st_mode):
+        scratch = os.path.join(os.path.dirname(path), f'{BENCHMARK_SCRATCH_PREFIX}tuning-{uuid.uuid4().hex[:6]}.img')
+        allocate_image(_InlineJob(), scratch, TUNING_SCRATCH_MB * 1024 * 1024, 'zero')
+    try:
+        throughput = {}
+        for block_size in block_sizes:
+            params, error = parse_benchmark_params({
+                'pattern': 'read', 'block_size': block_size, 'threads': 4,
+                'queue_depth': 1, 'direct': True, 'runtime': TUNING_RUNTIME
+            })
+            if error:
+                raise ValueError(error)
+            result = run_benchmark(progress, scratch or path, params)
+            progress.offset += result['bytes']
+            throughput[block_size] = result['throughput_bytes']
+    finally:
+        if scratch:
+            with contextlib.suppress(OSError):
+                os.unlink(scratch)
+    return throughput
+
+# 一次性应用调优参数：每个LUN的参数合并为一个请求，最后只持久化一次
+def apply_tuning_profiles(targets, profiles):
+    client = get_tgtd_client()
+    lun_params = get_tuned_params(targets, profiles)
+    errors = []
+    applied = 0
+    for target in targets:
+        for lun in target.luns:
+            params = lun_params.get(lun.backing_store)
+            if not params:
+                continue
+            result = client.lun_update(target.tid, lun.lun_id, params)
+            if result['success']:
+                applied += len(params)
+            else:
+                errors.append(f'Target {target.tid} LUN {lun.lun_id}: {(result["error"] or "").strip()}')
+    invalidate_topology()
+    save_config()
+    return applied, errors
+
+# 调优任务：探测参数 -> 按存储设备测试候选传输长度 -> 为每个LUN生成调优结果 -> 一次性应用并持久化
+# 只调整在后备存储上实际测量或读取到的LUN参数（最佳传输长度和物理块大小）；
+# 容器内没有iSCSI Initiator，无法通过Target测量iSCSI数据段长度和tgtd的I/O线程数，这些参数不做修改
+# 这些LUN参数只是提供给Initiator的提示，调优无法测量其效果；结果中的block_size_throughput_ratio是在后备存储上
+# 直接顺序读时，所选传输长度与原传输长度的吞吐量之比，不代表应用参数后LUN的加速比
+def tune_luns(job):
+    probe = probe_tuning_params(BASE_DISK_DIR)
+    targets = get_topology_snapshot(force=True)['targets']
+    previous = tuning_cache.get().get('profiles') or {}
+
+    devices = {}  # 设备号 -> [(Target, LUN)]
+    for target in targets:
+        for lun in target.luns:
+            device = get_backing_device(lun.backing_store) if lun.backing_store else None
+            if device is not None:
+                devices.setdefault(device, []).append((target, lun))
+
+    profiles = {}
+    for device, luns in devices.items():
+        # 调优前的设置：上次调优的传输长度，未调优时为最小的候选值
+        baseline_sizes = {(previous.get(lun.backing_store) or {}).get('block_size', TUNING_BLOCK_SIZES[0]) for _, lun in luns}
+        block_sizes = sorted(set(TUNING_BLOCK_SIZES) | baseline_sizes)
+        with span(f'tuning.measure {device[0]}:{device[1]}'):
+            throughput = measure_tuning_candidates(job, luns[0][1].backing_store, block_sizes)
+        block_size = pick_candidate(throughput)
+
+        for target, lun in luns:
+            baseline = (previous.get(lun.backing_store) or {}).get('block_size', TUNING_BLOCK_SIZES[0])
+            logical = lun.block_size or 512
+            physical = get_physical_block_size(lun.backing_store, device)
+            lbppbe = int(math.log2(physical // logical)) if physical > logical else 0
+            lun_params = {
+                'optimal_xfer_len': block_size // logical,
+                'optimal_xfer_gran': 1 << lbppbe,
+                'lbppbe': lbppbe
+            }
+            profiles[lun.backing_store] = {
+                'device': f'{device[0]}:{device[1]}',
+                'block_size': block_size,
+                'physical_block_size': physical,
+                'lun_params': {k: v for k, v in lun_params.items() if k in probe['lun_params']},
+                'baseline': {'block_size': baseline, 'throughput_bytes': throughput[baseline]},
+                'selected': {'block_size': block_size, 'throughput_bytes': throughput[block_size]},
+                'block_size_throughput_ratio': round(throughput[block_size] / throughput[baseline], 2) if throughput[baseline] else None,
+                'measurements': {
+                    'throughput_bytes': {str(k): v for k, v in throughput.items()}
+                }
+            }
+
+    applied, errors = apply_tuning_profiles(targets, profiles)
+    report = {
+        'probe': probe,
+        'profiles': profiles,
+        'applied_params': applied,
+        'errors': errors,
+        'tuned_at': datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    }
+    tuning_cache.replace(report)
+    logger.info(f"LUN调优完成: {len(profiles)}个LUN，应用{applied}个参数，{len(errors)}个错误")
+    return report
+
+# 路由：运行LUN调优（后台任务）
 @app.route('/optimize', methods=['POST'])
 def run_optimization():
-    # 运行LUN优化脚本
-    result = run_command('bash /optimize_lun.sh')
-    
-    if result['success']:
-        flash('LUN优化成功完成', 'success')
-    else:
-        flash(f'LUN优化失败: {result["error"]}', 'error')
-    
-    return redirect(url_for('index'))
+    if any(job.kind == 'tuning' and not job.finished for job in job_manager.list()):
+        return jsonify({
+            'success': False,
+            'message': '已有LUN调优任务在执行',
+            'error_code': 'TUNING_RUNNING'
+        })
+    job = job_manager.submit('tuning', 'LUN调优', tune_luns)
+    return jsonify({
+        'success': True,
+        'message': '已开始LUN调优',
+        'data': {'job_id': job.id}
+    })
+
+# 路由：最近一次LUN调优的结果（探测到的参数、每个LUN在后备存储上测得的各传输长度的吞吐量）
+@app.route('/api/tuning')
+def get_tuning():
+    return jsonify({
+        'success': True,
+        'data': tuning_cache.get()
+    })
+
+# 读取/proc/diskstats，返回{(major, minor): (设备名, 计数元组)}
+# 计数元组的前4项与tgtd的LUN统计顺序一致：(读完成次数, 读扇区数, 写完成次数, 写扇区数)
+# 之后依次为：读耗时、写耗时、正在处理的I/O数、设备忙碌时间、加权I/O时间（时间单位均为毫秒）
+def read_diskstats(path=DISKSTATS_FILE):
+    stats = {}
+    with open(path, 'r') as f:
+        for line in f:
+            fields = line.split()
+            if len(fields) < 14:
+                continue
+            stats[(int(fields[0]), int(fields[1]))] = (fields[2], tuple(int(fields[i]) for i in (3, 5, 7, 9, 6, 10, 11, 12, 13)))
+    return stats
+
+# tgtd统计输出中每个LUN使用的列：(读完成命令数, 读完成扇区数, 写完成命令数, 写完成扇区数)
+# 与read_diskstats()的元组顺序一致；较老的tgtd只有submitted列时退回使用submitted
+TGTD_STATS_COLUMNS = (
+    ('rd_done(cmds)', 'rd_subm(cmds)'),
+    ('rd_done(sect)', 'rd_subm(sect)'),
+    ('wr_done(cmds)', 'wr_subm(cmds)'),
+    ('wr_done(sect)', 'wr_subm(sect)')
+)
+
+# 解析tgtadm --op stats的表格输出，按表头定位列，返回{(tid, lun): (读命令数, 读扇区数, 写命令数, 写扇区数)}
+# 同一LUN的多个会话累加；输出中可能有多段表头（按Target分段），遇到表头时重新定位列
+def parse_tgtd_stats(output):
+    stats = {}
+    columns = None
+    for line in output.splitlines():
+        fields = line.split()
+        if not fields:
+            continue
+        if fields[0] in ('tgt_id', 'tid'):
+            index = {name: i for i, name in enumerate(fields)}
+            try:
+                columns = [index['lun']] + [
+                    next(index[name] for name in names if name in index) for names in TGTD_STATS_COLUMNS
+                ]
+            except (KeyError, StopIteration):
+                columns = None
+            continue
+        if columns is None or len(fields) <= max(columns):
+            continue
+        try:
+            key = (str(int(fields[0])), str(int(fields[columns[0]])))
+            values = [int(fields[i]) for i in columns[1:]]
+        except ValueError:
+            continue
+        previous = stats.get(key)
+        stats[key] = tuple(values) if previous is None else tuple(a + b for a, b in zip(previous, values))
+    return stats
+
+# 获取backing store所在的块设备号；块设备本身返回其设备号，普通文件返回所在文件系统的设备号
+def get_backing_device(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    if stat.S_ISBLK(st.st_mode):
+        return (os.major(st.st_rdev), os.minor(st.st_rdev))
+    if stat.S_ISREG(st.st_mode):
+        return (os.major(st.st_dev), os.minor(st.st_dev))
+    return None
+
+# 性能历史中保存的指标列
+PERF_HISTORY_METRICS = ('read_iops', 'write_iops', 'read_throughput', 'write_throughput',
+                        'read_latency_ms', 'write_latency_ms', 'util')
+
+# 固定容量的环形缓冲区：时间戳为array('d')，每个指标一个单精度array('f')，写满后覆盖最旧的数据
+class RingSeries:
+    __slots__ = ('resolution', 'capacity', 'timestamps', 'columns', 'head', 'count')
+
+    def __init__(self, resolution, capacity, width):
+        self.resolution = resolution
+        self.capacity = capacity
+        self.timestamps = array('d', bytes(8 * capacity))
+        self.columns = [array('f', bytes(4 * capacity)) for _ in range(width)]
+        self.head = 0
+        self.count = 0
+
+    def append(self, timestamp, values):
+        self.timestamps[self.head] = timestamp
+        for column, value in zip(self.columns, values):
+            column[self.head] = value
+        self.head = (self.head + 1) % self.capacity
+        if self.count < self.capacity:
+            self.count += 1
+
+    # 第i个（按时间从旧到新）数据点在缓冲区中的下标
+    def _index(self, i):
+        return (self.head - self.count + i) % self.capacity
+
+    def oldest(self):
+        return self.timestamps[self._index(0)] if self.count else None
+
+    # 返回时间在[start, end]内的数据点下标（按时间顺序）
+    def indexes(self, start, end):
+        lo = bisect.bisect_left(range(self.count), start, key=lambda i: self.timestamps[self._index(i)])
+        hi = bisect.bisect_right(range(self.count), end, key=lambda i: self.timestamps[self._index(i)])
+        return [self._index(i) for i in range(lo, hi)]
+
+# 单个LUN的历史：原始采样、1分钟和1小时三级，低一级的数据按时间桶取平均后汇总到高一级
+class LunHistory:
+    TIERS = ((60, 1440), (3600, 720))  # 汇总级别：(分辨率秒, 保留点数)，即1天的分钟数据和30天的小时数据
+
+    __slots__ = ('tiers', 'buckets', 'updated')
+
+    def __init__(self, raw_resolution, raw_points, width):
+        self.tiers = [RingSeries(raw_resolution, raw_points, width)]
+        self.tiers.extend(RingSeries(resolution, points, width) for resolution, points in self.TIERS)
+        # 每个汇总级别正在累加的桶：[桶起始时间, 样本数, 各指标之和]
+        self.buckets = [[None, 0, [0.0] * width] for _ in self.TIERS]
+        self.updated = 0.0
+
+    def append(self, timestamp, values):
+        self.updated = timestamp
+        self.tiers[0].append(timestamp, values)
+        for level, (resolution, _) in enumerate(self.TIERS):
+            bucket = self.buckets[level]
+            bucket_start = timestamp - timestamp % resolution
+            if bucket[0] == bucket_start:
+                bucket[1] += 1
+                bucket[2] = [total + value for total, value in zip(bucket[2], values)]
+                return
+            # 进入新的时间桶：上一个桶取平均写入本级，并作为样本继续向上一级汇总
+            finished = bucket[0], bucket[1], bucket[2]
+            bucket[0], bucket[1], bucket[2] = bucket_start, 1, list(values)
+            if finished[0] is None:
+                return
+            timestamp, values = finished[0], [total / finished[1] for total in finished[2]]
+            self.tiers[level + 1].append(timestamp, values)
+
+    # 选择查询使用的级别：优先能覆盖起始时间的最细级别，step不小于更粗级别的分辨率时直接使用更粗的级别
+    def select_tier(self, start, step):
+        chosen = self.tiers[0]
+        for tier in self.tiers[1:]:
+            if not tier.count:
+                break
+            covered = chosen.count and chosen.oldest() <= start
+            if not covered or (step and step >= tier.resolution):
+                chosen = tier
+        return chosen
+
+# 性能历史存储：每个LUN一组固定大小的环形缓冲区，LUN数量也有上限，因此内存占用不随运行时间增长
+class PerformanceHistory:
+    def __init__(self, raw_resolution, raw_points, max_series, metrics=PERF_HISTORY_METRICS):
+        self.raw_resolution = raw_resolution
+        self.raw_points = raw_points
+        self.max_series = max_series
+        self.metrics = metrics
+        self._lock = threading.Lock()
+        self._series = collections.OrderedDict()
+
+    # 记录一次采集结果，samples为[(LUN标识, 指标值序列)]
+    def record(self, timestamp, samples):
+        with self._lock:
+            for key, values in samples:
+                series = self._series.get(key)
+                if series is None:
+                    series = self._series[key] = LunHistory(self.raw_resolution, self.raw_points, len(self.metrics))
+                    while len(self._series) > self.max_series:
+                        self._series.popitem(last=False)
+                else:
+                    self._series.move_to_end(key)
+                series.append(timestamp, values)
+
+    def keys(self):
+        with self._lock:
+            return list(self._series)
+
+    # 按时间范围查询，返回列式数据；step大于所选级别的分辨率时按step分桶取平均
+    def query(self, keys, start, end, step=None):
+        result = {}
+        with self._lock:
+            for key in keys:
+                series = self._series.get(key)
+                if series is None:
+                    continue
+                tier = series.select_tier(start, step)
+                indexes = tier.indexes(start, end)
+                timestamps = [tier.timestamps[i] for i in indexes]
+                columns = [[column[i] for i in indexes] for column in tier.columns]
+                resolution = tier.resolution
+                if step and step > resolution:
+                    timestamps, columns = self._downsample(timestamps, columns, step)
+                    resolution = step
+                data = {'resolution': resolution, 'timestamp': timestamps}
+                for name, column in zip(self.metrics, columns):
+                    # NaN表示该时刻没有数据（例如LUN无法对应到块设备时的延迟）
+                    data[name] = [None if value != value else round(value, 3) for value in column]
+                result[key] = data
+        return result
+
+    @staticmethod
+    def _downsample(timestamps, columns, step):
+        bucket_times = []
+        bucket_columns = [[] for _ in columns]
+        start = 0
+        while start < len(timestamps):
+            bucket = timestamps[start] - timestamps[start] % step
+            end = start
+            while end < len(timestamps) and timestamps[end] - timestamps[end] % step == bucket:
+                end += 1
+            bucket_times.append(bucket)
+            for target, column in zip(bucket_columns, columns):
+                target.append(sum(column[start:end]) / (end - start))
+            start = end
+        return bucket_times, bucket_columns
+
+performance_history = PerformanceHistory(PERF_SAMPLE_INTERVAL, PERF_HISTORY_RAW_POINTS, PERF_HISTORY_MAX_SERIES)
+
+# 进程内的LUN性能采集线程：每个周期读取一次tgtd的LUN统计和/proc/diskstats，在内存中计算增量并发布快照
+class PerformanceCollector:
+    TGTD_STATS_RETRY_INTERVAL = 300  # tgtd不支持LUN统计时重新探测的间隔（秒）
+    # 按LUN所在块设备给出的指标
+    DEVICE_METRICS = ('read_latency_ms', 'write_latency_ms', 'avg_queue_depth', 'util', 'in_flight',
+                      'latency_p50_ms', 'latency_p95_ms', 'latency_p99_ms')
+
+    def __init__(self, interval, history=None):
+        self.interval = interval
+        self.history = history
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._snapshot = None
+        self._topology = None   # 上一次建立映射时使用的拓扑快照
+        self._devices = {}      # backing store路径 -> 设备号，拓扑变化时才重新stat
+        self._luns = []         # [(Target, Lun, 设备号)]，设备号未知时为None
+        self._prev_stats = None
+        self._prev_lun_stats = {}
+        self._prev_time = None
+        self._latency_samples = {}  # 设备号 -> 最近各采样周期的平均I/O延迟，用于估算百分位
+        self._tgtd_stats_mode = None      # 'system'或'target'：tgtd支持的统计请求方式
+        self._tgtd_stats_retry_at = 0.0   # tgtd不支持统计时，到此时间后再重新探测
+
+    def is_running(self):
+        with self._lock:
+            return self._thread is not None and self._thread.is_alive()
+
+    # 启动采集线程，已在运行时返回False
+    def start(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return False
+            self._stop_event = threading.Event()
+            self._snapshot = None
+            self._prev_stats = None
+            self._prev_lun_stats = {}
+            self._latency_samples = {}
+            self._thread = threading.Thread(target=self._run, args=(self._stop_event,),
+                                            name='perf-collector', daemon=True)
+            self._thread.start()
+            return True
+
+    # 停止采集线程，未在运行时返回False
+    def stop(self):
+        with self._lock:
+            thread = self._thread
+            if thread is None or not thread.is_alive():
+                return False
+            self._stop_event.set()
+            self._thread = None
+            self._snapshot = None
+        thread.join(timeout=self.interval + 1)
+        return True
+
+    # 最近一次采集结果，未运行或尚未完成第一次采集时返回None
+    def snapshot(self):
+        with self._lock:
+            return self._snapshot
+
+    def _run(self, stop_event):
+        logger.info(f"性能采集线程已启动，采集间隔{self.interval}秒")
+        while not stop_event.is_set():
+            try:
+                snapshot = self.collect()
+                event_hub.publish('performance', snapshot)
+                if self.history is not None:
+                    self.history.record(time.time(), [
+                        (f"{lun['target_id']}_{lun['lun_id']}",
+                         [float('nan') if lun[name] is None else lun[name] for name in self.history.metrics])
+                        for lun in snapshot['lun_performance']
+                    ])
+                with self._lock:
+                    if not stop_event.is_set():
+                        self._snapshot = snapshot
+            except Exception as e:
+                logger.error(f"性能采集失败: {e}")
+            stop_event.wait(self.interval)
+        logger.info("性能采集线程已停止")
+
+    # 拓扑快照变化时重建LUN到设备的映射，已知路径的设备号直接复用
+    def _update_mapping(self, topology):
+        if topology is self._topology:
+            return
+        devices = {}
+        luns = []
+        for target in topology['targets']:
+            for lun in target.luns:
+                path = lun.backing_store
+                if not path or not path.startswith('/'):
+                    continue
+                if path not in devices:
+                    devices[path] = self._devices[path] if path in self._devices else get_backing_device(path)
+                luns.append((target, lun, devices[path]))
+        self._topology = topology
+        self._devices = devices
+        self._luns = luns
+
+    # 读取tgtd按Target/LUN统计的I/O计数；优先一次请求获取全部Target，不支持时逐个Target请求
+    # tgtd不支持统计时返回None，并在TGTD_STATS_RETRY_INTERVAL秒内不再尝试
+    def _read_tgtd_stats(self, targets):
+        now = time.monotonic()
+        if self._tgtd_stats_mode is None and now < self._tgtd_stats_retry_at:
+            return None
+        tgtd = get_tgtd_client()
+        if self._tgtd_stats_mode in (None, 'system'):
+            result = tgtd.system_stats()
+            stats = parse_tgtd_stats(result['output']) if result['success'] else {}
+            if stats or (result['success'] and self._tgtd_stats_mode == 'system'):
+                self._tgtd_stats_mode = 'system'
+                return stats
+        if targets and self._tgtd_stats_mode in (None, 'target'):
+            stats = {}
+            for target in targets:
+                result = tgtd.target_stats(target.tid)
+                if not result['success']:
+                    break
+                stats.update(parse_tgtd_stats(result['output']))
+            else:
+                if stats or self._tgtd_stats_mode == 'target':
+                    self._tgtd_stats_mode = 'target'
+                    return stats
+        logger.warning("tgtd未提供LUN统计，使用backing store所在设备的/proc/diskstats统计")
+        self._tgtd_stats_mode = None
+        self._tgtd_stats_retry_at = now + self.TGTD_STATS_RETRY_INTERVAL
+        return None
+
+    # 根据前后两次计数计算(读IOPS, 写IOPS, 读MB/s, 写MB/s)
+    @staticmethod
+    def _rates(current, previous, elapsed):
+        if previous is None or elapsed <= 0:
+            return (0, 0, 0.0, 0.0)
+        # tgtd按I_T nexus统计，Initiator断开或重连后LUN的合计值会变小；计数减少时视为重置，本周期按0计
+        delta = [now - before if now >= before else 0 for now, before in zip(current[:4], previous[:4])]
+        return (
+            int(delta[0] / elapsed),
+            int(delta[2] / elapsed),
+            round(delta[1] * 512 / elapsed / 1048576, 2),
+            round(delta[3] * 512 / elapsed / 1048576, 2)
+        )
+
+    # 根据前后两次diskstats计数计算设备的延迟、队列深度和利用率，并更新延迟百分位估算
+    # diskstats只提供累计耗时，百分位是基于最近PERF_LATENCY_WINDOW个采样周期的平均延迟估算的
+    def _device_metrics(self, device, current, previous, elapsed):
+        metrics = {
+            'read_latency_ms': None,
+            'write_latency_ms': None,
+            'avg_queue_depth': None,
+            'util': None,
+            'in_flight': current[6],
+            'latency_p50_ms': None,
+            'latency_p95_ms': None,
+            'latency_p99_ms': None
+        }
+        samples = self._latency_samples.setdefault(device, collections.deque(maxlen=PERF_LATENCY_WINDOW))
+        if previous is not None and elapsed > 0:
+            reads = current[0] - previous[0]
+            writes = current[2] - previous[2]
+            read_ms = current[4] - previous[4]
+            write_ms = current[5] - previous[5]
+            metrics['read_latency_ms'] = round(read_ms / reads, 2) if reads else 0.0
+            metrics['write_latency_ms'] = round(write_ms / writes, 2) if writes else 0.0
+            metrics['avg_queue_depth'] = round((current[8] - previous[8]) / (elapsed * 1000), 2)
+            metrics['util'] = round(min((current[7] - previous[7]) / (elapsed * 1000) * 100, 100.0), 1)
+            if reads + writes:
+                samples.append((read_ms + write_ms) / (reads + writes))
+        if samples:
+            ordered = sorted(samples)
+            for percentile in (50, 95, 99):
+                rank = max(int(math.ceil(percentile / 100 * len(ordered))) - 1, 0)
+                metrics[f'latency_p{percentile}_ms'] = round(ordered[rank], 2)
+        return metrics
+
+    # 执行一次采集：优先使用tgtd按LUN统计的计数，拿不到的LUN按所在设备的/proc/diskstats统计
+    # 延迟、队列深度和利用率只能从块设备获得，按LUN所在设备给出
+    def collect(self):
+        topology = get_topology_snapshot()
+        self._update_mapping(topology)
+
+        now = time.monotonic()
+        lun_stats = self._read_tgtd_stats(topology['targets']) if topology['success'] else None
+        stats = read_diskstats()
+        prev_stats = self._prev_stats
+        prev_lun_stats = self._prev_lun_stats
+        elapsed = now - self._prev_time if prev_stats is not None else 0
+        self._prev_stats = stats
+        self._prev_lun_stats = {}
+        self._prev_time = now
+
+        devices = {}
+        for _, _, device in self._luns:
+            if device is None or device in devices or device not in stats:
+                continue
+            name, current = stats[device]
+            previous = prev_stats[device][1] if prev_stats and device in prev_stats else None
+            read_iops, write_iops, read_throughput, write_throughput = self._rates(current, previous, elapsed)
+            devices[device] = {
+                'device': f"{device[0]}:{device[1]}",
+                'name': name,
+                'read_iops': read_iops,
+                'write_iops': write_iops,
+                'read_throughput': read_throughput,
+                'write_throughput': write_throughput,
+                'read_ios_total': current[0],
+                'write_ios_total': current[2],
+                'read_bytes_total': current[1] * 512,
+                'write_bytes_total': current[3] * 512,
+                'counters': current
+            }
+            devices[device].update(self._device_metrics(device, current, previous, elapsed))
+        for device in list(self._latency_samples):
+            if device not in devices:
+                del self._latency_samples[device]
+
+        lun_performance = []
+        for target, lun, device in self._luns:
+            device_metrics = devices.get(device)
+            current = lun_stats.get((target.tid, lun.lun_id)) if lun_stats is not None else None
+            if current is not None:
+                # LUN重新绑定到其他文件后计数不再可比，以backing store路径区分
+                key = (target.tid, lun.lun_id, lun.backing_store)
+                self._prev_lun_stats[key] = current
+                read_iops, write_iops, read_throughput, write_throughput = self._rates(current, prev_lun_stats.get(key), elapsed)
+                source = 'tgtd'
+            elif device_metrics is not None:
+                current = device_metrics['counters']
+                read_iops, write_iops = device_metrics['read_iops'], device_metrics['write_iops']
+                read_throughput, write_throughput = device_metrics['read_throughput'], device_metrics['write_throughput']
+                source = 'device'
+            else:
+                continue
+            entry = {
+                'target_id': int(target.tid),
+                'target_name': target.name,
+                'lun_id': int(lun.lun_id),
+                'backing_store': lun.backing_store,
+                'size': lun.size,
+                'device': device_metrics['device'] if device_metrics is not None else None,
+                'source': source,
+                'read_iops': read_iops,
+                'write_iops': write_iops,
+                'read_throughput': read_throughput,
+                'write_throughput': write_throughput,
+                'read_ios_total': current[0],
+                'write_ios_total': current[2],
+                'read_bytes_total': current[1] * 512,
+                'write_bytes_total': current[3] * 512
+            }
+            for name in self.DEVICE_METRICS:
+                entry[name] = device_metrics[name] if device_metrics is not None else None
+            lun_performance.append(entry)
+
+        targets = topology['targets']
+        return {
+            'timestamp': datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'tgt_status': 'running' if topology['success'] else 'stopped',
+            'connections': sum(nexus.connections for target in targets for nexus in target.nexus_information),
+            'sessions': sum(len(target.nexus_information) for target in targets),
+            'lun_performance': lun_performance,
+            'device_performance': [
+                {key: value for key, value in metrics.items() if key != 'counters'} for metrics in devices.values()
+            ]
+        }
+
+performance_collector = PerformanceCollector(PERF_SAMPLE_INTERVAL, performance_history)
 
 # 路由：获取LUN性能数据
 @app.route('/api/performance')
 def get_performance():
-    # 从性能监控文件读取数据
-    perf_file = '/tmp/iscsi_performance.json'
-    
-    if os.path.exists(perf_file):
-        try:
-            with open(perf_file, 'r') as f:
-                perf_data = json.load(f)
-                return jsonify(perf_data)
-        except (json.JSONDecodeError, IOError) as e:
-            return jsonify({
-                'error': f'读取性能数据失败: {str(e)}',
-                'timestamp': datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            })
+    snapshot = performance_collector.snapshot()
+    if snapshot is not None:
+        return jsonify(snapshot)
+    if performance_collector.is_running():
+        error = '性能监控正在进行第一次采集'
     else:
+        error = '性能监控未启动'
+    return jsonify({
+        'error': error,
+        'timestamp': datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    })
+
+# 路由：查询LUN性能历史
+# 参数：lun（逗号分隔的"TID_LUN"，省略时返回全部LUN）、from/to（Unix时间戳，默认最近1小时）、step（分桶秒数，可选）
+@app.route('/api/performance/history')
+def get_performance_history():
+    try:
+        end = float(request.args.get('to') or time.time())
+        start = float(request.args.get('from') or end - 3600)
+        step = float(request.args['step']) if request.args.get('step') else None
+    except ValueError:
+        return jsonify({
+            'success': False,
+            'message': 'from、to和step必须是数字',
+            'error_code': 'INVALID_PARAMS'
+        })
+    if start > end or (step is not None and step <= 0):
         return jsonify({
-            'error': '性能监控未启动',
-            'timestamp': datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            'success': False,
+            'message': 'from不能大于to，step必须大于0',
+            'error_code': 'INVALID_PARAMS'
         })
 
+    luns = request.args.get('lun')
+    keys = [key.strip() for key in luns.split(',') if key.strip()] if luns else performance_history.keys()
+    return jsonify({
+        'success': True,
+        'data': {
+            'from': start,
+            'to': end,
+            'step': step,
+            'metrics': list(performance_history.metrics),
+            'series': performance_history.query(keys, start, end, step)
+        }
+    })
+
 # 路由：启动性能监控
 @app.route('/api/performance/start', methods=['POST'])
 def start_performance_monitoring():
-    # 检查监控脚本是否存在
-    monitor_script = '/app/config/optimize/monitor_lun_performance.sh'
-    
-    logger.info(f"检查性能监控脚本路径: {monitor_script}")
-    if not os.path.exists(monitor_script):
-        logger.error(f"性能监控脚本不存在: {monitor_script}")
+    if not os.path.exists(DISKSTATS_FILE):
+        logger.error(f"无法读取磁盘统计: {DISKSTATS_FILE}不存在")
         return jsonify({
             'success': False,
-            'message': '性能监控脚本不存在，请先运行LUN优化脚本'
+            'message': f'启动性能监控失败: {DISKSTATS_FILE}不存在'
         })
-    
-    # 检查监控是否已经运行
-    if subprocess.run('pgrep -f monitor_lun_performance.sh', shell=True).returncode == 0:
+
+    if not performance_collector.start():
         return jsonify({
             'success': True,
             'message': '性能监控已经在运行'
         })
-    
-    # 启动监控脚本
-    try:
-        logger.info("正在启动性能监控脚本...")
-        process = subprocess.Popen(['bash', monitor_script], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        logger.info(f"性能监控脚本启动成功，进程ID: {process.pid}")
-        return jsonify({
-            'success': True,
-            'message': '性能监控已启动'
-        })
-    except Exception as e:
-        return jsonify({
-            'success': False,
-            'message': f'启动性能监控失败: {str(e)}'
-        })
+    event_hub.publish('monitor', {'running': True})
+    return jsonify({
+        'success': True,
+        'message': '性能监控已启动'
+    })
 
 # 路由：停止性能监控
 @app.route('/api/performance/stop', methods=['POST'])
 def stop_performance_monitoring():
-    # 停止监控脚本
-    result = subprocess.run('pkill -f monitor_lun_performance.sh', shell=True)
-    
-    if result.returncode == 0:
+    if performance_collector.stop():
+        event_hub.publish('monitor', {'running': False})
         return jsonify({
             'success': True,
             'message': '性能监控已停止'
@@ -1274,5 +5063,94 @@ def stop_performance_monitoring():
             'message': '没有运行中的性能监控进程'
         })
 
+# 路由：最近的慢请求及其耗时分解（包括带_profile=1参数的请求的采样结果）
+@app.route('/api/debug/slow')
+def get_slow_requests():
+    return jsonify({
+        'success': True,
+        'data': {
+            'threshold_ms': SLOW_REQUEST_THRESHOLD * 1000,
+            'requests': list(reversed(slow_requests))
+        }
+    })
+
+# Prometheus文本格式的一组同名指标
+def prometheus_metric(name, metric_type, help_text, samples):
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {metric_type}"]
+    for labels, value in samples:
+        if value is None:
+            continue
+        if labels:
+            label_text = ','.join(f'{key}="{prometheus_escape(val)}"' for key, val in labels.items())
+            lines.append(f"{name}{{{label_text}}} {value}")
+        else:
+            lines.append(f"{name} {value}")
+    return lines
+
+# 路由：Prometheus指标
+# 只读取进程内已缓存的状态（拓扑快照、性能采集结果、磁盘索引），抓取时不会调用tgtadm或扫描磁盘目录
+@app.route('/metrics')
+def metrics():
+    lines = []
+    snapshot = _topology_snapshot
+    if snapshot is not None:
+        targets = snapshot['targets']
+        lines += prometheus_metric('iscsi_tgtd_up', 'gauge', '最近一次获取Target信息是否成功',
+                                   [({}, int(snapshot['success']))])
+        lines += prometheus_metric('iscsi_topology_age_seconds', 'gauge', '拓扑快照距今的时间',
+                                   [({}, round(time.monotonic() - snapshot['fetched_at'], 3))])
+        lines += prometheus_metric('iscsi_targets', 'gauge', 'Target数量', [({}, len(targets))])
+        lines += prometheus_metric('iscsi_luns', 'gauge', 'LUN数量',
+                                   [({'target': target.name}, len(target.luns)) for target in targets])
+        lines += prometheus_metric('iscsi_sessions', 'gauge', 'I_T nexus（会话）数量',
+                                   [({'target': target.name}, len(target.nexus_information)) for target in targets])
+        lines += prometheus_metric('iscsi_connections', 'gauge', '连接数量',
+                                   [({'target': target.name}, sum(nexus.connections for nexus in target.nexus_information))
+                                    for target in targets])
+
+    lines += prometheus_metric('iscsi_performance_collector_running', 'gauge', '性能采集线程是否在运行',
+                               [({}, int(performance_collector.is_running()))])
+    performance = performance_collector.snapshot()
+    if performance is not None:
+        luns = performance['lun_performance']
+        devices = performance['device_performance']
+        def lun_labels(lun):
+            return {'target': lun['target_name'], 'lun': lun['lun_id'], 'backing_store': lun['backing_store']}
+        # 统计来源不放在计数器的标签中（来源变化时序列不变），单独作为info指标给出
+        lines += prometheus_metric('iscsi_lun_stats_info', 'gauge',
+                                   'LUN统计的来源：tgtd为LUN自身的计数，device为只有所在块设备的计数',
+                                   [(dict(lun_labels(lun), source=lun['source'], device=lun['device'] or ''), 1)
+                                    for lun in luns])
+        # tgtd提供的计数按LUN给出；块设备的计数按设备只给出一次，避免多个LUN共用设备时重复计数
+        for suffix, field, help_text in (
+                ('read_ios_total', 'read_ios_total', '已完成的读I/O数'),
+                ('write_ios_total', 'write_ios_total', '已完成的写I/O数'),
+                ('read_bytes_total', 'read_bytes_total', '已读取的字节数'),
+                ('write_bytes_total', 'write_bytes_total', '已写入的字节数')):
+            lines += prometheus_metric(f'iscsi_lun_{suffix}', 'counter', f"{help_text}（tgtd按LUN统计）",
+                                       [(lun_labels(lun), lun[field]) for lun in luns if lun['source'] == 'tgtd'])
+            lines += prometheus_metric(f'iscsi_device_{suffix}', 'counter', f"{help_text}（LUN所在块设备的整体计数）",
+                                       [({'device': device['device'], 'name': device['name']}, device[field])
+                                        for device in devices])
+        for name, field, scale, help_text in (
+                ('iscsi_lun_read_latency_seconds', 'read_latency_ms', 0.001, '最近采样周期的平均读延迟'),
+                ('iscsi_lun_write_latency_seconds', 'write_latency_ms', 0.001, '最近采样周期的平均写延迟'),
+                ('iscsi_lun_queue_depth', 'avg_queue_depth', 1, '最近采样周期的平均队列深度'),
+                ('iscsi_lun_utilization_ratio', 'util', 0.01, '最近采样周期的设备利用率')):
+            lines += prometheus_metric(name, 'gauge', f"{help_text}（按LUN所在块设备）",
+                                       [(lun_labels(lun), None if lun[field] is None else round(lun[field] * scale, 6))
+                                        for lun in luns])
+
+    images = disk_inventory.entries(refresh=False)
+    lines += prometheus_metric('iscsi_disk_images', 'gauge', '磁盘镜像文件数量', [({}, len(images))])
+    lines += prometheus_metric('iscsi_disk_image_apparent_bytes', 'gauge', '磁盘镜像的文件大小',
+                               [({'path': entry['path']}, entry['size']) for entry in images])
+    lines += prometheus_metric('iscsi_disk_image_allocated_bytes', 'gauge', '磁盘镜像实际占用的空间',
+                               [({'path': entry['path']}, entry['allocated']) for entry in images])
+
+    lines += command_duration.render()
+    lines += http_request_duration.render()
+    return Response('\n'.join(lines) + '\n', content_type='text/plain; version=0.0.4; charset=utf-8')
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
@@ -210,6 +210,45 @@ function clearAcl(tid) {
     });
 }
 
+/**
+ * 从CSV/JSON文件批量导入ACL，文件中出现的Target的访问控制列表被替换为文件中的规则
+ * @param {HTMLInputElement} input - 文件选择框
+ */
+async function importAcl(input) {
+    const file = input.files[0];
+    input.value = '';
+    if (!file) return;
+    
+    const formData = new FormData();
+    formData.append('file', file);
+    try {
+        // 先预览差异，确认后再执行
+        const preview = await fetch('/api/acl?dry_run=1', { method: 'POST', body: formData }).then(response => response.json());
+        if (!preview.success) {
+            alert('导入ACL失败: ' + (preview.message || '未知错误'));
+            return;
+        }
+        if (!confirm(preview.message + '，确定要导入吗？')) {
+            return;
+        }
+        
+        appendLog(`正在导入ACL: ${file.name}`);
+        const data = await fetch('/api/acl', { method: 'POST', body: formData }).then(response => response.json());
+        if (data.success) {
+            appendLog(data.message, 'success');
+            location.reload();
+        } else {
+            (data.data ? data.data.results : []).filter(result => result.error).forEach(result => {
+                appendLog(`Target ${result.tid} ${result.error.initiator}: ${result.error.error}`, 'danger');
+            });
+            alert('导入ACL失败: ' + (data.message || '未知错误'));
+        }
+    } catch (error) {
+        console.error('Error:', error);
+        alert('操作失败：' + error.message);
+    }
+}
+
 // 页面加载完成后初始化
 document.addEventListener('DOMContentLoaded', function() {
     console.log('DOM加载完成，初始化访问控制模块...');
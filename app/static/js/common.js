@@ -122,6 +122,88 @@ function submitDelete(url, confirmMsg) {
     });
 }
 
+/**
+ * 更新服务状态指示器、Target/LUN/磁盘计数和磁盘空间
+ * @param {Object} data - /api/status或topology事件中的状态数据
+ */
+function updateStatusIndicators(data) {
+    const tgtStatus = document.getElementById('tgt-status');
+    const tgtStatusText = document.getElementById('tgt-status-text');
+    
+    if (tgtStatus && tgtStatusText) {
+        if (data.tgt_running) {
+            tgtStatus.className = 'status-indicator status-active';
+            tgtStatusText.textContent = 'iSCSI服务运行中';
+        } else {
+            tgtStatus.className = 'status-indicator status-inactive';
+            tgtStatusText.textContent = 'iSCSI服务未运行';
+        }
+    }
+    
+    const targetCount = document.getElementById('target-count');
+    const lunCount = document.getElementById('lun-count');
+    const diskCount = document.getElementById('disk-count');
+    
+    if (targetCount) targetCount.textContent = data.target_count;
+    if (lunCount) lunCount.textContent = data.lun_count;
+    if (diskCount) diskCount.textContent = data.disk_count;
+    
+    // 磁盘空间（只有/api/status包含）
+    const capacity = data.capacity;
+    const capacityUsage = document.getElementById('capacity-usage');
+    const capacityOvercommit = document.getElementById('capacity-overcommit');
+    if (capacity && capacityUsage) {
+        capacityUsage.textContent = `${formatBytes(capacity.allocated_bytes)} / ${formatBytes(capacity.apparent_bytes)}`;
+        capacityUsage.title = `可用空间: ${formatBytes(capacity.free_bytes)} / ${formatBytes(capacity.total_bytes)}`;
+    }
+    if (capacity && capacityOvercommit) {
+        const ratio = capacity.overcommit_ratio;
+        capacityOvercommit.textContent = ratio !== null ? `${(ratio * 100).toFixed(0)}%` : '-';
+        if (capacity.shortfall_bytes > 0) {
+            capacityOvercommit.className = 'badge bg-danger';
+            capacityOvercommit.title = `稀疏磁盘全部写满时空间不足 ${formatBytes(capacity.shortfall_bytes)}`;
+        } else {
+            capacityOvercommit.className = ratio > 1 ? 'badge bg-warning' : 'badge bg-success';
+            capacityOvercommit.title = `可用空间: ${formatBytes(capacity.free_bytes)}`;
+        }
+    }
+}
+
+/**
+ * 把字节数格式化为带单位的字符串（1024进制）
+ * @param {number} bytes - 字节数
+ */
+function formatBytes(bytes) {
+    const units = ['B', 'KB', 'MB', 'GB', 'TB'];
+    let value = bytes;
+    let index = 0;
+    while (value >= 1024 && index < units.length - 1) {
+        value /= 1024;
+        index++;
+    }
+    return `${value.toFixed(index ? 1 : 0)} ${units[index]}`;
+}
+
+/**
+ * 订阅服务端拓扑变化事件，代替定时请求/api/status和/refresh_targets
+ */
+function subscribeTopologyEvents() {
+    if (!window.EventSource) return;
+    
+    let generation = null;
+    const source = new EventSource('/api/stream?events=topology');
+    source.addEventListener('topology', function(event) {
+        const data = JSON.parse(event.data);
+        updateStatusIndicators(data.status);
+        
+        // 连接后的第一条事件是当前状态，之后的事件表示配置已在其他地方被修改
+        if (generation !== null) {
+            appendLog('Target配置已变化，点击刷新按钮查看最新列表', 'warning');
+        }
+        generation = data.generation;
+    });
+}
+
 /**
  * 页面加载完成后初始化通用功能
  */
@@ -163,28 +245,7 @@ document.addEventListener('DOMContentLoaded', function() {
     fetch('/api/status')
         .then(response => response.json())
         .then(data => {
-            // 更新状态指示器
-            const tgtStatus = document.getElementById('tgt-status');
-            const tgtStatusText = document.getElementById('tgt-status-text');
-            
-            if (tgtStatus && tgtStatusText) {
-                if (data.tgt_running) {
-                    tgtStatus.className = 'status-indicator status-active';
-                    tgtStatusText.textContent = 'iSCSI服务运行中';
-                } else {
-                    tgtStatus.className = 'status-indicator status-inactive';
-                    tgtStatusText.textContent = 'iSCSI服务未运行';
-                }
-            }
-            
-            // 更新计数
-            const targetCount = document.getElementById('target-count');
-            const lunCount = document.getElementById('lun-count');
-            const diskCount = document.getElementById('disk-count');
-            
-            if (targetCount) targetCount.textContent = data.target_count;
-            if (lunCount) lunCount.textContent = data.lun_count;
-            if (diskCount) diskCount.textContent = data.disk_count;
+            updateStatusIndicators(data);
             
             // 更新扫描目录信息
             //const diskDirs = document.getElementById('disk-dirs');
@@ -236,4 +297,9 @@ document.addEventListener('DOMContentLoaded', function() {
             }
         })
         .catch(error => console.error('获取状态失败:', error));
+    
+    // 订阅拓扑变化
+    if (document.getElementById('target-count')) {
+        subscribeTopologyEvents();
+    }
 });
\ No newline at end of file
@@ -40,7 +40,10 @@ function createDisk(event) {
         modal.hide();
         
         // 显示结果消息
-        if (data.success) {
+        if (data.success && data.data && data.data.job_id) {
+            // 预分配和填零在后台执行，显示进度直到任务结束
+            watchJob(data.data.job_id, data.message);
+        } else if (data.success) {
             showAlert('success', data.message);
             // 刷新页面以显示新创建的磁盘
             setTimeout(() => {
@@ -60,6 +63,159 @@ function createDisk(event) {
     });
 }
 
+// 克隆虚拟磁盘：支持reflink的文件系统上立即完成，否则在后台按数据区段复制
+function cloneDisk(sourceName) {
+    const diskName = prompt(`克隆 ${sourceName}，请输入新磁盘名称:`, sourceName.replace(/\.img$/i, '') + '-clone');
+    if (!diskName) return;
+    const bandwidth = prompt('复制限速（MB/s），留空表示不限速:', '');
+    if (bandwidth === null) return;
+
+    fetch('/disk/clone', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/x-www-form-urlencoded',
+        },
+        body: new URLSearchParams({
+            'source': sourceName,
+            'disk_name': diskName,
+            'bandwidth_mb': bandwidth.trim()
+        })
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (data.success) {
+            watchJob(data.data.job_id, data.message);
+        } else {
+            showAlert('danger', `克隆失败: ${data.message}`);
+        }
+    })
+    .catch(error => {
+        showAlert('danger', `请求错误: ${error}`);
+    });
+}
+
+// 设置镜像的页缓存策略：warm预热、pin常驻（定期补齐）、nocache不缓存、none恢复默认
+function setCachePolicy(name, current) {
+    const policy = prompt(`设置 ${name} 的缓存策略:\nwarm - 启动后预热到页缓存\npin - 预热并定期补齐被挤出的部分\nnocache - 定期丢弃缓存，避免挤掉其他镜像\nnone - 默认`, current);
+    if (policy === null) return;
+    const body = { path: name, policy: policy.trim() };
+    if (body.policy === 'warm' || body.policy === 'pin') {
+        const rate = prompt('预热限速（MB/s），留空使用默认值:', '');
+        if (rate === null) return;
+        body.rate_mb = rate.trim();
+        body.regions = confirm('是否只预热上次记录的热点区段？\n（确定：只预热热点区段，取消：预热整个镜像）') ? 'hot' : 'all';
+    }
+
+    fetch('/api/cache/policy', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify(body)
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (data.success) {
+            showAlert('success', data.message);
+            setTimeout(() => {
+                window.location.reload();
+            }, 1500);
+        } else {
+            showAlert('danger', `设置缓存策略失败: ${data.message}`);
+        }
+    })
+    .catch(error => {
+        showAlert('danger', `请求错误: ${error}`);
+    });
+}
+
+// 扫描全部镜像中的全零和重复块，可选对未使用的镜像打洞释放全零区域
+function scanDisks() {
+    const punch = confirm('扫描全部镜像中的全零和重复块。\n\n是否同时对未被在线LUN使用的镜像打洞，释放全零区域占用的空间？\n（确定：扫描并打洞，取消：只扫描）');
+
+    fetch('/api/scan', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({ punch: punch })
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (data.success) {
+            watchJob(data.data.job_id, data.message);
+        } else {
+            showAlert('danger', `扫描失败: ${data.message}`);
+        }
+    })
+    .catch(error => {
+        showAlert('danger', `请求错误: ${error}`);
+    });
+}
+
+// 轮询后台任务进度，在页面顶部显示进度条和取消按钮
+function watchJob(jobId, title) {
+    const container = document.querySelector('.container');
+    const panel = document.createElement('div');
+    panel.className = 'alert alert-info';
+    panel.setAttribute('role', 'status');
+    panel.innerHTML = `
+        <div class="d-flex justify-content-between align-items-center mb-2">
+            <span>${title}</span>
+            <button type="button" class="btn btn-sm btn-outline-danger">取消</button>
+        </div>
+        <div class="progress mb-1"><div class="progress-bar progress-bar-striped progress-bar-animated" style="width: 0%"></div></div>
+        <small class="job-detail">等待执行...</small>
+    `;
+    container.insertBefore(panel, container.firstChild);
+
+    const bar = panel.querySelector('.progress-bar');
+    const detail = panel.querySelector('.job-detail');
+    const cancelBtn = panel.querySelector('button');
+    cancelBtn.addEventListener('click', () => {
+        cancelBtn.disabled = true;
+        fetch(`/api/jobs/${jobId}/cancel`, { method: 'POST' });
+    });
+
+    const poll = () => {
+        fetch(`/api/jobs/${jobId}`)
+            .then(response => response.json())
+            .then(data => {
+                if (!data.success) {
+                    panel.remove();
+                    showAlert('danger', data.message);
+                    return;
+                }
+                const job = data.data;
+                const percent = job.percent || 0;
+                bar.style.width = `${percent}%`;
+                bar.textContent = `${percent}%`;
+                if (job.status === 'running') {
+                    const eta = job.eta_seconds !== null ? `，剩余约${Math.ceil(job.eta_seconds)}秒` : '';
+                    detail.textContent = `${formatBytes(job.done_bytes)} / ${formatBytes(job.total_bytes)}，${formatBytes(job.rate_bytes)}/s${eta}`;
+                }
+                if (job.status === 'queued' || job.status === 'running') {
+                    setTimeout(poll, 1000);
+                    return;
+                }
+                panel.remove();
+                if (job.status === 'succeeded') {
+                    const rate = job.result && job.result.throughput_bytes ? `，${formatBytes(job.result.throughput_bytes)}/s` : '';
+                    showAlert('success', `${job.description} 完成，耗时${job.elapsed_seconds}秒${rate}`);
+                    setTimeout(() => {
+                        window.location.reload();
+                    }, 1500);
+                } else if (job.status === 'cancelled') {
+                    showAlert('warning', `${job.description} 已取消`);
+                } else {
+                    showAlert('danger', `${job.description} 失败: ${job.error}`);
+                }
+            })
+            .catch(() => setTimeout(poll, 3000));
+    };
+    poll();
+}
+
 // 显示提示消息
 function showAlert(type, message) {
     const alertContainer = document.createElement('div');
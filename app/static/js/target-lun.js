@@ -401,4 +401,28 @@ function updateLunId() {
         console.error('Error:', error);
         alert('操作失败，请检查网络连接');
     });
-}
\ No newline at end of file
+}
+/**
+ * 运行LUN优化（后台任务），完成后刷新页面显示优化前后的测试结果
+ */
+function runOptimization() {
+    if (!confirm('确定要执行LUN优化吗？将在临时镜像上测试候选参数（约1分钟），然后为每个LUN应用测得的最佳参数。')) {
+        return;
+    }
+    
+    fetch('/optimize', {
+        method: 'POST'
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (data.success) {
+            watchJob(data.data.job_id, 'LUN优化');
+        } else {
+            alert(data.message || 'LUN优化失败');
+        }
+    })
+    .catch(error => {
+        console.error('Error:', error);
+        alert('操作失败，请检查网络连接');
+    });
+}
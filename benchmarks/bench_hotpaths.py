@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# 热点路径基准测试：用合成的大规模拓扑测量tgtadm输出解析、磁盘索引和主页渲染的耗时与峰值内存
+#
+# 用法：
+#   python3 benchmarks/bench_hotpaths.py --scale medium --output result.json
+#   python3 benchmarks/bench_hotpaths.py --targets 2000 --luns 8 --output new.json --compare old.json
+#
+# 结果以JSON格式写出，--compare会与之前的结果逐项比较，超过--threshold的变慢视为回归并以非0退出
+
+import argparse
+import datetime
+import gc
+import json
+import logging
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 预设规模：(Target数, 每个Target的LUN数, 每个Target的ACL数, 每个Target的I_T nexus数, 磁盘文件数)
+SCALES = {
+    'small': (10, 4, 2, 1, 100),
+    'medium': (500, 8, 8, 2, 2000),
+    'large': (5000, 16, 16, 4, 20000),
+    'max': (65535, 255, 4, 1, 50000),
+}
+
+# 生成与tgtadm --lld iscsi --mode target --op show格式一致的合成输出
+def generate_tgtadm_output(targets, luns, acls, nexuses, image_paths):
+    lines = []
+    image_count = len(image_paths)
+    for tid in range(1, targets + 1):
+        lines.append(f"Target {tid}: iqn.2025-05.com.bench:target{tid}")
+        lines.append("    System information:")
+        lines.append("        Driver: iscsi")
+        lines.append("        State: ready")
+        lines.append("    I_T nexus information:")
+        for nexus in range(1, nexuses + 1):
+            lines.append(f"        I_T nexus: {nexus}")
+            lines.append(f"            Initiator: iqn.1994-05.com.redhat:client{tid}-{nexus} alias: client{nexus}")
+            lines.append("            Connection: 0")
+            lines.append(f"                IP Address: 10.{tid // 256 % 256}.{tid % 256}.{nexus}")
+        lines.append("    LUN information:")
+        for lun in range(0, luns + 1):
+            lines.append(f"        LUN: {lun}")
+            if lun == 0:
+                lines.append("            Type: controller")
+                lines.append(f"            SCSI ID: IET     {tid:04x}0000")
+                lines.append(f"            SCSI SN: beaf{tid}0")
+                lines.append("            Size: 0 MB, Block size: 1")
+                backing_store, bstype = 'None', 'null'
+            else:
+                lines.append("            Type: disk")
+                lines.append(f"            SCSI ID: IET     {tid:04x}{lun:04x}")
+                lines.append(f"            SCSI SN: beaf{tid}{lun}")
+                lines.append(f"            Size: {10737 * lun} MB, Block size: 512")
+                index = (tid * luns + lun) % image_count if image_count else 0
+                backing_store = image_paths[index] if image_count else f'/app/iscsi/t{tid}-l{lun}.img'
+                bstype = 'rdwr'
+            lines.append("            Online: Yes")
+            lines.append("            Removable media: No")
+            lines.append("            Prevent removal: No")
+            lines.append("            Readonly: No")
+            lines.append("            SWP: No")
+            lines.append("            Thin-provisioning: No")
+            lines.append(f"            Backing store type: {bstype}")
+            lines.append(f"            Backing store path: {backing_store}")
+            lines.append("            Backing store flags: ")
+        lines.append("    Account information:")
+        lines.append("    ACL information:")
+        for acl in range(acls):
+            lines.append(f"        192.168.{acl // 256 % 256}.{acl % 256}")
+    return '\n'.join(lines) + '\n'
+
+# 生成合成的磁盘镜像目录树（稀疏文件，不占用实际空间）
+def generate_image_tree(root, files, fanout=8, depth=3):
+    paths = []
+    suffixes = ('.img', '.raw', '.qcow2', '.vmdk', '.iso')
+    for index in range(files):
+        parts = []
+        value = index
+        for _ in range(depth - 1):
+            parts.append(f'dir{value % fanout}')
+            value //= fanout
+        directory = os.path.join(root, *parts)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'disk{index}{suffixes[index % len(suffixes)]}')
+        with open(path, 'wb') as f:
+            f.truncate((index % 64 + 1) * 1024 * 1024 * 1024)
+        paths.append(path)
+    return paths
+
+# 运行一个基准：返回最小值、中位数和峰值内存
+def run_benchmark(name, func, repeat, params, setup=None):
+    timings = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        gc.collect()
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+
+    if setup:
+        setup()
+    gc.collect()
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    result = {
+        'name': name,
+        'params': params,
+        'repeat': repeat,
+        'min_s': min(timings),
+        'median_s': statistics.median(timings),
+        'peak_kib': round(peak / 1024, 1)
+    }
+    print(f"{name:<28} min {result['min_s'] * 1000:10.2f} ms  median {result['median_s'] * 1000:10.2f} ms  "
+          f"peak {result['peak_kib']:12.1f} KiB")
+    return result
+
+def load_app(workdir):
+    # app.py默认把日志写到/app/config/app.log，基准测试改为临时目录并关闭INFO日志
+    os.environ['APP_LOG_FILE'] = os.path.join(workdir, 'app.log')
+    sys.path.insert(0, REPO_DIR)
+    import app as app_module
+    logging.getLogger().setLevel(logging.WARNING)
+    app_module.app.template_folder = os.path.join(REPO_DIR, 'app', 'templates')
+    app_module.app.static_folder = os.path.join(REPO_DIR, 'app', 'static')
+    return app_module
+
+# 把合成拓扑装入app的拓扑快照，之后的请求不会调用tgtadm
+def install_snapshot(app_module, output, targets):
+    with app_module._topology_cond:
+        app_module._topology_snapshot = {
+            'output': output,
+            'targets': targets,
+            'success': True,
+            'error': None,
+            'fetched_at': time.monotonic(),
+            'generation': app_module._topology_generation
+        }
+    app_module.TOPOLOGY_CACHE_TTL = float('inf')
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR, check=True,
+                              stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, encoding='utf-8').stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+# 与之前的结果比较，返回回归项列表
+def compare_results(current, previous_path, threshold, min_delta):
+    with open(previous_path, 'r') as f:
+        previous = {r['name']: r for r in json.load(f)['results']}
+    regressions = []
+    print(f"\n与 {previous_path} 比较（按最小耗时）:")
+    for result in current:
+        old = previous.get(result['name'])
+        if not old or old['params'] != result['params']:
+            print(f"{result['name']:<28} 无可比较的结果")
+            continue
+        ratio = result['min_s'] / old['min_s'] if old['min_s'] else float('inf')
+        flag = ''
+        if ratio > 1 + threshold and result['min_s'] - old['min_s'] > min_delta:
+            flag = '  <-- 回归'
+            regressions.append(result['name'])
+        print(f"{result['name']:<28} {old['min_s'] * 1000:10.2f} ms -> {result['min_s'] * 1000:10.2f} ms  x{ratio:.2f}{flag}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='tgtadm解析、磁盘索引和页面渲染热点路径的基准测试')
+    parser.add_argument('--scale', choices=sorted(SCALES), default='small', help='预设规模')
+    parser.add_argument('--targets', type=int, help='Target数量（1-65535）')
+    parser.add_argument('--luns', type=int, help='每个Target的LUN数量（1-255）')
+    parser.add_argument('--acls', type=int, help='每个Target的ACL数量')
+    parser.add_argument('--nexuses', type=int, help='每个Target的I_T nexus数量')
+    parser.add_argument('--files', type=int, help='合成磁盘文件数量')
+    parser.add_argument('--repeat', type=int, default=5, help='每项重复次数')
+    parser.add_argument('--skip-render', action='store_true', help='跳过主页渲染')
+    parser.add_argument('--output', help='结果JSON文件')
+    parser.add_argument('--compare', help='用于比较的历史结果JSON文件')
+    parser.add_argument('--threshold', type=float, default=0.2, help='判定为回归的变慢比例，默认0.2')
+    parser.add_argument('--min-delta-ms', type=float, default=1.0, help='变慢的绝对值低于此值时忽略（过滤计时噪声），默认1ms')
+    args = parser.parse_args()
+
+    targets, luns, acls, nexuses, files = SCALES[args.scale]
+    targets = args.targets or targets
+    luns = args.luns or luns
+    acls = args.acls if args.acls is not None else acls
+    nexuses = args.nexuses if args.nexuses is not None else nexuses
+    files = args.files if args.files is not None else files
+
+    workdir = tempfile.mkdtemp(prefix='bench_hotpaths_')
+    try:
+        app_module = load_app(workdir)
+        if not 1 <= targets <= app_module.MAX_TARGET_ID:
+            parser.error(f'--targets必须在1到{app_module.MAX_TARGET_ID}之间')
+        if not 1 <= luns <= app_module.MAX_LUN_ID:
+            parser.error(f'--luns必须在1到{app_module.MAX_LUN_ID}之间')
+
+        params = {'targets': targets, 'luns': luns, 'acls': acls, 'nexuses': nexuses, 'files': files}
+        print(f"生成合成数据: {params}")
+        image_root = os.path.join(workdir, 'iscsi')
+        image_paths = generate_image_tree(image_root, files)
+        output = generate_tgtadm_output(targets, luns, acls, nexuses, image_paths)
+        print(f"tgtadm输出: {len(output) / 1024 / 1024:.1f} MiB, {output.count(chr(10))}行\n")
+
+        results = []
+        parsed = app_module.parse_tgtadm_show(output)
+        results.append(run_benchmark('parse_tgtadm_show', lambda: app_module.parse_tgtadm_show(output), args.repeat, params))
+        results.append(run_benchmark('targets_to_dict', lambda: [t.to_dict() for t in parsed], args.repeat, params))
+
+        inventory = {}
+
+        def new_inventory():
+            inventory['value'] = app_module.DiskInventory(image_root)
+        results.append(run_benchmark('inventory_cold_scan', lambda: inventory['value'].entries(), args.repeat, params,
+                                     setup=new_inventory))
+        results.append(run_benchmark('inventory_warm', lambda: inventory['value'].entries(), args.repeat, params))
+
+        install_snapshot(app_module, output, parsed)
+        app_module.disk_inventory = inventory['value']
+        results.append(run_benchmark('get_disk_files', app_module.get_disk_files, args.repeat, params))
+
+        if not args.skip_render:
+            # 不让请求启动页缓存线程，否则它的首轮驻留统计会与计时重叠
+            app_module._cache_manager_started = True
+            client = app_module.app.test_client()
+
+            def render_index():
+                response = client.get('/')
+                assert response.status_code == 200, response.status_code
+            results.append(run_benchmark('render_index', render_index, args.repeat, params))
+            results.append(run_benchmark('api_status', lambda: client.get('/api/status'), args.repeat, params))
+
+        report = {
+            'meta': {
+                'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+                'git_revision': git_revision(),
+                'python': platform.python_version(),
+                'platform': platform.platform()
+            },
+            'results': results
+        }
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(report, f, indent=2, ensure_ascii=False)
+            print(f"\n结果已写入 {args.output}")
+
+        if args.compare and compare_results(results, args.compare, args.threshold, args.min_delta_ms / 1000):
+            sys.exit(1)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
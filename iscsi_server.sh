@@ -23,6 +23,10 @@ DEFAULT_DIRS=("/app/iscsi")
 # 递归扫描深度（默认为4级）
 SCAN_DEPTH=${SCAN_DEPTH:-4}
 
+# 自动扫描添加LUN时使用的后端类型（rdwr/aio/sg）和打开标志（direct/sync，多个用冒号分隔），留空使用tgtd默认值
+LUN_BSTYPE=${LUN_BSTYPE:-}
+LUN_BSOFLAGS=${LUN_BSOFLAGS:-}
+
 # =====================================================
 # 函数定义
 # =====================================================
@@ -98,7 +102,10 @@ add_disk_to_lun() {
   local disk_type=$(get_disk_type "$disk_name")
   
   # 添加为LUN
-  tgtadm --lld iscsi --mode logicalunit --op new --tid 1 --lun $lun_num -b "$disk"
+  local backend_args=()
+  [ -n "$LUN_BSTYPE" ] && backend_args+=(--bstype "$LUN_BSTYPE")
+  [ -n "$LUN_BSOFLAGS" ] && backend_args+=(--bsoflags "$LUN_BSOFLAGS")
+  tgtadm --lld iscsi --mode logicalunit --op new --tid 1 --lun $lun_num -b "$disk" "${backend_args[@]}"
   
   if [ $? -eq 0 ]; then
     echo "[SUCCESS] 已添加LUN$lun_num: $disk ($size_gb GB, $disk_type)"
@@ -282,30 +289,6 @@ setup_iscsi_target() {
   fi
 }
 
-# 应用LUN优化
-apply_lun_optimization() {
-  if [ -f "/optimize_lun.sh" ]; then
-    echo "[INFO] 正在应用LUN优化..."
-    
-    # 确保优化配置目录存在
-    mkdir -p "/app/config/optimize"
-    chmod 755 "/app/config/optimize"
-    
-    # 确保Web界面目录存在
-    mkdir -p "/app/templates"
-    chmod 755 "/app/templates"
-    
-    # 执行优化脚本
-    if bash /optimize_lun.sh; then
-      echo "[SUCCESS] LUN优化完成"
-    else
-      echo "[WARNING] LUN优化过程中出现一些警告，但服务仍可继续运行"
-    fi
-  else
-    echo "[WARNING] 未找到LUN优化脚本，跳过优化步骤"
-  fi
-}
-
 # 启动Web管理界面
 start_web_interface() {
   # 检查应用文件是否已存在，不存在则复制到正确位置
@@ -313,6 +296,11 @@ start_web_interface() {
     echo "[INFO] 复制app.py到/app/目录"
     cp -r /app.py /app/
   fi
+
+  if [ ! -f "/app/scan_worker.py" ] && [ -f "/scan_worker.py" ]; then
+    echo "[INFO] 复制scan_worker.py到/app/目录"
+    cp /scan_worker.py /app/
+  fi
   
   if [ ! -d "/app/templates" ] && [ -d "/templates" ]; then
     echo "[INFO] 复制templates目录到/app/目录"
@@ -367,6 +355,18 @@ http {
             proxy_set_header X-Forwarded-For \$proxy_add_x_forwarded_for;
         }
         
+        location /api/stream {
+            proxy_pass http://127.0.0.1:5000;
+            proxy_set_header Host \$host;
+            proxy_set_header X-Real-IP \$remote_addr;
+            proxy_set_header X-Forwarded-For \$proxy_add_x_forwarded_for;
+            proxy_http_version 1.1;
+            proxy_set_header Connection "";
+            proxy_buffering off;
+            proxy_cache off;
+            proxy_read_timeout 1h;
+        }
+        
         location /app/static {
             alias /app/static;
             expires 30d;
@@ -386,7 +386,9 @@ EOF
   
   # 启动Web管理界面
   echo "[INFO] 正在启动Web管理界面..."
-  cd /app && gunicorn -b 127.0.0.1:5000 app:app --daemon
+  # 单进程多线程：进程内的拓扑快照缓存在所有请求线程间共享
+  # 每个SSE事件流连接占用一个线程，线程数需要覆盖同时打开的页面数
+  cd /app && gunicorn -b 127.0.0.1:5000 --workers 1 --threads 32 app:app --daemon
   
   # 启动Nginx
   echo "[INFO] 启动Nginx服务..."
@@ -409,9 +411,34 @@ EOF
 }
 
 # 保存配置到持久化目录
+# 请求Web界面导出配置，参数为超时秒数
+flush_config_via_app() {
+  timeout "$1" python3 -c "import json, sys, urllib.request; sys.exit(0 if json.load(urllib.request.urlopen(urllib.request.Request('http://127.0.0.1:5000/api/config/flush', method='POST'), timeout=$1)).get('success') else 1)" 2>/dev/null
+}
+
+# 保存配置，参数为shutdown时在退出信号处理中执行
 save_config() {
   echo "[INFO] 正在保存tgt配置到持久化目录..."
   
+  # Web界面运行时由app.py导出配置，导出结果包含tgt-admin --dump不输出的LUN后端设置和LUN调优参数
+  if [ "$1" = "shutdown" ]; then
+    # 退出时只尝试一次并使用短超时，Web界面已停止或无响应时立即直接导出，避免超过docker stop的等待时间（默认10秒）
+    if flush_config_via_app 3; then
+      echo "[SUCCESS] 配置文件成功保存"
+      return 0
+    fi
+  else
+    # 刚启动时Web界面可能还未就绪，最多等待10秒
+    for attempt in 1 2 3 4 5 6 7 8 9 10; do
+      if flush_config_via_app 60; then
+        echo "[SUCCESS] 配置文件成功保存"
+        return 0
+      fi
+      sleep 1
+    done
+  fi
+  echo "[WARNING] Web界面未响应，直接导出配置"
+  
   # 使用tgt-admin --dump获取当前配置并保存到targets.conf
   echo "[INFO] 导出当前target配置..."
   tgt-admin --dump | grep -v '^>' | grep -v '^default-driver' > "$TGT_CONFIG_DIR/conf.d/docker.conf"
@@ -441,6 +468,9 @@ save_config() {
 # 确保持久化目录存在
 mkdir -p "$ISCSI_CONFIG_DIR/tgt" "$ISCSI_CONFIG_DIR/tgt_lib"
 
+# 删除旧版优化脚本生成的配置文件（其中的参数tgtd并不支持）
+rm -f "$ISCSI_CONFIG_DIR/tgt/conf.d/optimize.conf" "$ISCSI_CONFIG_DIR/tgt/conf.d/scsi_commands.conf" "$ISCSI_CONFIG_DIR/tgt/conf.d/reconnect.conf"
+
 # 如果持久化目录中存在配置文件，则复制到系统目录
 if [ -d "$ISCSI_CONFIG_DIR/tgt" ] && [ "$(ls -A $ISCSI_CONFIG_DIR/tgt)" ]; then
   echo "[INFO] 正在加载持久化的tgt配置文件..."
@@ -469,17 +499,20 @@ start_web_interface
 # 保存初始化配置
 save_config
 
-# 应用LUN优化
-apply_lun_optimization
-
 # 注册退出信号处理
-trap save_config SIGTERM SIGINT
+trap 'save_config shutdown' SIGTERM SIGINT
 
-# 启动后台配置保存进程，每5分钟保存一次配置
-(while true; do
+# 启动后台配置检查进程：Web界面的修改由app.py在变更后自动持久化，
+# 这里每5分钟只检查一次Target拓扑是否被外部修改（例如手动执行tgtadm），有变化时才重新导出配置
+(LAST_STATE=$(tgtadm --lld iscsi --mode target --op show 2>/dev/null | md5sum)
+while true; do
   sleep 300
-  echo "[INFO] 每5分钟，定期保存配置文件到持久化目录..."
-  save_config
+  CURRENT_STATE=$(tgtadm --lld iscsi --mode target --op show 2>/dev/null | md5sum)
+  if [ "$CURRENT_STATE" != "$LAST_STATE" ]; then
+    echo "[INFO] 检测到Target配置变化，保存配置文件到持久化目录..."
+    save_config
+    LAST_STATE=$CURRENT_STATE
+  fi
 done) &
 
 # 持久化运行
@@ -0,0 +1,37 @@
+# 全零和重复块扫描的子进程部分：扫描进程池以spawn方式启动，子进程只导入本模块，
+# 不导入app（避免在每个子进程中创建Flask应用、启动后台线程和注册退出处理）
+import hashlib
+import mmap
+import os
+try:
+    import numpy
+except ImportError:  # numpy可选，没有时用字节比较判断全零块
+    numpy = None
+
+def chunk_is_zero(data):
+    if numpy is not None and len(data) % 8 == 0:
+        return not numpy.frombuffer(data, dtype=numpy.uint64).any()
+    return data == bytes(len(data))
+
+# 在子进程中执行：扫描镜像中指定序号的块，返回[(序号, 哈希或None)]，None表示全零块
+def scan_chunk_batch(path, indexes, chunk_size):
+    results = []
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        start = indexes[0] * chunk_size
+        length = min(size, (indexes[-1] + 1) * chunk_size) - start
+        if length <= 0:
+            return results
+        # mmap的偏移需要按mmap.ALLOCATIONGRANULARITY对齐，块大小由app保证是其整数倍
+        with mmap.mmap(f.fileno(), length, access=mmap.ACCESS_READ, offset=start) as mapped:
+            view = memoryview(mapped)
+            try:
+                for index in indexes:
+                    offset = index * chunk_size - start
+                    with view[offset:offset + chunk_size] as data:
+                        if not data:
+                            break
+                        results.append((index, None if chunk_is_zero(data) else hashlib.blake2b(data, digest_size=16).digest()))
+            finally:
+                view.release()
+    return results
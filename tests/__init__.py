@@ -0,0 +1,5 @@
+import os
+import tempfile
+
+# app.py默认把日志写到/app/config/app.log，测试改为临时目录
+os.environ.setdefault('APP_LOG_FILE', os.path.join(tempfile.mkdtemp(prefix='iscsi_tests_'), 'app.log'))
@@ -0,0 +1,105 @@
+import unittest
+from unittest import mock
+
+import app
+
+TARGET_NAME = 'iqn.2025-05.com.cherry:target1'
+INITIATOR = 'iqn.1993-08.org.debian:01:host1'
+
+# 模拟tgtd的ACL部分：与tgtd一样，show输出中不区分按名称和按地址绑定的规则，解绑时类型不符返回ACL_NOEXIST
+class FakeTgtdClient(app.TgtdClient):
+    def __init__(self, acl):
+        super().__init__(socket_path=None)
+        self.acl = list(acl)  # [(规则, 'initiator-address'或'initiator-name')]
+
+    def _send(self, mode, op, tid, lun, force, params):
+        if mode == 'target' and op == 'show':
+            return 0, self._show()
+        key, _, entry = params.partition('=')
+        if mode == 'target' and op == 'bind':
+            if any(existing == entry for existing, _ in self.acl):
+                return app.TGTADM_ERRORS.index('this access control rule already exists'), ''
+            self.acl.append((entry, key))
+            return 0, ''
+        if mode == 'target' and op == 'unbind':
+            if (entry, key) not in self.acl:
+                return app.TGTADM_ERR_ACL_NOEXIST, ''
+            self.acl.remove((entry, key))
+            return 0, ''
+        return app.TGTADM_ERRORS.index("this operation isn't supported"), ''
+
+    def _show(self):
+        lines = [f'Target 1: {TARGET_NAME}', '    System information:', '        Driver: iscsi', '        State: ready',
+                 '    I_T nexus information:', '    LUN information:', '    Account information:', '    ACL information:']
+        lines += [f'        {entry}' for entry, _ in self.acl]
+        return '\n'.join(lines) + '\n'
+
+class UpgradedAclTest(unittest.TestCase):
+    def setUp(self):
+        # 旧版本把IQN也按initiator-address绑定
+        self.tgtd = FakeTgtdClient([(INITIATOR, 'initiator-address'), ('192.168.1.0/24', 'initiator-address')])
+        for patcher in (mock.patch.object(app, 'get_tgtd_client', return_value=self.tgtd),
+                        mock.patch.object(app, 'save_config')):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        app.invalidate_topology()
+        self.client = app.app.test_client()
+
+    def test_set_acl_unbinds_iqn_bound_as_address(self):
+        response = self.client.post('/target/acl', data={'tid': '1', 'action': 'unbind', 'initiator_address': INITIATOR})
+        self.assertTrue(response.get_json()['success'], response.get_json())
+        self.assertEqual(self.tgtd.acl, [('192.168.1.0/24', 'initiator-address')])
+
+    def test_set_acl_all_replaces_iqn_bound_as_address(self):
+        response = self.client.post('/target/acl', data={'tid': '1', 'action': 'all'})
+        self.assertTrue(response.get_json()['success'], response.get_json())
+        self.assertEqual(self.tgtd.acl, [('ALL', 'initiator-address')])
+
+    def test_clear_acl_removes_iqn_bound_as_address(self):
+        response = self.client.post('/target/clear_acl', data={'tid': '1'})
+        self.assertTrue(response.get_json()['success'], response.get_json())
+        self.assertEqual(self.tgtd.acl, [])
+
+    def test_new_iqn_is_bound_by_name(self):
+        response = self.client.post('/target/acl', data={'tid': '1', 'action': 'bind',
+                                                         'initiator_address': 'iqn.2000-01.com.example:host2'})
+        self.assertTrue(response.get_json()['success'], response.get_json())
+        self.assertIn(('iqn.2000-01.com.example:host2', 'initiator-name'), self.tgtd.acl)
+
+class BatchAclTest(unittest.TestCase):
+    def setUp(self):
+        self.tgtd = FakeTgtdClient([('192.168.1.0/24', 'initiator-address')])
+        for patcher in (mock.patch.object(app, 'get_tgtd_client', return_value=self.tgtd),
+                        mock.patch.object(app, 'save_config')):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        app.invalidate_topology()
+        self.client = app.app.test_client()
+
+    def batch(self, *operations):
+        return self.client.post('/api/batch', json={'operations': list(operations)}).get_json()
+
+    def test_unbind_matches_canonical_form(self):
+        result = self.batch({'op': 'unbind', 'tid': 1, 'initiator': '192.168.1.77/24'})
+        self.assertTrue(result['success'], result)
+        self.assertEqual(self.tgtd.acl, [])
+
+    def test_bind_rejects_rule_that_already_exists_in_another_form(self):
+        result = self.batch({'op': 'bind', 'tid': 1, 'initiator': ' 192.168.1.1/24 '})
+        self.assertEqual(result['error_code'], 'VALIDATION_FAILED')
+        self.assertEqual(self.tgtd.acl, [('192.168.1.0/24', 'initiator-address')])
+
+    def test_invalid_initiator_is_rejected(self):
+        result = self.batch({'op': 'bind', 'tid': 1, 'initiator': 'host-1'})
+        self.assertEqual(result['error_code'], 'VALIDATION_FAILED')
+        self.assertIn('host-1', result['data']['results'][0]['error'])
+
+    def test_bind_uses_canonical_form(self):
+        result = self.batch({'op': 'bind', 'tid': 1, 'initiator': '10.0.0.9/8'},
+                            {'op': 'bind', 'tid': 1, 'initiator': 'all'})
+        self.assertTrue(result['success'], result)
+        self.assertEqual(self.tgtd.acl, [('192.168.1.0/24', 'initiator-address'), ('10.0.0.0/8', 'initiator-address'),
+                                         ('ALL', 'initiator-address')])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import app
+
+CHUNK_SIZE = app.BACKUP_CHUNK_SIZE
+
+class BackupImageTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory(prefix='backup_test_')
+        self.addCleanup(tmp.cleanup)
+        self.root = tmp.name
+        disk_dir = os.path.join(self.root, 'iscsi')
+        os.makedirs(disk_dir)
+        for name, value in (('BASE_DISK_DIR', disk_dir),
+                            ('BACKUP_CHUNKS_DIR', os.path.join(self.root, 'backup', 'chunks')),
+                            ('BACKUP_MANIFESTS_DIR', os.path.join(self.root, 'backup', 'manifests')),
+                            ('BACKUP_HASH_WORKERS', 1)):
+            patcher = mock.patch.object(app, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        # 8个块：第0、2、5、6、7块有数据，第3块写入全零，其余为空洞
+        self.image = os.path.join(disk_dir, 'disk.img')
+        with open(self.image, 'wb') as f:
+            f.truncate(8 * CHUNK_SIZE)
+            for index, data in ((0, b'first'), (2, b'second'), (3, bytes(4096)), (5, b'fifth'), (6, b'sixth'), (7, b'last')):
+                f.seek(index * CHUNK_SIZE + 100)
+                f.write(data)
+
+    def test_backup_and_restore(self):
+        stats = app.backup_image(self.image, lambda done: None)
+        self.assertEqual((stats['new_chunks'], stats['zero_chunks'], stats['hole_chunks']), (5, 1, 2))
+        manifest = app.load_backup_manifest(self.image)
+        restored = os.path.join(self.root, 'restored.img')
+        app.restore_image(app._InlineJob(), manifest, restored)
+        with open(self.image, 'rb') as original, open(restored, 'rb') as copy:
+            self.assertEqual(original.read(), copy.read())
+
+    def test_image_truncated_during_backup(self):
+        def progress(done):
+            # 第一批（4个块）完成后镜像被缩小
+            if done and os.path.getsize(self.image) > CHUNK_SIZE:
+                os.truncate(self.image, CHUNK_SIZE + 10)
+        with self.assertRaisesRegex(RuntimeError, '截断'):
+            app.backup_image(self.image, progress)
+        self.assertIsNone(app.load_backup_manifest(self.image))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import time
+import unittest
+from unittest import mock
+
+import app
+
+class ConfigPersisterTest(unittest.TestCase):
+    def setUp(self):
+        self.calls = []
+        self.failures = 1
+        patcher = mock.patch.object(app, 'flush_config', side_effect=self._flush_config)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.persister = app.ConfigPersister(0.01, 0.05)
+
+    def _flush_config(self):
+        self.calls.append(time.monotonic())
+        if len(self.calls) <= self.failures:
+            raise OSError('tgt-admin failed')
+        return 1
+
+    def wait_for_calls(self, count, timeout=2):
+        deadline = time.monotonic() + timeout
+        while len(self.calls) < count and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return len(self.calls)
+
+    def test_failed_flush_is_retried_in_background(self):
+        with self.assertRaises(OSError):
+            self.persister.flush()
+        self.assertEqual(self.wait_for_calls(2), 2)
+
+    def test_background_failure_is_retried_after_interval(self):
+        self.persister.mark_dirty()
+        self.assertEqual(self.wait_for_calls(2), 2)
+        self.assertGreaterEqual(self.calls[1] - self.calls[0], 0.05)
+
+    def test_shutdown_saves_after_failed_flush(self):
+        self.persister.retry_interval = 60
+        self.persister.mark_dirty()
+        self.assertEqual(self.wait_for_calls(1), 1)
+        deadline = time.monotonic() + 2
+        while not self.persister._pending and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.persister.shutdown()
+        self.assertEqual(len(self.calls), 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,28 @@
+import unittest
+
+import app
+
+class RatesTest(unittest.TestCase):
+    def test_rates(self):
+        previous = (100, 2048, 50, 4096)
+        current = (300, 4096, 150, 6144)
+        self.assertEqual(app.PerformanceCollector._rates(current, previous, 2.0), (100, 50, 0.5, 0.5))
+
+    def test_first_sample_has_no_rate(self):
+        self.assertEqual(app.PerformanceCollector._rates((1, 2, 3, 4), None, 1.0), (0, 0, 0.0, 0.0))
+
+    def test_counters_going_down_are_treated_as_reset(self):
+        # 一个Initiator断开后，按会话合计的tgtd计数变小
+        previous = (1000, 204800, 500, 102400)
+        current = (400, 81920, 800, 163840)
+        read_iops, write_iops, read_throughput, write_throughput = app.PerformanceCollector._rates(current, previous, 1.0)
+        self.assertEqual((read_iops, read_throughput), (0, 0.0))
+        self.assertEqual((write_iops, write_throughput), (300, 30.0))
+
+    def test_all_counters_reset(self):
+        rates = app.PerformanceCollector._rates((0, 0, 0, 0), (10, 20, 30, 40), 1.0)
+        self.assertEqual(rates, (0, 0, 0.0, 0.0))
+        self.assertTrue(all(value >= 0 for value in rates))
+
+if __name__ == '__main__':
+    unittest.main()
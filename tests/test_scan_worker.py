@@ -0,0 +1,44 @@
+import hashlib
+import mmap
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import scan_worker
+
+CHUNK_SIZE = mmap.ALLOCATIONGRANULARITY
+
+# 全零块和重复块扫描需要在有numpy和没有numpy时给出相同的结果
+class ScanWorkerTest(unittest.TestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(prefix='scan_worker_')
+        self.addCleanup(os.unlink, self.path)
+        self.chunks = [bytes(CHUNK_SIZE), b'a' * CHUNK_SIZE, bytes(CHUNK_SIZE - 1) + b'\1', b'a' * CHUNK_SIZE, b'tail']
+        with os.fdopen(fd, 'wb') as f:
+            f.write(b''.join(self.chunks))
+
+    def expected(self, indexes):
+        return [(index, None if not any(self.chunks[index]) else hashlib.blake2b(self.chunks[index], digest_size=16).digest())
+                for index in indexes]
+
+    def check_paths(self):
+        self.assertTrue(scan_worker.chunk_is_zero(bytes(4096)))
+        self.assertTrue(scan_worker.chunk_is_zero(memoryview(bytes(13))))
+        self.assertFalse(scan_worker.chunk_is_zero(bytes(4095) + b'\1'))
+        self.assertFalse(scan_worker.chunk_is_zero(b'\1' + bytes(12)))
+        indexes = list(range(len(self.chunks)))
+        self.assertEqual(scan_worker.scan_chunk_batch(self.path, indexes, CHUNK_SIZE), self.expected(indexes))
+        self.assertEqual(scan_worker.scan_chunk_batch(self.path, [1, 2], CHUNK_SIZE), self.expected([1, 2]))
+        self.assertEqual(scan_worker.scan_chunk_batch(self.path, [9], CHUNK_SIZE), [])
+
+    def test_bytes_fallback(self):
+        with mock.patch.object(scan_worker, 'numpy', None):
+            self.check_paths()
+
+    @unittest.skipIf(scan_worker.numpy is None, 'numpy未安装')
+    def test_numpy(self):
+        self.check_paths()
+
+if __name__ == '__main__':
+    unittest.main()